@@ -0,0 +1,317 @@
+"""Time and memory-profile the hot functions of steps 3-6 on synthetic data.
+
+A workspace with the folder layout that the scripts expect is generated
+(synthetic Statement corpora in step3_sample_training_test and synthetic
+FamPlex tables in a famplex folder next to the repository), so the suite runs
+offline. Each benchmark is run once for timing and, unless --no-memory is
+given, once more under tracemalloc to measure peak memory. Results are
+appended as JSON lines to the output file for tracking regressions:
+
+    python benchmarks/run_benchmarks.py --sizes 10000 100000 270000
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import platform
+import importlib
+import tracemalloc
+import subprocess
+import contextlib
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from synthetic import iter_corpus, make_famplex_tables, make_reach_json
+
+repo_root = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         os.pardir)
+default_workdir = os.path.join(tempfile.gettempdir(), 'famplex_benchmarks')
+default_sizes = [10000, 100000, 270000]
+test_fraction = 0.2
+keywords = ['AKT', 'MAPK', 'kinase', 'RAS-1', 'growth factor']
+num_reach_docs = 20
+num_tagged_docs = 200
+
+
+@contextlib.contextmanager
+def working_dir(path):
+    """Temporarily change the working directory."""
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+def import_script(step_dir, name):
+    """Import a script of one of the step folders as a module."""
+    path = os.path.abspath(os.path.join(repo_root, step_dir))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return importlib.import_module(name)
+
+
+class Workspace(object):
+    """A folder laid out like the parent folder of the repository.
+
+    Parameters
+    ----------
+    path : str
+        The root of the workspace. Generated corpora are kept between runs
+        and only regenerated for new sizes or seeds.
+    num_entities : int
+        The number of entries of the synthetic FamPlex tables.
+    seed : int
+        The random seed of the synthetic data.
+    """
+    def __init__(self, path, num_entities, seed):
+        self.path = path
+        self.seed = seed
+        self.famplex_dir = os.path.join(path, 'famplex')
+        self.step3_dir = os.path.join(path, 'repo',
+                                      'step3_sample_training_test')
+        for step_dir in ('step4_stmt_entity_stats', 'step6_evaluation'):
+            self.step_dir(step_dir)
+        if not os.path.exists(self.step3_dir):
+            os.makedirs(self.step3_dir)
+        make_famplex_tables(self.famplex_dir, num_entities=num_entities,
+                            seed=seed)
+        self._reach_docs = None
+
+    def step_dir(self, name):
+        """Return a step folder of the workspace, creating it if needed."""
+        path = os.path.join(self.path, 'repo', name)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        return path
+
+    def make_corpus(self, size):
+        """Return a synthetic corpus of a given size, and install it as the
+        training and test corpora that step 4 reads."""
+        cache_file = os.path.join(self.path, 'corpus_%d_%d.pkl' %
+                                  (size, self.seed))
+        if os.path.exists(cache_file):
+            with open(cache_file, 'rb') as fh:
+                stmts = pickle.load(fh)
+        else:
+            print('Generating a corpus of %d PMIDs' % size)
+            stmts = dict(iter_corpus(size, seed=self.seed))
+            with open(cache_file, 'wb') as fh:
+                pickle.dump(stmts, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        test_pmids = sorted(stmts)[:int(test_fraction * size)]
+        test_stmts = {pmid: stmts[pmid] for pmid in test_pmids}
+        for fname, corpus in (('training_pmid_stmts.pkl', stmts),
+                              ('famplex_test_stmts_mapped.pkl', test_stmts)):
+            with open(os.path.join(self.step3_dir, fname), 'wb') as fh:
+                pickle.dump(corpus, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        return stmts
+
+    def reach_docs(self):
+        """Return synthetic REACH outputs as JSON bytes."""
+        if self._reach_docs is None:
+            self._reach_docs = [json.dumps(make_reach_json(seed=seed))
+                                .encode('utf-8')
+                                for seed in range(num_reach_docs)]
+        return self._reach_docs
+
+
+# Each benchmark takes the workspace and the corpus and returns a function
+# without arguments that runs the code being measured, or None if it can't
+# be run. Benchmarks of functions that don't depend on the corpus are only
+# run for the first size.
+def bench_get_strings(ws, stmts):
+    mod = import_script('step3_sample_training_test', 'make_entity_freqs')
+    return lambda: mod.get_strings(stmts)
+
+
+def bench_get_coverage_stats(ws, stmts):
+    with working_dir(ws.step_dir('step6_evaluation')):
+        mod = import_script('step6_evaluation', 'grounding_stats')
+    stmt_list = [stmt for pmid_stmts in stmts.values()
+                 for stmt in pmid_stmts]
+    return lambda: mod.get_coverage_stats(stmt_list)
+
+
+def bench_make_ungrounded_stats(ws, stmts):
+    mod = import_script('step4_stmt_entity_stats', 'agent_sample_stats')
+
+    def run():
+        with working_dir(ws.step_dir('step4_stmt_entity_stats')):
+            return mod.make_ungrounded_stats()
+    return run
+
+
+def bench_get_children(ws, stmts):
+    with working_dir(ws.step_dir('step6_evaluation')):
+        mod = import_script('step6_evaluation', 'fplx_stats')
+    return lambda: [mod.get_children('FPLX', entity)
+                    for entity in mod.entities]
+
+
+def bench_get_level(ws, stmts):
+    with working_dir(ws.step_dir('step6_evaluation')):
+        mod = import_script('step6_evaluation', 'fplx_stats')
+    return lambda: [mod.get_level(entity) for entity in mod.entities]
+
+
+def bench_find_db_mappings(ws, stmts):
+    with working_dir(ws.step_dir('step6_evaluation')):
+        mod = import_script('step6_evaluation', 'mapping_stats')
+    entities = mod.load_entity_list(os.path.join(ws.famplex_dir,
+                                                 'entities.csv'))
+    equivalences = mod.load_equivalences(os.path.join(ws.famplex_dir,
+                                                      'equivalences.csv'))
+    return lambda: {entity: mod.find_db_mappings(entity, equivalences)
+                    for entity in entities}
+
+
+def bench_get_keyword_matches(ws, stmts):
+    mod = import_script('step5_curate_grounding', 'texts_for_gene')
+    texts = mod.agent_texts_with_grounding(
+        [stmt for pmid_stmts in stmts.values() for stmt in pmid_stmts])
+    return lambda: [mod.get_keyword_matches(kw, texts) for kw in keywords]
+
+
+def bench_get_keyword_matches_index(ws, stmts):
+    from common.ngram_index import NgramIndex
+    mod = import_script('step5_curate_grounding', 'texts_for_gene')
+    texts = mod.agent_texts_with_grounding(
+        [stmt for pmid_stmts in stmts.values() for stmt in pmid_stmts])
+    index = NgramIndex([entry[0] for entry in texts])
+    return lambda: [mod.get_keyword_matches(kw, texts, index=index, top_k=50)
+                    for kw in keywords]
+
+
+def bench_reach_json_loads(ws, stmts):
+    from common.reach_stream import get_entities
+    docs = ws.reach_docs()
+    return lambda: [get_entities(doc, stream=False) for doc in docs]
+
+
+def bench_reach_stream(ws, stmts):
+    from common.reach_stream import get_entities, ijson
+    if ijson is None:
+        return None
+    docs = ws.reach_docs()
+    return lambda: [get_entities(doc, stream=True) for doc in docs]
+
+
+def bench_dict_tagger(ws, stmts):
+    import random
+    from common.grounding_map import GroundingMap
+    from common.dict_tagger import DictionaryTagger
+    gmap = GroundingMap.from_csv(os.path.join(ws.famplex_dir,
+                                              'grounding_map.csv'))
+    tagger = DictionaryTagger.from_grounding_map(gmap)
+    # Abstract-sized documents of filler words and grounding map texts
+    rng = random.Random(ws.seed)
+    texts = sorted(gmap.db_refs)
+    filler = ['the', 'of', 'protein', 'binds', 'cells', 'and', 'in',
+              'activation', 'was', 'increased', 'by', 'signaling']
+    docs = [' '.join(rng.choice(texts) if rng.random() < 0.1 else
+                     rng.choice(filler) for _ in range(250))
+            for _ in range(num_tagged_docs)]
+    return lambda: [tagger.tag(doc) for doc in docs]
+
+
+benchmarks = [('get_strings', bench_get_strings, True),
+              ('get_coverage_stats', bench_get_coverage_stats, True),
+              ('make_ungrounded_stats', bench_make_ungrounded_stats, True),
+              ('get_children', bench_get_children, False),
+              ('get_level', bench_get_level, False),
+              ('find_db_mappings', bench_find_db_mappings, False),
+              ('get_keyword_matches', bench_get_keyword_matches, True),
+              ('get_keyword_matches_index', bench_get_keyword_matches_index,
+               True),
+              ('reach_json_loads', bench_reach_json_loads, False),
+              ('reach_stream', bench_reach_stream, False),
+              ('dict_tagger', bench_dict_tagger, False)]
+
+
+def measure(func, memory=True):
+    """Return the run time in seconds of a function, and its peak memory
+    allocation in bytes measured in a second run (None if not measured)."""
+    ts = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - ts
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return seconds, peak
+
+
+def get_commit():
+    """Return the current commit of the repository, if available."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=repo_root,
+                                       stderr=subprocess.DEVNULL) \
+            .decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(ws, sizes, names=None, memory=True):
+    """Run benchmarks on corpora of the given sizes and return the results
+    as a list of dicts."""
+    results = []
+    info = {'commit': get_commit(), 'python': platform.python_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'seed': ws.seed}
+    selected = [b for b in benchmarks if not names or b[0] in names]
+    for size_ix, size in enumerate(sizes):
+        todo = [b for b in selected if b[2] or size_ix == 0]
+        stmts = ws.make_corpus(size) if any(b[2] for b in todo) else {}
+        num_stmts = sum(len(pmid_stmts) for pmid_stmts in stmts.values())
+        for name, make_func, uses_corpus in todo:
+            func = make_func(ws, stmts)
+            if func is None:
+                print('Skipping %s, missing optional dependency' % name)
+                continue
+            seconds, peak = measure(func, memory)
+            result = dict(info, benchmark=name,
+                          num_pmids=size if uses_corpus else None,
+                          num_stmts=num_stmts if uses_corpus else None,
+                          seconds=seconds, peak_memory=peak)
+            print('%-24s %8s PMIDs %10.3fs %12s bytes' %
+                  (name, size if uses_corpus else '-', seconds,
+                   peak if peak is not None else '-'))
+            results.append(result)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark steps 3-6 on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=default_sizes,
+                        help='Numbers of PMIDs of the synthetic corpora.')
+    parser.add_argument('--entities', type=int, default=400,
+                        help='Number of entries of the synthetic FamPlex.')
+    parser.add_argument('--benchmark', action='append', dest='names',
+                        choices=[b[0] for b in benchmarks],
+                        help='Only run the given benchmark(s).')
+    parser.add_argument('--workdir', default=default_workdir,
+                        help='Folder for the synthetic data.')
+    parser.add_argument('--output', default='benchmark_results.jsonl',
+                        help='JSON lines file the results are appended to.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true',
+                        help='Skip the memory profiling runs.')
+    args = parser.parse_args()
+
+    ws = Workspace(args.workdir, args.entities, args.seed)
+    results = run_benchmarks(ws, args.sizes, args.names,
+                             memory=not args.no_memory)
+    with open(args.output, 'a') as fh:
+        for result in results:
+            fh.write(json.dumps(result) + '\n')
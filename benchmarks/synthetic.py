@@ -0,0 +1,245 @@
+"""Generators of synthetic inputs for benchmarking the statistics scripts.
+
+The Statement corpora mimic the REACH reading output of steps 2-3: papers
+have a Poisson-distributed number of INDRA Statements whose agent texts are
+drawn from a Zipfian distribution over a vocabulary of entity texts, each of
+which has a fixed grounding (or none). The FamPlex tables have the same
+layout as entities.csv, relations.csv, grounding_map.csv and
+equivalences.csv in the FamPlex repository.
+"""
+import os
+import csv
+import string
+import numpy
+
+namespaces = ['HGNC', 'UP', 'FPLX', 'CHEBI', 'GO', 'MESH']
+equivalence_dbs = ['IP', 'PF', 'NXP', 'GO', 'NCIT', 'MESH', 'BEL', 'RE']
+
+
+def make_texts(num_texts, rng, ungrounded_fraction=0.3):
+    """Return a list of (text, db_refs) tuples for entity texts.
+
+    Texts look like gene symbols, hyphenated names or lowercase phrases, and
+    a given fraction of them have no grounding besides TEXT.
+    """
+    texts = []
+    seen = set()
+    letters = list(string.ascii_uppercase)
+    words = ['kinase', 'receptor', 'factor', 'protein', 'complex',
+             'signaling', 'growth', 'activation', 'cell', 'pathway']
+    while len(texts) < num_texts:
+        kind = rng.randint(3)
+        if kind == 0:
+            text = ''.join(rng.choice(letters, rng.randint(2, 6))) + \
+                str(rng.randint(1, 20))
+        elif kind == 1:
+            text = '%s-%d' % (''.join(rng.choice(letters, rng.randint(2, 5))),
+                              rng.randint(1, 10))
+        else:
+            text = ' '.join(rng.choice(words, rng.randint(1, 4)))
+        if text in seen:
+            continue
+        seen.add(text)
+        db_refs = {'TEXT': text}
+        if rng.rand() >= ungrounded_fraction:
+            ns = namespaces[rng.randint(len(namespaces))]
+            db_refs[ns] = '%s%d' % (ns[0], rng.randint(100000))
+            if ns == 'HGNC':
+                db_refs['UP'] = 'P%05d' % rng.randint(100000)
+        texts.append((text, db_refs))
+    return texts
+
+
+def zipf_probabilities(num_texts, exponent=1.1):
+    """Return Zipfian probabilities for ranks 1..num_texts."""
+    probs = numpy.arange(1, num_texts + 1, dtype=float) ** -exponent
+    return probs / probs.sum()
+
+
+def iter_corpus(num_pmids, num_texts=None, stmts_per_paper=8,
+                exponent=1.1, seed=0):
+    """Iterate over (pmid, stmts) pairs of a synthetic Statement corpus.
+
+    Parameters
+    ----------
+    num_pmids : int
+        The number of papers.
+    num_texts : Optional[int]
+        The size of the entity text vocabulary. Default: one distinct text
+        per 2 papers, as in the training corpus.
+    stmts_per_paper : Optional[float]
+        The mean number of Statements per paper.
+    exponent : Optional[float]
+        The exponent of the Zipfian text distribution.
+    seed : Optional[int]
+        The random seed.
+    """
+    from indra.statements import Agent, Evidence, Phosphorylation, \
+        Activation, Complex, IncreaseAmount
+    rng = numpy.random.RandomState(seed)
+    if num_texts is None:
+        num_texts = max(num_pmids // 2, 100)
+    texts = make_texts(num_texts, rng)
+    probs = zipf_probabilities(num_texts, exponent)
+    num_stmts = rng.poisson(stmts_per_paper, num_pmids)
+    for paper_ix in range(num_pmids):
+        pmid = str(10000000 + paper_ix)
+        draws = rng.choice(num_texts, 2 * num_stmts[paper_ix], p=probs)
+        agents = [Agent(texts[ix][1]['TEXT'], db_refs=dict(texts[ix][1]))
+                  for ix in draws]
+        stmts = []
+        for stmt_ix in range(num_stmts[paper_ix]):
+            ag1, ag2 = agents[2*stmt_ix], agents[2*stmt_ix+1]
+            ev = Evidence(source_api='reach', pmid=pmid,
+                          text='%s interacts with %s.' % (ag1.name, ag2.name))
+            kind = rng.randint(5)
+            if kind == 0:
+                stmt = Phosphorylation(ag1, ag2, evidence=[ev])
+            elif kind == 1:
+                # Statements with a missing enzyme have a None agent
+                stmt = Phosphorylation(None, ag2, evidence=[ev])
+            elif kind == 2:
+                stmt = Activation(ag1, ag2, evidence=[ev])
+            elif kind == 3:
+                stmt = Complex([ag1, ag2], evidence=[ev])
+            else:
+                stmt = IncreaseAmount(ag1, ag2, evidence=[ev])
+            stmts.append(stmt)
+        yield pmid, stmts
+
+
+def make_corpus(num_pmids, **kwargs):
+    """Return a synthetic dict of Statements by PMID, see iter_corpus."""
+    return dict(iter_corpus(num_pmids, **kwargs))
+
+
+def make_famplex_tables(path, num_entities=400, genes_per_entity=5,
+                        lexicalizations=3, seed=0):
+    """Write synthetic FamPlex tables into a folder.
+
+    Parameters
+    ----------
+    path : str
+        The folder in which the entities.csv, relations.csv,
+        grounding_map.csv and equivalences.csv files are written.
+    num_entities : Optional[int]
+        The number of FamPlex entries.
+    genes_per_entity : Optional[float]
+        The mean number of genes that are direct children of an entry.
+    lexicalizations : Optional[float]
+        The mean number of grounding map texts of an entry.
+    seed : Optional[int]
+        The random seed.
+    """
+    rng = numpy.random.RandomState(seed)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    entities = ['FAM%d' % ix for ix in range(num_entities)]
+    depth = {}
+    relations = []
+    num_genes = 0
+    for ix, entity in enumerate(entities):
+        # About 40% of entries are top level, the others get a parent that
+        # keeps the hierarchy at most 4 levels deep
+        parents = [p for p in entities[:ix] if depth[p] < 3]
+        if ix == 0 or rng.rand() < 0.4 or not parents:
+            depth[entity] = 0
+        else:
+            parent = parents[rng.randint(len(parents))]
+            depth[entity] = depth[parent] + 1
+            relations.append(('FPLX', entity, 'isa', 'FPLX', parent))
+        for _ in range(rng.poisson(genes_per_entity)):
+            relations.append(('HGNC', 'GENE%d' % num_genes,
+                              rng.choice(['isa', 'partof']), 'FPLX', entity))
+            num_genes += 1
+
+    gmap_rows = []
+    for entity in entities:
+        for lex_ix in range(rng.poisson(lexicalizations)):
+            gmap_rows.append(('%s-%d' % (entity.lower(), lex_ix),
+                              'FPLX', entity))
+    for gene_ix in range(num_genes):
+        gmap_rows.append(('gene%d' % gene_ix, 'HGNC', 'GENE%d' % gene_ix,
+                          'UP', 'P%05d' % gene_ix))
+
+    equivalences = []
+    for entity in entities:
+        num_dbs = rng.randint(len(equivalence_dbs) // 2)
+        for db in rng.choice(equivalence_dbs, num_dbs, replace=False):
+            equivalences.append((db, '%s:%d' % (db, rng.randint(100000)),
+                                 entity))
+
+    for fname, rows in (('entities.csv', [(e,) for e in entities]),
+                        ('relations.csv', relations),
+                        ('grounding_map.csv', gmap_rows),
+                        ('equivalences.csv', equivalences)):
+        with open(os.path.join(path, fname), 'w') as fh:
+            csv.writer(fh, lineterminator='\n').writerows(rows)
+
+
+def make_reach_json(num_entities=2000, num_events=600, num_sentences=400,
+                    seed=0):
+    """Return a synthetic REACH output document as a dict.
+
+    The document has the sentences, entities and events sections of REACH's
+    fries JSON output, with the positions, metadata and verbose texts that
+    make real outputs of full-text papers a few megabytes in size.
+    """
+    rng = numpy.random.RandomState(seed)
+    texts = [text for text, _ in make_texts(max(num_entities // 5, 10), rng)]
+
+    def pos(offset):
+        return {'object-type': 'relative-pos', 'offset': int(offset),
+                'reference': 'sent-%d' % rng.randint(num_sentences)}
+
+    sentences = [{'frame-id': 'sent-%d' % ix, 'frame-type': 'sentence',
+                  'object-type': 'frame', 'passage': 'pass-%d' % (ix // 10),
+                  'start-pos': pos(0), 'end-pos': pos(200),
+                  'text': ' '.join(rng.choice(texts, 20))}
+                 for ix in range(num_sentences)]
+    entities = []
+    for ix in range(num_entities):
+        text = texts[rng.randint(len(texts))]
+        xrefs = [{'namespace': ns, 'id': '%s%d' % (ns, rng.randint(10000)),
+                  'object-type': 'db-reference'}
+                 for ns in rng.choice(['uniprot', 'pfam', 'uaz', 'go'],
+                                      rng.randint(3), replace=False)]
+        entities.append({'frame-id': 'ment-%d' % ix,
+                         'frame-type': 'entity-mention',
+                         'object-type': 'frame',
+                         'object-meta': {'component': 'REACH',
+                                         'object-type': 'meta-info'},
+                         'sentence': 'sent-%d' % rng.randint(num_sentences),
+                         'start-pos': pos(ix), 'end-pos': pos(ix + 5),
+                         'text': text, 'type': 'gene-or-gene-product',
+                         'xrefs': xrefs})
+    events = []
+    for ix in range(num_events):
+        arguments = [{'argument-label': label, 'argument-type': 'entity',
+                      'arg': 'ment-%d' % rng.randint(num_entities),
+                      'object-type': 'argument', 'text': 'argument text',
+                      'type': label}
+                     for label in ('controller', 'controlled')]
+        if rng.rand() < 0.2:
+            arguments.append({'argument-label': 'site',
+                              'argument-type': 'complex',
+                              'args': {'participant': 'ment-0'},
+                              'object-type': 'argument', 'type': 'site'})
+        events.append({'frame-id': 'evem-%d' % ix,
+                       'frame-type': 'event-mention', 'object-type': 'frame',
+                       'found-by': 'Positive_activation_syntax_1_verb',
+                       'is-direct': bool(rng.rand() < 0.5),
+                       'is-hypothesis': False, 'is-negated': False,
+                       'sentence': 'sent-%d' % rng.randint(num_sentences),
+                       'start-pos': pos(ix), 'end-pos': pos(ix + 40),
+                       'subtype': 'positive-activation',
+                       'text': 'argument text activates argument text',
+                       'trigger': 'activates', 'type': 'activation',
+                       'verbose-text': sentences[ix % num_sentences]['text'],
+                       'arguments': arguments})
+    meta = {'object-type': 'frame-collection',
+            'object-meta': {'component': 'REACH', 'doc-id': 'PMC0',
+                            'object-type': 'meta-info'}}
+    return {'sentences': dict(meta, frames=sentences),
+            'entities': dict(meta, frames=entities),
+            'events': dict(meta, frames=events)}
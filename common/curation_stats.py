@@ -0,0 +1,205 @@
+"""Statistics of curated agent samples.
+
+A curated sample is a CSV file as written by
+step4_stmt_entity_stats/get_agents_for_evaluation.py, in which curators
+filled in the EntityType code (P, F, C, X, S, B, U or M) and whether the
+Grounding is correct (1) or not (0) for the first rows. The rows of any
+number of samples are put into one DataFrame with a corpus column, mapped to
+the categories of a configurable scheme, and counted with a single groupby.
+Confidence intervals of accuracies are estimated by bootstrap resampling,
+done for all replicates at once with numpy: a (replicates x rows) matrix of
+resampled rows is counted per replicate and category with one bincount on
+offset category codes.
+"""
+import warnings
+import numpy
+import pandas
+
+# Category schemes are lists of (category name, EntityType codes)
+default_scheme = [('Protein/gene', ['P']),
+                  ('Family/complex', ['F', 'C', 'X']),
+                  ('Small molecule', ['S']),
+                  ('Biological process', ['B']),
+                  ('Other/unknown', ['U']),
+                  ('microRNA', ['M'])]
+family_scheme = [('Protein/gene', ['P']),
+                 ('Family/complex', ['F', 'C', 'X']),
+                 ('Other', ['S', 'B', 'U', 'M'])]
+
+
+def load_curated(fnames):
+    """Return the curated rows of curated sample CSV files.
+
+    Parameters
+    ----------
+    fnames : dict
+        CSV file names by corpus label.
+
+    Returns
+    -------
+    data : pandas.DataFrame
+        The rows with an EntityType, in file order, with a corpus column.
+    """
+    frames = []
+    for corpus, fname in fnames.items():
+        data = pandas.read_csv(fname)
+        data = data[data.EntityType.notna()].copy()
+        data['corpus'] = corpus
+        frames.append(data)
+    return pandas.concat(frames, ignore_index=True)
+
+
+def get_category_codes(data, scheme):
+    """Return the index of the category of each row in a scheme, with
+    len(scheme) for rows in none of the categories."""
+    code_map = {code: ix for ix, (_, codes) in enumerate(scheme)
+                for code in codes}
+    return data.EntityType.map(code_map).fillna(len(scheme)) \
+        .astype(int).values
+
+
+def bootstrap_accuracy(categories, correct, num_categories,
+                       num_replicates=2000, seed=1):
+    """Return bootstrap replicates of the accuracy of each category.
+
+    Parameters
+    ----------
+    categories : numpy.ndarray
+        The category index of each row.
+    correct : numpy.ndarray
+        Whether the grounding of each row is correct.
+    num_categories : int
+        The number of category indices.
+    num_replicates : Optional[int]
+        The number of bootstrap replicates.
+    seed : Optional[int]
+        The random seed.
+
+    Returns
+    -------
+    accuracy : numpy.ndarray
+        A (replicates x categories) array of accuracies, NaN where a
+        replicate has no rows of a category.
+    """
+    rng = numpy.random.RandomState(seed)
+    num_rows = len(categories)
+    idx = rng.randint(0, num_rows, size=(num_replicates, num_rows))
+    # Offset the category codes of each replicate so one bincount counts
+    # all replicates
+    offsets = numpy.arange(num_replicates)[:, None] * num_categories
+    flat = (categories[idx] + offsets).ravel()
+    size = num_replicates * num_categories
+    counts = numpy.bincount(flat, minlength=size)
+    num_correct = numpy.bincount(flat, weights=correct[idx].ravel(),
+                                 minlength=size)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        accuracy = num_correct / counts
+    return accuracy.reshape(num_replicates, num_categories)
+
+
+def category_stats(data, scheme=default_scheme, num_replicates=2000,
+                   seed=1, confidence=0.95):
+    """Return per-category counts, accuracies and confidence intervals.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        Curated rows with EntityType, Grounding and corpus columns, see
+        load_curated.
+    scheme : Optional[list]
+        The category scheme.
+    num_replicates : Optional[int]
+        The number of bootstrap replicates for confidence intervals, or 0
+        to skip them.
+    seed : Optional[int]
+        The random seed of the bootstrap.
+    confidence : Optional[float]
+        The confidence level of the intervals.
+
+    Returns
+    -------
+    stats : pandas.DataFrame
+        One row per corpus and category with the number of rows, their
+        percentage of the corpus, the number and percentage of correct
+        groundings, the normal-approximation standard error of the
+        percentage correct, and its bootstrap confidence interval.
+    """
+    num_categories = len(scheme) + 1
+    categories = get_category_codes(data, scheme)
+    correct = (data.Grounding.values == 1)
+    frame = pandas.DataFrame({'corpus': data.corpus.values,
+                              'category': categories, 'correct': correct})
+    grouped = frame.groupby(['corpus', 'category'], sort=False).correct \
+        .agg(['size', 'sum'])
+    corpora = list(pandas.unique(data.corpus))
+    index = pandas.MultiIndex.from_product([corpora, range(len(scheme))],
+                                           names=['corpus', 'category'])
+    grouped = grouped.reindex(index, fill_value=0)
+    totals = frame.groupby('corpus').size()
+
+    stats = pandas.DataFrame({
+        'corpus': grouped.index.get_level_values('corpus'),
+        'category': [scheme[ix][0] for ix in
+                     grouped.index.get_level_values('category')],
+        'number': grouped['size'].values,
+        'correct': grouped['sum'].values.astype(int)})
+    number = stats.number.values.astype(float)
+    stats['pct'] = 100 * number / \
+        totals.reindex(stats.corpus).values.astype(float)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        acc = stats.correct.values / number
+    stats['correct_pct'] = 100 * numpy.nan_to_num(acc)
+    stats['stderr'] = 100 * numpy.nan_to_num(
+        numpy.sqrt(acc * (1 - acc) / number))
+
+    if num_replicates:
+        tail = 100 * (1 - confidence) / 2
+        lows, highs = [], []
+        for corpus in corpora:
+            mask = data.corpus.values == corpus
+            replicates = bootstrap_accuracy(categories[mask], correct[mask],
+                                            num_categories, num_replicates,
+                                            seed)[:, :len(scheme)]
+            # Categories without rows have all-NaN replicates
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                lows.append(numpy.nanpercentile(replicates, tail, axis=0))
+                highs.append(numpy.nanpercentile(replicates, 100 - tail,
+                                                 axis=0))
+        stats['ci_low'] = 100 * numpy.concatenate(lows)
+        stats['ci_high'] = 100 * numpy.concatenate(highs)
+    return stats
+
+
+def accuracy_by_sample_size(data, scheme=default_scheme):
+    """Return the accuracy of each category as a function of the number of
+    curated rows.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        The curated rows of one corpus, in curation order.
+    scheme : Optional[list]
+        The category scheme.
+
+    Returns
+    -------
+    accuracy : pandas.DataFrame
+        The percentage of correct groundings of each category (columns)
+        among the first n rows, for each n (index), and of all rows
+        (column 'All').
+    """
+    categories = get_category_codes(data, scheme)
+    correct = (data.Grounding.values == 1)
+    onehot = numpy.zeros((len(categories), len(scheme) + 1))
+    onehot[numpy.arange(len(categories)), categories] = 1
+    counts = numpy.cumsum(onehot, axis=0)[:, :len(scheme)]
+    num_correct = numpy.cumsum(onehot * correct[:, None],
+                               axis=0)[:, :len(scheme)]
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        accuracy = 100 * num_correct / counts
+    accuracy = pandas.DataFrame(accuracy, columns=[s[0] for s in scheme],
+                                index=numpy.arange(1, len(categories) + 1))
+    accuracy['All'] = 100 * numpy.cumsum(correct) / accuracy.index.values
+    accuracy.index.name = 'sample_size'
+    return accuracy
@@ -0,0 +1,71 @@
+"""Vectorized rank/frequency curves for plotting.
+
+Several figures show how the mentions of a corpus are distributed over
+ranked strings or entries, with one point per distinct string. These
+functions compute such curves with numpy and reduce them to a fixed number
+of points before plotting, so figures of the full corpus are fast to make
+and small on disk.
+"""
+import numpy
+
+
+def coverage_curve(counts, sort=True):
+    """Return the cumulative coverage curve of a list of counts.
+
+    Parameters
+    ----------
+    counts : list or numpy.ndarray
+        The number of occurrences of each string or entry.
+    sort : Optional[bool]
+        If True (default), the counts are sorted in descending order first,
+        otherwise they are taken to be in rank order already.
+
+    Returns
+    -------
+    ranks : numpy.ndarray
+        The normalized rank of each count, i / len(counts).
+    cum_fracs : numpy.ndarray
+        The fraction of all occurrences covered by the counts up to and
+        including each rank.
+    """
+    counts = numpy.asarray(counts, dtype=float)
+    if sort:
+        counts = -numpy.sort(-counts, kind='stable')
+    cum_counts = numpy.cumsum(counts)
+    total = cum_counts[-1] if len(cum_counts) else 0
+    ranks = numpy.arange(len(counts)) / float(max(len(counts), 1))
+    return ranks, cum_counts / (total if total else 1.0)
+
+
+def quantile_index(cum_fracs, quantile):
+    """Return the first index at which a cumulative fraction reaches a
+    quantile, e.g. the number of top entries covering half of the mentions
+    for quantile=0.5."""
+    return int(numpy.searchsorted(cum_fracs, quantile, side='left'))
+
+
+def downsample(xvals, yvals, num_points=500):
+    """Return at most num_points points of a curve, spread evenly along its
+    length.
+
+    Points are picked at equal steps of arc length, measured with both axes
+    scaled to [0, 1], so they are dense where the curve bends and sparse
+    where it is flat. The first and last points are always kept. This is
+    meant for smooth, monotone curves such as coverage curves; spikes of
+    noisy series would be dropped.
+    """
+    xvals = numpy.asarray(xvals, dtype=float)
+    yvals = numpy.asarray(yvals, dtype=float)
+    if len(xvals) <= num_points:
+        return xvals, yvals
+
+    def scaled(vals):
+        span = vals.max() - vals.min()
+        return (vals - vals.min()) / (span if span else 1.0)
+    steps = numpy.hypot(numpy.diff(scaled(xvals)), numpy.diff(scaled(yvals)))
+    arc = numpy.concatenate([[0], numpy.cumsum(steps)])
+    targets = numpy.linspace(0, arc[-1], num_points)
+    idx = numpy.searchsorted(arc, targets, side='left')
+    idx = numpy.unique(numpy.concatenate([[0], idx, [len(xvals) - 1]]))
+    idx = idx[idx < len(xvals)]
+    return xvals[idx], yvals[idx]
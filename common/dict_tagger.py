@@ -0,0 +1,195 @@
+"""Tag dictionary strings in raw text with an Aho-Corasick automaton.
+
+A DictionaryTagger compiles a dictionary of strings with their groundings,
+e.g. the texts of the grounding map and HGNC gene symbols, into an
+Aho-Corasick automaton, and finds all their mentions in a text in a single
+pass over it, independently of the size of the dictionary. If pyahocorasick
+is installed (pip install pyahocorasick), its automaton is used; otherwise
+the automaton is built here in pure Python. Both give the same mentions.
+
+Texts are matched with dashes folded as in text_matcher.fold_text and case
+folded, with the following rules:
+- a mention must start and end at word boundaries, i.e. not be preceded or
+  followed by a letter or digit (so AKT is found in AKT-mediated but not in
+  pAKT or AKT1);
+- strings of up to exact_case_length characters (e.g. ER, p38) only match
+  with the same case, since short strings are often common words or
+  abbreviations in other cases;
+- of overlapping mentions, the leftmost and then longest one is kept, so
+  that a longer dictionary string (e.g. PI3K p110) takes precedence over
+  the shorter ones it contains.
+"""
+import os
+import sys
+from collections import deque
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.text_matcher import dash_chars
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Strings up to this length are matched case-sensitively
+exact_case_length = 3
+
+_dash_table = {ord(char): '-' for char in dash_chars}
+
+
+def _fold_case(text):
+    """Return a text with dashes and case folded, keeping its length so that
+    offsets into it are offsets into the text."""
+    text = text.translate(_dash_table)
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    # A few characters change length when lower-cased, e.g. U+0130
+    return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class AhoCorasick(object):
+    """A pure Python Aho-Corasick automaton over a list of keys.
+
+    Parameters
+    ----------
+    keys : list[str]
+        The keys to find, with no duplicates.
+    """
+    def __init__(self, keys):
+        self.keys = keys
+        self.goto = [{}]
+        self.outputs = [[]]
+        for key_ix, key in enumerate(keys):
+            state = 0
+            for char in key:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.outputs.append([])
+                state = next_state
+            self.outputs[state].append(key_ix)
+        # Failure links in breadth-first order, merging the outputs of each
+        # state with those of its failure state
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                fail = self.goto[fail].get(char, 0)
+                self.fail[next_state] = fail
+                self.outputs[next_state] += self.outputs[fail]
+
+    def iter(self, text):
+        """Yield (end, key index) pairs of the keys found in a text, where
+        end is the offset of the last character of the key."""
+        goto = self.goto
+        fail = self.fail
+        outputs = self.outputs
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for key_ix in outputs[state]:
+                yield end, key_ix
+
+
+def _make_automaton(keys):
+    if ahocorasick is None:
+        return AhoCorasick(keys)
+    automaton = ahocorasick.Automaton(ahocorasick.STORE_INTS)
+    for key_ix, key in enumerate(keys):
+        automaton.add_word(key, key_ix)
+    automaton.make_automaton()
+    return automaton
+
+
+class DictionaryTagger(object):
+    """A tagger of the mentions of dictionary strings in texts.
+
+    Parameters
+    ----------
+    entries : iterable[tuple]
+        (string, db_refs) pairs, where db_refs is a dict of groundings or
+        None for strings that should not be grounded. Such strings are
+        still matched, so that they block the shorter strings they contain.
+        Of several entries with the same string, the first one is kept.
+    """
+    def __init__(self, entries):
+        self.db_refs = {}
+        key_entries = {}
+        for string, db_refs in entries:
+            if not string.strip() or string in self.db_refs:
+                continue
+            self.db_refs[string] = db_refs
+            key_entries.setdefault(_fold_case(string), []).append(string)
+        self.keys = sorted(key_entries)
+        # The strings of each key, with the case-insensitive ones last
+        self.key_strings = [sorted(key_entries[key],
+                                   key=lambda s: len(s) > exact_case_length)
+                            for key in self.keys]
+        self.automaton = _make_automaton(self.keys)
+
+    @classmethod
+    def from_grounding_map(cls, gmap, extra_entries=()):
+        """Return a tagger of the texts of a GroundingMap, followed by
+        additional entries, e.g. the entries of get_hgnc_entries."""
+        entries = [(text, gmap.get_db_refs(text)) for text in gmap.db_refs]
+        return cls(entries + list(extra_entries))
+
+    def __len__(self):
+        return len(self.db_refs)
+
+    def _match_string(self, key_ix, mention):
+        for string in self.key_strings[key_ix]:
+            if len(string) > exact_case_length or \
+                    string.translate(_dash_table) == mention:
+                return string
+        return None
+
+    def tag(self, text):
+        """Return the mentions of dictionary strings in a text.
+
+        Returns
+        -------
+        mentions : list[tuple]
+            (start, end, string) tuples of the mentions in the text, where
+            text[start:end] is the mention of the dictionary string string,
+            in order of start.
+        """
+        if not self.keys:
+            return []
+        folded = _fold_case(text)
+        dashed = text.translate(_dash_table)
+        found = []
+        for end, key_ix in self.automaton.iter(folded):
+            start = end + 1 - len(self.keys[key_ix])
+            if (start > 0 and folded[start-1].isalnum()) or \
+                    (end + 1 < len(folded) and folded[end+1].isalnum()):
+                continue
+            string = self._match_string(key_ix, dashed[start:end+1])
+            if string is not None:
+                found.append((start, end + 1, string))
+        # Keep the leftmost-longest of overlapping mentions
+        found.sort(key=lambda m: (m[0], -m[1]))
+        mentions = []
+        last_end = 0
+        for mention in found:
+            if mention[0] >= last_end:
+                mentions.append(mention)
+                last_end = mention[1]
+        return mentions
+
+
+def get_hgnc_entries():
+    """Return (symbol, db_refs) entries of the HGNC gene symbols in INDRA."""
+    from indra.databases import hgnc_client
+    return [(symbol, {'HGNC': hgnc_id})
+            for hgnc_id, symbol in hgnc_client.hgnc_names.items()]
@@ -0,0 +1,207 @@
+"""A compact count table of entity texts and their groundings.
+
+Nested dicts of text -> {(namespace, id): count} take hundreds of bytes per
+entry, which adds up to gigabytes over the whole corpus. Here texts and
+(namespace, id) groundings are interned into integer codes and the counts
+are kept as a sparse COO table: sorted int64 keys packing the text and
+grounding codes, and int64 counts. New counts are appended to buffers and
+folded into the table by a vectorized np.unique / bincount pass when the
+buffers fill up, so adding and merging counts stays cheap.
+
+An EntityCounts is saved into a folder of .npy arrays with a vocab.json
+file, like a mention table.
+"""
+import os
+import sys
+import json
+import array
+import numpy
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.mention_table import Vocabulary
+
+
+vocab_file = 'vocab.json'
+# Keys pack the text code into the high and the grounding code into the low
+# 32 bits
+code_bits = 32
+
+
+class EntityCounts(object):
+    """Counts of (text, (namespace, id)) pairs.
+
+    Parameters
+    ----------
+    buffer_size : Optional[int]
+        The number of added counts that are buffered before being folded
+        into the table.
+    """
+    def __init__(self, buffer_size=1000000):
+        self.texts = Vocabulary()
+        self.groundings = Vocabulary()
+        self.keys = numpy.zeros(0, dtype=numpy.int64)
+        self.counts = numpy.zeros(0, dtype=numpy.int64)
+        self.buffer_size = buffer_size
+        self._new_keys = array.array('q')
+        self._new_counts = array.array('q')
+
+    def add(self, text, grounding, count=1):
+        """Add a count for a text with a (namespace, id) grounding."""
+        key = (self.texts.get_code(text) << code_bits) | \
+            self.groundings.get_code(grounding)
+        self._new_keys.append(key)
+        self._new_counts.append(count)
+        if len(self._new_keys) >= self.buffer_size:
+            self.compact()
+
+    def add_entity(self, text, xrefs):
+        """Add counts for a REACH entity with a list of (namespace, id)
+        xrefs.
+
+        An entity without xrefs is counted with the (None, None) grounding,
+        and all UAZ groundings are counted as ('uaz', 'UAZ').
+        """
+        if not text:
+            return
+        if not xrefs:
+            self.add(text, (None, None))
+        for ns, db_id in xrefs:
+            if ns == 'uaz':
+                self.add(text, ('uaz', 'UAZ'))
+            else:
+                self.add(text, (ns, db_id))
+
+    def update(self, entities):
+        """Add counts for a list of REACH entity frame dicts."""
+        for entity in entities:
+            self.add_entity(entity.get('text'),
+                            [(xref['namespace'], xref['id'])
+                             for xref in entity['xrefs'] or []])
+
+    def update_records(self, records):
+        """Add counts for a list of reach_stream.EntityRecords."""
+        for record in records:
+            self.add_entity(record.text, record.xrefs)
+
+    def _add_arrays(self, keys, counts):
+        self.compact()
+        keys = numpy.concatenate([self.keys, keys])
+        counts = numpy.concatenate([self.counts, counts])
+        self.keys, inverse = numpy.unique(keys, return_inverse=True)
+        self.counts = numpy.bincount(inverse, weights=counts,
+                                     minlength=len(self.keys)) \
+            .astype(numpy.int64)
+
+    def compact(self):
+        """Fold the buffered counts into the table."""
+        if not len(self._new_keys):
+            return
+        keys = numpy.frombuffer(self._new_keys, dtype=numpy.int64)
+        counts = numpy.frombuffer(self._new_counts, dtype=numpy.int64)
+        self._new_keys = array.array('q')
+        self._new_counts = array.array('q')
+        self._add_arrays(keys, counts)
+
+    def merge(self, other):
+        """Add all the counts of another EntityCounts."""
+        other.compact()
+        text_map = numpy.array([self.texts.get_code(text)
+                                for text in other.texts.strings],
+                               dtype=numpy.int64)
+        grounding_map = numpy.array([self.groundings.get_code(grounding)
+                                     for grounding in other.groundings.strings],
+                                    dtype=numpy.int64)
+        text_codes, grounding_codes = _unpack(other.keys)
+        keys = (text_map[text_codes] << code_bits) | \
+            grounding_map[grounding_codes]
+        self._add_arrays(keys, other.counts)
+
+    def totals(self):
+        """Return an array of the total count of each text."""
+        self.compact()
+        text_codes, _ = _unpack(self.keys)
+        return numpy.bincount(text_codes, weights=self.counts,
+                              minlength=len(self.texts)).astype(numpy.int64)
+
+    def top_k(self, k=None):
+        """Return the texts with the highest total counts.
+
+        Parameters
+        ----------
+        k : Optional[int]
+            The number of texts to return. Default: all texts.
+
+        Returns
+        -------
+        ranked : list[tuple]
+            (text, {(namespace, id): count}) tuples in descending order of
+            total count.
+        """
+        totals = self.totals()
+        if k is not None and k < len(totals):
+            top = numpy.argpartition(-totals, k)[:k]
+            order = top[numpy.argsort(-totals[top], kind='stable')]
+        else:
+            order = numpy.argsort(-totals, kind='stable')
+        # The keys are sorted by text code, so each text's entries are a
+        # contiguous range of the table
+        text_codes, grounding_codes = _unpack(self.keys)
+        starts = numpy.searchsorted(text_codes, order, side='left')
+        ends = numpy.searchsorted(text_codes, order, side='right')
+        ranked = []
+        for text_code, start, end in zip(order.tolist(), starts.tolist(),
+                                         ends.tolist()):
+            ranked.append((self.texts.strings[text_code],
+                           {self.groundings.strings[g]: int(c) for g, c in
+                            zip(grounding_codes[start:end].tolist(),
+                                self.counts[start:end].tolist())}))
+        return ranked
+
+    def to_dict(self):
+        """Return the counts as a dict of {(namespace, id): count} dicts by
+        text."""
+        return dict(self.top_k())
+
+    def __len__(self):
+        """Return the number of distinct (text, grounding) pairs."""
+        self.compact()
+        return len(self.keys)
+
+    def __getstate__(self):
+        self.compact()
+        state = self.__dict__.copy()
+        state['_new_keys'] = state['_new_counts'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._new_keys = array.array('q')
+        self._new_counts = array.array('q')
+
+    def save(self, path):
+        """Save the counts into a folder."""
+        self.compact()
+        if not os.path.exists(path):
+            os.makedirs(path)
+        numpy.save(os.path.join(path, 'keys.npy'), self.keys)
+        numpy.save(os.path.join(path, 'counts.npy'), self.counts)
+        with open(os.path.join(path, vocab_file), 'w') as fh:
+            json.dump({'texts': self.texts.strings,
+                       'groundings': self.groundings.strings}, fh)
+
+    @classmethod
+    def load(cls, path):
+        """Return the counts saved in a folder."""
+        entity_counts = cls()
+        entity_counts.keys = numpy.load(os.path.join(path, 'keys.npy'))
+        entity_counts.counts = numpy.load(os.path.join(path, 'counts.npy'))
+        with open(os.path.join(path, vocab_file), 'r') as fh:
+            vocabs = json.load(fh)
+        entity_counts.texts = Vocabulary(vocabs['texts'])
+        entity_counts.groundings = Vocabulary([tuple(g) for g in
+                                               vocabs['groundings']])
+        return entity_counts
+
+
+def _unpack(keys):
+    return keys >> code_bits, keys & ((1 << code_bits) - 1)
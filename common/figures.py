@@ -0,0 +1,246 @@
+"""A registry of the figures of the paper and a pipeline to render them.
+
+Each FigureSpec names the script function that makes a figure, the step
+folder it runs in, its input data files and its output files. Figures are
+rendered headless with the Agg backend, in parallel in a process pool with
+one fresh worker process per figure, since the scripts keep module-level
+state and paths relative to their step folder. A manifest in the root of
+this repository records the hash of the inputs of each rendered figure, so
+that only figures whose inputs or code changed, or whose outputs are
+missing, are rendered again. The code of a figure is taken to be the Python
+files of its step folder and of common/, since the figure scripts import
+helper modules from both:
+
+    python common/figures.py                  # render out of date figures
+    python common/figures.py fplx_children --force
+    python common/figures.py --list
+"""
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import importlib
+import traceback
+from collections import namedtuple
+from multiprocessing import Pool
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.result_cache import ResultCache
+from common.mention_table import get_table_path
+
+repo_dir = os.path.abspath(os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), os.pardir))
+manifest_path = os.path.join(repo_dir, '.figure_manifest.json')
+
+FigureSpec = namedtuple('FigureSpec', ['name', 'step_dir', 'module', 'func',
+                                       'inputs', 'outputs'])
+FigureSpec.__doc__ = """A figure made by a function without arguments of a
+script. The input and output paths are relative to the step folder of the
+script, which is the working directory the function is called in."""
+
+
+def famplex_files(*fnames):
+    return [os.path.join('..', '..', 'famplex', fname) for fname in fnames]
+
+
+def corpus_files(fname):
+    """Return the paths a Statement corpus can be read from: its pickle,
+    statement store and mention table."""
+    return [fname, fname[:-len('.pkl')], get_table_path(fname)]
+
+
+test_corpus = '../step3_sample_training_test/famplex_test_stmts_mapped.pkl'
+training_corpus = '../step3_sample_training_test/training_pmid_stmts.pkl'
+
+registry = [
+    FigureSpec('entity_freqs', 'step3_sample_training_test',
+               'make_entity_freqs', 'make_entity_freqs_figure',
+               corpus_files('training_pmid_stmts.pkl') +
+               corpus_files('test_pmid_stmts.pkl'),
+               ['entity_freqs_train_test.png']),
+    FigureSpec('ungrounded', 'step4_stmt_entity_stats',
+               'agent_sample_stats', 'make_ungrounded_figures',
+               corpus_files(test_corpus) + corpus_files(training_corpus),
+               ['ungrounded_stats.pdf', 'ungrounded_frequencies.pdf']),
+    FigureSpec('curation_results', 'step4_stmt_entity_stats',
+               'agent_sample_stats', 'make_curation_figures',
+               ['training_agents_sample_curated.csv',
+                'test_agents_with_fplx_sample_curated.csv'],
+               ['combined_results.pdf', 'combined_results_table.csv']),
+    FigureSpec('num_groundings', 'step5_curate_grounding',
+               'count_groundings', 'make_num_groundings_figure',
+               famplex_files('entities.csv', 'grounding_map.csv'),
+               ['num_groundings.pdf']),
+    FigureSpec('entity_coverage', 'step6_evaluation',
+               'grounding_stats', 'make_coverage_figures',
+               corpus_files(test_corpus) + famplex_files('entities.csv'),
+               ['entity_levels_coverage_test_corpus.pdf',
+                'entity_coverage_test_corpus.pdf',
+                'entity_coverage_test_corpus_distr.pdf']),
+    FigureSpec('fplx_children', 'step6_evaluation',
+               'fplx_stats', 'num_child_concepts',
+               famplex_files('entities.csv', 'relations.csv',
+                             'grounding_map.csv'),
+               ['fplx_children_hist.pdf']),
+    FigureSpec('fplx_citations', 'step6_evaluation',
+               'fplx_stats', 'plot_cit_nums',
+               famplex_files('entities.csv', 'relations.csv',
+                             'grounding_map.csv'),
+               ['fplx_pmids_bar.pdf']),
+    FigureSpec('famplex_mapping', 'step6_evaluation',
+               'mapping_stats', 'make_mapping_figure',
+               famplex_files('entities.csv', 'equivalences.csv'),
+               ['famplex_mapping.pdf']),
+    ]
+
+
+def get_spec_path(spec, path):
+    return os.path.normpath(os.path.join(repo_dir, spec.step_dir, path))
+
+
+def get_code_files(spec):
+    """Return the Python files a figure's script and its imports are in."""
+    return sorted(glob.glob(os.path.join(repo_dir, spec.step_dir, '*.py')) +
+                  glob.glob(os.path.join(repo_dir, 'common', '*.py')))
+
+
+def get_input_hash(spec, cache=None):
+    """Return the hash of the input files and the code of a figure."""
+    cache = cache if cache is not None else ResultCache()
+    paths = [os.path.relpath(path, repo_dir)
+             for path in get_code_files(spec)] + \
+        [os.path.join(spec.step_dir, path) for path in spec.inputs]
+    hashes = [(path, cache.file_hash(os.path.join(repo_dir, path)))
+              for path in paths]
+    key = {'func': '%s:%s' % (spec.module, spec.func), 'files': hashes}
+    return hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+
+
+def load_manifest():
+    try:
+        with open(manifest_path, 'r') as fh:
+            return json.load(fh)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_manifest(manifest):
+    tmp_path = manifest_path + '.%d.tmp' % os.getpid()
+    with open(tmp_path, 'w') as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def is_up_to_date(spec, input_hash, manifest):
+    return manifest.get(spec.name) == input_hash and \
+        all(os.path.exists(get_spec_path(spec, path))
+            for path in spec.outputs)
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def render_figure(spec):
+    """Render a figure in the current process and return a (name, error,
+    seconds) tuple, with the traceback as error if rendering failed."""
+    import matplotlib.pyplot as plt
+    step_dir = os.path.join(repo_dir, spec.step_dir)
+    cwd = os.getcwd()
+    ts = time.time()
+    error = None
+    try:
+        os.chdir(step_dir)
+        if step_dir not in sys.path:
+            sys.path.insert(0, step_dir)
+        module = importlib.import_module(spec.module)
+        getattr(module, spec.func)()
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        plt.close('all')
+        os.chdir(cwd)
+    return spec.name, error, time.time() - ts
+
+
+def render_figures(names=None, force=False, processes=None):
+    """Render the out of date figures of the registry.
+
+    Parameters
+    ----------
+    names : Optional[list[str]]
+        The names of the figures to consider. Default: all figures.
+    force : Optional[bool]
+        If True, render the figures even if they are up to date.
+    processes : Optional[int]
+        The number of worker processes. Default: the number of CPUs.
+
+    Returns
+    -------
+    failed : list[str]
+        The names of the figures that could not be rendered.
+    """
+    specs = registry if not names else [spec for spec in registry
+                                        if spec.name in names]
+    unknown = set(names or []) - set(spec.name for spec in registry)
+    if unknown:
+        raise ValueError('Unknown figures: %s' % ', '.join(sorted(unknown)))
+    cache = ResultCache()
+    manifest = load_manifest()
+    input_hashes = {spec.name: get_input_hash(spec, cache) for spec in specs}
+    todo = [spec for spec in specs if force or
+            not is_up_to_date(spec, input_hashes[spec.name], manifest)]
+    for spec in specs:
+        if spec not in todo:
+            print('%s is up to date' % spec.name)
+    if not todo:
+        return []
+
+    failed = []
+    pool = Pool(processes, initializer=_init_worker, maxtasksperchild=1)
+    try:
+        for name, error, seconds in pool.imap_unordered(render_figure, todo):
+            if error:
+                print('Failed to render %s:\n%s' % (name, error))
+                failed.append(name)
+                manifest.pop(name, None)
+            else:
+                print('Rendered %s in %.1fs' % (name, seconds))
+                manifest[name] = input_hashes[name]
+            # Save after each figure so finished figures are kept if the
+            # run is interrupted
+            save_manifest(manifest)
+    finally:
+        pool.close()
+        pool.join()
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Render the figures whose input data changed.')
+    parser.add_argument('names', nargs='*',
+                        help='The figures to render. Default: all.')
+    parser.add_argument('--force', action='store_true',
+                        help='Render figures even if they are up to date.')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--list', action='store_true',
+                        help='List the figures and whether they are up to '
+                             'date.')
+    args = parser.parse_args()
+    if args.list:
+        manifest = load_manifest()
+        for spec in registry:
+            status = 'up to date' if is_up_to_date(
+                spec, get_input_hash(spec), manifest) else 'out of date'
+            print('%s (%s/%s.py:%s): %s -> %s' %
+                  (spec.name, spec.step_dir, spec.module, spec.func, status,
+                   ', '.join(spec.outputs)))
+    else:
+        failed = render_figures(args.names, args.force, args.processes)
+        if failed:
+            sys.exit(1)
@@ -0,0 +1,135 @@
+"""An indexed FamPlex grounding map.
+
+The grounding map (grounding_map.csv) maps texts to groundings, with rows of
+a text followed by (namespace, ID) pairs, or by empty cells for texts that
+should not be grounded. A GroundingMap parses the file once and indexes it
+by text, by FamPlex ID, by namespace and by normalized text, so that the
+scripts of steps 5 and 6 don't each parse and scan it again.
+
+Parsed grounding maps are cached as pickles with common/result_cache.py,
+keyed by the content hash of the CSV file, and kept in memory for the rest
+of the process, so get_grounding_map only parses a file once for as long as
+it doesn't change. The maps and sets returned by its methods are copies, so
+that callers can modify them freely.
+"""
+import os
+import sys
+import csv
+from collections import Counter, defaultdict
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.result_cache import cached
+from common.text_matcher import fold_text
+
+# The version of the indexes of GroundingMap, so that snapshots made by
+# other versions are not used
+snapshot_version = 2
+
+
+class GroundingMap(object):
+    """The indexed rows of a grounding map.
+
+    Parameters
+    ----------
+    rows : iterable[list[str]]
+        The rows of the grounding map.
+
+    Attributes
+    ----------
+    db_refs : dict
+        The db_refs of each text, including the TEXT itself, or None for
+        texts that should not be grounded.
+    fplx_texts : dict
+        The texts grounded to each FamPlex ID, in file order.
+    namespace_counts : collections.Counter
+        The number of texts grounded to each namespace.
+    norm_texts : dict
+        The texts with each normalized form, see text_matcher.fold_text.
+    """
+    def __init__(self, rows):
+        self.db_refs = {}
+        self.fplx_texts = defaultdict(list)
+        self.namespace_counts = Counter()
+        self.norm_texts = defaultdict(list)
+        for row in rows:
+            text = row[0]
+            db_refs = {'TEXT': text}
+            db_refs.update((ns, db_id) for ns, db_id in
+                           zip(row[1::2], row[2::2]) if ns and db_id)
+            self.db_refs[text] = db_refs if len(db_refs) > 1 else None
+            for ns in db_refs:
+                if ns != 'TEXT':
+                    self.namespace_counts[ns] += 1
+            if 'FPLX' in db_refs:
+                self.fplx_texts[db_refs['FPLX']].append(text)
+            self.norm_texts[fold_text(text)].append(text)
+        self.fplx_texts = dict(self.fplx_texts)
+        self.norm_texts = dict(self.norm_texts)
+
+    @classmethod
+    def from_csv(cls, filename):
+        """Return the grounding map of a CSV file."""
+        with open(filename, 'r', encoding='utf-8') as fh:
+            return cls(csv.reader(fh, delimiter=',', quotechar='"'))
+
+    def __len__(self):
+        return len(self.db_refs)
+
+    def __contains__(self, text):
+        return text in self.db_refs
+
+    def get_db_refs(self, text):
+        """Return the db_refs of a text, or None if the text isn't grounded
+        in the map."""
+        db_refs = self.db_refs.get(text)
+        return dict(db_refs) if db_refs else None
+
+    def get_texts(self, fplx_id):
+        """Return the set of texts grounded to a FamPlex ID."""
+        return set(self.fplx_texts.get(fplx_id, ()))
+
+    def num_synonyms(self, fplx_id):
+        """Return the number of texts grounded to a FamPlex ID."""
+        return len(self.fplx_texts.get(fplx_id, ()))
+
+    def get_norm_matches(self, text):
+        """Return the texts of the map with the same normalized form as a
+        given text."""
+        return list(self.norm_texts.get(fold_text(text), ()))
+
+    def has_norm_match(self, text):
+        return fold_text(text) in self.norm_texts
+
+    def to_dict(self):
+        """Return the map as a dict of db_refs by text, as loaded by
+        step6_evaluation/util.load_grounding_map."""
+        return {text: dict(db_refs) if db_refs else None
+                for text, db_refs in self.db_refs.items()}
+
+    def reverse_map(self):
+        """Return a defaultdict of the sets of texts by FamPlex ID."""
+        reverse = defaultdict(set)
+        for fplx_id, texts in self.fplx_texts.items():
+            reverse[fplx_id] = set(texts)
+        return reverse
+
+
+@cached(files=lambda filename, version: [filename])
+def _load_grounding_map(filename, version):
+    return GroundingMap.from_csv(filename)
+
+
+_grounding_maps = {}
+
+
+def get_grounding_map(filename):
+    """Return the GroundingMap of a grounding map CSV file.
+
+    The map is parsed only if the file changed since it was last parsed,
+    in this process or (through the result cache) in an earlier one.
+    """
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+    if key not in _grounding_maps:
+        _grounding_maps[key] = _load_grounding_map(filename, snapshot_version)
+    return _grounding_maps[key]
@@ -0,0 +1,283 @@
+"""A persistent table of agent texts with their groundings and counts.
+
+Curation sessions start from the list of agent texts of a corpus with their
+groundings and counts, as returned by
+grounding_mapper.agent_texts_with_grounding, which needs all Statements of
+the corpus in memory. A grounding table holds the same list in flat arrays
+saved as .npy files, built once per corpus and memory-mapped on load:
+
+Text columns (one row per text, in descending order of total count):
+- offsets: the rows of text i are rows offsets[i]:offsets[i+1]
+- totals: the number of mentions of the text
+
+Grounding columns (one row per text and grounding, in descending order of
+count for each text):
+- r_text: the text, as an index into the texts vocabulary
+- r_ns, r_id: the grounding, as indices into the namespaces and ids
+  vocabularies (-1 for ungrounded mentions)
+- r_count: the number of mentions of the text with the grounding
+
+Grounding index:
+- g_keys: the sorted keys r_ns * len(ids) + r_id of the grounded rows
+- g_rows: the row of each key
+
+As in MentionTable.texts_with_grounding, the counts of a grounding are
+merged across the different db_refs combinations it appears in. The table
+records the format version and a signature of the files of the corpus it
+was built from (their sizes and modification times, so that checking it
+doesn't read the corpus), and open_grounding_table builds it again if
+either changed. By convention a
+table is saved next to its corpus, e.g. training_pmid_stmts.pkl ->
+training_pmid_stmts_groundings/.
+"""
+import os
+import sys
+import json
+import numpy
+from collections import Counter
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.stmt_store import iter_chunks, get_store_path, index_file
+from common.mention_table import Vocabulary, open_mention_table, \
+    get_table_path, vocab_file, _id_str
+
+table_version = 1
+meta_file = 'meta.json'
+columns = {'offsets': numpy.int64, 'totals': numpy.int64,
+           'r_text': numpy.int32, 'r_ns': numpy.int16, 'r_id': numpy.int32,
+           'r_count': numpy.int64, 'g_keys': numpy.int64,
+           'g_rows': numpy.int64}
+
+
+def get_grounding_table_path(fname):
+    """Return the grounding table path for a Statement pickle or store."""
+    if fname.endswith('.pkl'):
+        fname = fname[:-len('.pkl')]
+    return fname.rstrip('/') + '_groundings'
+
+
+def _stat_signature(path):
+    if not os.path.exists(path):
+        return 'missing'
+    stat = os.stat(path)
+    return '%d:%d' % (stat.st_size, stat.st_mtime_ns)
+
+
+def get_source_hash(fname):
+    """Return a signature of the files a corpus can be read from: the
+    Statement pickle, the index of the statement store and the vocabularies
+    of the mention table."""
+    store_path = get_store_path(fname) or fname[:-len('.pkl')]
+    paths = [fname, os.path.join(store_path, index_file),
+             os.path.join(get_table_path(fname), vocab_file)]
+    return '-'.join(_stat_signature(path) for path in paths)
+
+
+def count_text_groundings(source):
+    """Return text and grounding counts of a Statement corpus.
+
+    Returns
+    -------
+    totals : collections.Counter
+        The number of mentions of each text.
+    counts : collections.Counter
+        The number of mentions of each (text, namespace, id), with
+        (text, None, None) for ungrounded mentions.
+    """
+    totals = Counter()
+    counts = Counter()
+    for stmts in iter_chunks(source):
+        for stmt_list in stmts.values():
+            for stmt in stmt_list:
+                for agent in stmt.agent_list():
+                    if agent is None:
+                        continue
+                    text = agent.db_refs.get('TEXT')
+                    if text is None:
+                        continue
+                    totals[text] += 1
+                    grounded = False
+                    for ns, db_id in agent.db_refs.items():
+                        if ns != 'TEXT':
+                            counts[(text, ns, _id_str(db_id))] += 1
+                            grounded = True
+                    if not grounded:
+                        counts[(text, None, None)] += 1
+    return totals, counts
+
+
+def build_grounding_table(source, path, source_hash=None):
+    """Build the grounding table of a Statement corpus.
+
+    Parameters
+    ----------
+    source : str or StatementStore or dict or list
+        The Statements, in any form accepted by stmt_store.iter_chunks. If
+        a file name is given and the corpus has a mention table, the table
+        is built from the mention table instead.
+    path : str
+        The directory in which the table is saved.
+    source_hash : Optional[str]
+        The signature of the corpus, recorded in the table. Default: the
+        signature of source if it is a file name, taken after its mention
+        table is brought up to date.
+
+    Returns
+    -------
+    table : GroundingTable
+        The table, loaded from path.
+    """
+    mention_table = open_mention_table(source) \
+        if isinstance(source, str) else None
+    if source_hash is None and isinstance(source, str):
+        source_hash = get_source_hash(source)
+    if mention_table is not None:
+        entries = mention_table.texts_with_grounding()
+    else:
+        totals, counts = count_text_groundings(source)
+        refs = {}
+        for (text, ns, db_id), count in counts.items():
+            refs.setdefault(text, []).append((ns, db_id, count))
+        entries = [(text, tuple(sorted(refs[text], key=lambda x: x[2],
+                                       reverse=True)), total)
+                   for text, total in sorted(totals.items(),
+                                             key=lambda x: x[1],
+                                             reverse=True)]
+
+    namespaces = Vocabulary()
+    ids = Vocabulary()
+    cols = {name: [] for name in columns}
+    cols['offsets'].append(0)
+    for text_ix, (text, refs, total) in enumerate(entries):
+        cols['totals'].append(total)
+        for ns, db_id, count in refs:
+            cols['r_text'].append(text_ix)
+            cols['r_ns'].append(-1 if ns is None else namespaces.get_code(ns))
+            cols['r_id'].append(-1 if db_id is None else ids.get_code(db_id))
+            cols['r_count'].append(count)
+        cols['offsets'].append(len(cols['r_text']))
+    arrays = {name: numpy.array(cols[name], dtype=dtype)
+              for name, dtype in columns.items()
+              if name not in ('g_keys', 'g_rows')}
+    grounded = numpy.flatnonzero(arrays['r_ns'] >= 0)
+    keys = arrays['r_ns'][grounded].astype(numpy.int64) * len(ids) + \
+        arrays['r_id'][grounded]
+    order = numpy.argsort(keys, kind='stable')
+    arrays['g_keys'] = keys[order]
+    arrays['g_rows'] = grounded[order].astype(numpy.int64)
+
+    if not os.path.exists(path):
+        os.makedirs(path)
+    for name, arr in arrays.items():
+        numpy.save(os.path.join(path, name + '.npy'), arr)
+    meta = {'version': table_version, 'source_hash': source_hash,
+            'texts': [entry[0] for entry in entries],
+            'namespaces': namespaces.strings, 'ids': ids.strings}
+    with open(os.path.join(path, meta_file), 'w') as fh:
+        json.dump(meta, fh)
+    print('Saved %d texts with %d groundings into %s' %
+          (len(entries), len(arrays['r_text']), path))
+    return GroundingTable(path)
+
+
+class GroundingTable(object):
+    """A grounding table loaded from disk.
+
+    The table is a sequence of (text, ((db, db_id, count), ...), total_count)
+    entries in descending order of total count, like the output of
+    grounding_mapper.agent_texts_with_grounding, with ungrounded mentions
+    listed as (None, None, count).
+
+    Parameters
+    ----------
+    path : str
+        The directory of the table.
+    mmap : Optional[bool]
+        If True (default), the columns are memory-mapped rather than read
+        into memory.
+    """
+    def __init__(self, path, mmap=True):
+        self.path = path
+        for name in columns:
+            setattr(self, name,
+                    numpy.load(os.path.join(path, name + '.npy'),
+                               mmap_mode='r' if mmap else None))
+        with open(os.path.join(path, meta_file), 'r') as fh:
+            meta = json.load(fh)
+        self.version = meta['version']
+        self.source_hash = meta['source_hash']
+        self.texts = meta['texts']
+        self.namespaces = meta['namespaces']
+        self.ids = meta['ids']
+        self._text_ix = None
+        self._codes = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, ix):
+        if isinstance(ix, slice):
+            return [self[i] for i in range(*ix.indices(len(self)))]
+        if ix < 0:
+            ix += len(self)
+        start, end = int(self.offsets[ix]), int(self.offsets[ix+1])
+        return (self.texts[ix], self._get_refs(start, end),
+                int(self.totals[ix]))
+
+    def __iter__(self):
+        for ix in range(len(self)):
+            yield self[ix]
+
+    def _get_refs(self, start, end):
+        return tuple((self.namespaces[ns] if ns >= 0 else None,
+                      self.ids[db_id] if db_id >= 0 else None, count)
+                     for ns, db_id, count in
+                     zip(self.r_ns[start:end].tolist(),
+                         self.r_id[start:end].tolist(),
+                         self.r_count[start:end].tolist()))
+
+    def get_text(self, text):
+        """Return the entry of a text, or None if the text isn't in the
+        table."""
+        if self._text_ix is None:
+            self._text_ix = {t: ix for ix, t in enumerate(self.texts)}
+        ix = self._text_ix.get(text)
+        return None if ix is None else self[ix]
+
+    def get_grounding(self, ns, db_id):
+        """Return (text, count) pairs of the texts grounded to a given
+        namespace and ID, in descending order of count."""
+        if self._codes is None:
+            self._codes = ({ns: ix for ix, ns in enumerate(self.namespaces)},
+                           {db_id: ix for ix, db_id in enumerate(self.ids)})
+        ns_code = self._codes[0].get(ns)
+        id_code = self._codes[1].get(_id_str(db_id))
+        if ns_code is None or id_code is None:
+            return []
+        key = ns_code * len(self.ids) + id_code
+        start = numpy.searchsorted(self.g_keys, key, side='left')
+        end = numpy.searchsorted(self.g_keys, key, side='right')
+        rows = numpy.asarray(self.g_rows[start:end])
+        counts = numpy.asarray(self.r_count)[rows]
+        order = numpy.argsort(-counts, kind='stable')
+        return [(self.texts[text_ix], count) for text_ix, count in
+                zip(numpy.asarray(self.r_text)[rows][order].tolist(),
+                    counts[order].tolist())]
+
+
+def open_grounding_table(fname):
+    """Return the grounding table of a Statement pickle or store, building
+    it first if it doesn't exist or is out of date."""
+    path = get_grounding_table_path(fname)
+    if os.path.exists(os.path.join(path, meta_file)):
+        table = GroundingTable(path)
+        if table.version == table_version and \
+                table.source_hash == get_source_hash(fname):
+            return table
+    return build_grounding_table(fname, path)
+
+
+if __name__ == '__main__':
+    # Build the grounding table of each Statement pickle or store given
+    for fname in sys.argv[1:]:
+        open_grounding_table(fname)
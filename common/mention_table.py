@@ -0,0 +1,295 @@
+"""A columnar table of the agent mentions in a Statement corpus.
+
+Many statistics in steps 3-6 only need the text and groundings of each
+agent, yet have to unpickle every Statement to get them. A mention table
+extracts these once into flat integer arrays saved as .npy files, which are
+memory-mapped on load so that statistics become vectorized scans:
+
+Statement columns (one row per Statement):
+- stmt_pmid: the PMID of the Statement (-1 if unknown)
+- stmt_type: the Statement type, as an index into the stmt_types vocabulary
+
+Mention columns (one row per agent position of a Statement):
+- m_stmt: the row of the Statement in the Statement columns
+- m_pos: the position of the agent in Statement.agent_list()
+- m_text: the agent's TEXT, as an index into the texts vocabulary
+  (-1 if the agent is None or has no TEXT)
+- m_nrefs: the number of db_refs other than TEXT (-1 if the agent is None)
+
+Grounding columns (one row per db_refs entry other than TEXT):
+- g_mention: the row of the mention in the mention columns
+- g_ns: the namespace, as an index into the namespaces vocabulary
+- g_id: the identifier, as an index into the ids vocabulary
+
+A mention table is by convention saved next to the Statement pickle it was
+made from, e.g. training_pmid_stmts.pkl -> training_pmid_stmts_mentions/.
+The table records its format version and the hash of the corpus it was made
+from, and open_mention_table builds it again if either changed.
+"""
+import os
+import sys
+import json
+import array
+import numpy
+from collections import defaultdict
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.stmt_store import iter_chunks, get_store_path
+from common.result_cache import ResultCache
+
+
+table_version = 1
+vocab_file = 'vocab.json'
+# Array type codes of the columns while they are being built
+columns = {'stmt_pmid': 'q', 'stmt_type': 'h',
+           'm_stmt': 'q', 'm_pos': 'h', 'm_text': 'i', 'm_nrefs': 'h',
+           'g_mention': 'q', 'g_ns': 'h', 'g_id': 'i'}
+dtypes = {'q': numpy.int64, 'i': numpy.int32, 'h': numpy.int16}
+
+
+class Vocabulary(object):
+    """Map strings to consecutive integer codes."""
+    def __init__(self, strings=None):
+        self.strings = list(strings) if strings else []
+        self.codes = {s: ix for ix, s in enumerate(self.strings)}
+
+    def get_code(self, s):
+        """Return the code of a string, adding it if it's new."""
+        code = self.codes.get(s)
+        if code is None:
+            code = len(self.strings)
+            self.codes[s] = code
+            self.strings.append(s)
+        return code
+
+    def __len__(self):
+        return len(self.strings)
+
+
+def _id_str(db_id):
+    return db_id if isinstance(db_id, str) else repr(db_id)
+
+
+def get_source_hash(fname):
+    """Return the hash of the Statement pickle and store of a corpus."""
+    cache = ResultCache()
+    paths = [fname, get_store_path(fname) or fname[:-len('.pkl')]]
+    return '-'.join(cache.file_hash(path) for path in paths)
+
+
+def build_mention_table(source, path, source_hash=None):
+    """Extract the agent mentions of a Statement corpus into a table.
+
+    Parameters
+    ----------
+    source : str or StatementStore or dict or list
+        The Statements, in any form accepted by stmt_store.iter_chunks.
+    path : str
+        The directory in which the table is saved.
+    source_hash : Optional[str]
+        The hash of the corpus, recorded in the table.
+
+    Returns
+    -------
+    table : MentionTable
+        The new table.
+    """
+    cols = {name: array.array(code) for name, code in columns.items()}
+    vocabs = {name: Vocabulary()
+              for name in ('texts', 'namespaces', 'ids', 'stmt_types')}
+    for chunk in iter_chunks(source):
+        for pmid, stmts in chunk.items():
+            pmid = int(pmid) if pmid and str(pmid).isdigit() else -1
+            for stmt in stmts:
+                stmt_ix = len(cols['stmt_pmid'])
+                cols['stmt_pmid'].append(pmid)
+                cols['stmt_type'].append(
+                    vocabs['stmt_types'].get_code(type(stmt).__name__))
+                for pos, agent in enumerate(stmt.agent_list()):
+                    mention_ix = len(cols['m_stmt'])
+                    cols['m_stmt'].append(stmt_ix)
+                    cols['m_pos'].append(pos)
+                    if agent is None:
+                        cols['m_text'].append(-1)
+                        cols['m_nrefs'].append(-1)
+                        continue
+                    text = agent.db_refs.get('TEXT')
+                    cols['m_text'].append(-1 if text is None else
+                                          vocabs['texts'].get_code(text))
+                    nrefs = 0
+                    for ns, db_id in agent.db_refs.items():
+                        if ns == 'TEXT':
+                            continue
+                        nrefs += 1
+                        cols['g_mention'].append(mention_ix)
+                        cols['g_ns'].append(vocabs['namespaces'].get_code(ns))
+                        cols['g_id'].append(
+                            vocabs['ids'].get_code(_id_str(db_id)))
+                    cols['m_nrefs'].append(nrefs)
+
+    if not os.path.exists(path):
+        os.makedirs(path)
+    for name, col in cols.items():
+        numpy.save(os.path.join(path, name + '.npy'),
+                   numpy.frombuffer(col, dtype=dtypes[columns[name]]))
+    with open(os.path.join(path, vocab_file), 'w') as fh:
+        meta = {name: vocab.strings for name, vocab in vocabs.items()}
+        meta.update({'version': table_version, 'source_hash': source_hash})
+        json.dump(meta, fh)
+    print('Extracted %d mentions from %d Statements into %s' %
+          (len(cols['m_stmt']), len(cols['stmt_pmid']), path))
+    return MentionTable(path)
+
+
+class MentionTable(object):
+    """A mention table loaded from disk.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the table.
+    mmap : Optional[bool]
+        If True (default), the columns are memory-mapped rather than read
+        into memory.
+
+    Attributes
+    ----------
+    texts, namespaces, ids, stmt_types : list[str]
+        The vocabularies that the integer codes of the columns index into.
+    """
+    def __init__(self, path, mmap=True):
+        self.path = path
+        for name in columns:
+            setattr(self, name,
+                    numpy.load(os.path.join(path, name + '.npy'),
+                               mmap_mode='r' if mmap else None))
+        with open(os.path.join(path, vocab_file), 'r') as fh:
+            vocabs = json.load(fh)
+        self.texts = vocabs['texts']
+        self.namespaces = vocabs['namespaces']
+        self.ids = vocabs['ids']
+        self.stmt_types = vocabs['stmt_types']
+        self.version = vocabs.get('version')
+        self.source_hash = vocabs.get('source_hash')
+
+    def __len__(self):
+        return len(self.m_stmt)
+
+    def text_counts(self):
+        """Return an array of the number of mentions of each text."""
+        m_text = numpy.asarray(self.m_text)
+        return numpy.bincount(m_text[m_text >= 0], minlength=len(self.texts))
+
+    def ungrounded_mask(self):
+        """Return a mask of mentions with a TEXT but no other db_refs."""
+        return (numpy.asarray(self.m_nrefs) == 0) & \
+            (numpy.asarray(self.m_text) >= 0)
+
+    def ungrounded_text_counts(self):
+        """Return an array of the number of ungrounded mentions of each
+        text."""
+        m_text = numpy.asarray(self.m_text)[self.ungrounded_mask()]
+        return numpy.bincount(m_text, minlength=len(self.texts))
+
+    def sorted_text_counts(self, counts):
+        """Return a list of (text, count) tuples with nonzero count from an
+        array of counts per text, in descending order of count."""
+        order = numpy.argsort(-counts, kind='stable')
+        order = order[counts[order] > 0]
+        return [(self.texts[ix], int(counts[ix])) for ix in order]
+
+    def grounding_counts(self, namespace):
+        """Return a dict of the number of mentions grounded to each ID of a
+        given namespace."""
+        if namespace not in self.namespaces:
+            return {}
+        ns_mask = numpy.asarray(self.g_ns) == self.namespaces.index(namespace)
+        counts = numpy.bincount(numpy.asarray(self.g_id)[ns_mask],
+                                minlength=len(self.ids))
+        return {self.ids[ix]: int(counts[ix])
+                for ix in numpy.nonzero(counts)[0]}
+
+    def statement_ungrounded_masks(self):
+        """Return masks of the Statements with all and with any of their
+        agents ungrounded.
+
+        As in agent_sample_stats, an agent that is None counts as grounded.
+        """
+        num_stmts = len(self.stmt_pmid)
+        m_stmt = numpy.asarray(self.m_stmt)
+        num_agents = numpy.bincount(m_stmt, minlength=num_stmts)
+        num_ungrounded = numpy.bincount(m_stmt[self.ungrounded_mask()],
+                                        minlength=num_stmts)
+        return num_ungrounded == num_agents, num_ungrounded > 0
+
+    def texts_with_grounding(self):
+        """Return texts with their groundings and counts.
+
+        The result has the same form as the output of
+        grounding_mapper.agent_texts_with_grounding: a list of
+        (text, ((db, db_id, count), ...), total_count) tuples in descending
+        order of total count. Ungrounded mentions are listed as
+        (None, None, count). Unlike agent_texts_with_grounding, counts of
+        a (db, db_id) pair are merged across different db_refs combinations.
+        """
+        m_text = numpy.asarray(self.m_text)
+        totals = self.text_counts()
+        groundings = defaultdict(list)
+        g_text = m_text[numpy.asarray(self.g_mention)]
+        keep = g_text >= 0
+        rows = numpy.stack([g_text[keep],
+                            numpy.asarray(self.g_ns)[keep].astype(numpy.int32),
+                            numpy.asarray(self.g_id)[keep]], axis=1)
+        if len(rows):
+            rows, counts = numpy.unique(rows, axis=0, return_counts=True)
+            for (text_ix, ns_ix, id_ix), count in zip(rows.tolist(),
+                                                      counts.tolist()):
+                groundings[text_ix].append((self.namespaces[ns_ix],
+                                            self.ids[id_ix], count))
+        ungrounded = self.ungrounded_text_counts()
+        for text_ix in numpy.nonzero(ungrounded)[0].tolist():
+            groundings[text_ix].append((None, None, int(ungrounded[text_ix])))
+        entries = []
+        for text_ix in numpy.argsort(-totals, kind='stable').tolist():
+            if not totals[text_ix]:
+                break
+            refs = sorted(groundings[text_ix], key=lambda x: x[2],
+                          reverse=True)
+            entries.append((self.texts[text_ix], tuple(refs),
+                            int(totals[text_ix])))
+        return entries
+
+
+def get_table_path(fname):
+    """Return the mention table path for a Statement pickle or store."""
+    if fname.endswith('.pkl'):
+        fname = fname[:-len('.pkl')]
+    return fname.rstrip('/') + '_mentions'
+
+
+def open_mention_table(fname):
+    """Return the mention table made from a Statement pickle or store if
+    one exists, otherwise None.
+
+    A table that is out of date with its corpus is built again, unless the
+    corpus is no longer there to build it from.
+    """
+    path = get_table_path(fname)
+    if not os.path.exists(os.path.join(path, vocab_file)):
+        return None
+    table = MentionTable(path)
+    source_hash = get_source_hash(fname)
+    if table.version == table_version and \
+            table.source_hash == source_hash:
+        return table
+    if not os.path.exists(fname) and get_store_path(fname) is None:
+        return table
+    print('Mention table %s is out of date, building it again' % path)
+    return build_mention_table(fname, path, source_hash)
+
+
+if __name__ == '__main__':
+    # Build a mention table for each Statement pickle or store given
+    for fname in sys.argv[1:]:
+        build_mention_table(fname, get_table_path(fname),
+                            get_source_hash(fname))
@@ -0,0 +1,226 @@
+"""A character n-gram inverted index for fuzzy string search.
+
+Fuzzy matching a keyword against every distinct agent text of a corpus
+takes a Python-level comparison per text. The index instead maps each
+character trigram (of the upper-cased text, padded with a space on both
+sides) to the sorted ids of the texts containing it, as one flat postings
+array with an offset per trigram. The number of trigrams a query shares with
+every text is then counted with a single numpy.bincount over the postings
+of the query's trigrams, and only the texts sharing the most trigrams are
+candidates for exact fuzzy scoring.
+
+An index is saved as a folder of .npy arrays and a JSON file of its texts
+and trigrams, and the arrays are memory-mapped on load. By convention the
+index of the texts of a Statement corpus is saved next to it, e.g.
+training_pmid_stmts.pkl -> training_pmid_stmts_trigrams/.
+"""
+import os
+import sys
+import json
+import array
+import hashlib
+import numpy
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.mention_table import Vocabulary
+
+index_file = 'ngrams.json'
+
+
+def get_ngrams(text, n=3, pad=True):
+    """Return the set of character n-grams of an upper-cased text.
+
+    With pad=True, the text is padded with a space on both sides so that
+    texts shorter than n have n-grams, and n-grams at the start and end of a
+    text are marked as such.
+    """
+    text = text.upper()
+    if pad:
+        text = ' %s ' % text
+    return set(text[ix:ix+n] for ix in range(len(text) - n + 1))
+
+
+def get_texts_hash(texts):
+    """Return a hash identifying a list of texts and their order."""
+    sha = hashlib.sha256()
+    for text in texts:
+        sha.update(text.encode('utf-8'))
+        sha.update(b'\0')
+    return sha.hexdigest()
+
+
+def get_index_path(fname):
+    """Return the n-gram index path for a Statement pickle or store."""
+    if fname.endswith('.pkl'):
+        fname = fname[:-len('.pkl')]
+    return fname.rstrip('/') + '_trigrams'
+
+
+class NgramIndex(object):
+    """An inverted index from character n-grams to texts.
+
+    Parameters
+    ----------
+    texts : list[str]
+        The texts to index. Texts are identified by their position in the
+        list.
+    n : Optional[int]
+        The length of the n-grams. Default: 3
+
+    Attributes
+    ----------
+    grams : list[str]
+        The n-grams appearing in any text.
+    offsets : numpy.ndarray
+        The postings of grams[i] are postings[offsets[i]:offsets[i+1]].
+    postings : numpy.ndarray
+        The ids of the texts containing each n-gram.
+    num_grams : numpy.ndarray
+        The number of distinct padded n-grams of each text.
+    """
+    def __init__(self, texts, n=3):
+        self.texts = list(texts)
+        self.n = n
+        self.texts_hash = get_texts_hash(self.texts)
+        vocab = Vocabulary()
+        gram_codes = array.array('i')
+        text_ids = array.array('i')
+        num_grams = array.array('i')
+        for text_id, text in enumerate(self.texts):
+            grams = get_ngrams(text, n)
+            num_grams.append(len(grams))
+            for gram in grams:
+                gram_codes.append(vocab.get_code(gram))
+                text_ids.append(text_id)
+        gram_codes = numpy.frombuffer(gram_codes, dtype=numpy.int32)
+        text_ids = numpy.frombuffer(text_ids, dtype=numpy.int32)
+        # Group the text ids by n-gram, in increasing text id order
+        order = numpy.lexsort((text_ids, gram_codes))
+        self.grams = vocab.strings
+        self.gram_codes = vocab.codes
+        self.postings = text_ids[order]
+        self.offsets = numpy.zeros(len(vocab) + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(gram_codes, minlength=len(vocab)),
+                     out=self.offsets[1:])
+        self.num_grams = numpy.frombuffer(num_grams, dtype=numpy.int32)
+        self._short_ids = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def short_ids(self):
+        """The ids of the texts shorter than n."""
+        if self._short_ids is None:
+            self._short_ids = [ix for ix, text in enumerate(self.texts)
+                               if len(text) < self.n]
+        return self._short_ids
+
+    def shared_counts(self, grams):
+        """Return the number of given n-grams contained in each text."""
+        slices = []
+        for gram in grams:
+            code = self.gram_codes.get(gram)
+            if code is not None:
+                slices.append(self.postings[self.offsets[code]:
+                                            self.offsets[code+1]])
+        if not slices:
+            return numpy.zeros(len(self.texts), dtype=numpy.int64)
+        return numpy.bincount(numpy.concatenate(slices),
+                              minlength=len(self.texts))
+
+    def candidates(self, query, num_candidates=200, partial=True):
+        """Return the ids of the texts most similar to a query.
+
+        Parameters
+        ----------
+        query : str
+            The query text.
+        num_candidates : Optional[int]
+            The maximal number of candidates to return.
+        partial : Optional[bool]
+            If True (default), texts are ranked by the fraction of the
+            n-grams of the query they contain, or of their own n-grams the
+            query contains, as for a substring match. If False,
+            they are ranked by the Dice coefficient of their padded n-grams
+            with those of the query, as for a whole string match.
+
+        Returns
+        -------
+        ids : numpy.ndarray
+            The ids of the candidate texts, from the most to the least
+            similar. Texts sharing no n-gram with the query are left out.
+            For partial queries shorter than n, there is no n-gram to look
+            up and all texts are returned.
+
+        Texts sharing no n-gram with the query can still have a fuzzy match
+        ratio with it of up to about 80, so this is meant for finding the
+        best matches of a query rather than all of its matches.
+        """
+        if partial:
+            grams = get_ngrams(query, self.n, pad=False)
+            if not grams:
+                return numpy.arange(len(self.texts))
+            shared = self.shared_counts(grams)
+            # Texts shorter than n have no unpadded n-grams, so they are
+            # matched as substrings of the query directly
+            query_upper = query.upper()
+            for ix in self.short_ids:
+                if self.texts[ix].upper() in query_upper:
+                    shared[ix] = len(grams)
+            # A substring match can go either way, so the n-grams shared are
+            # taken relative to the query and to the (unpadded) text
+            num_text_grams = numpy.maximum(self.num_grams - 2, 1)
+            scores = numpy.maximum(shared / float(len(grams)),
+                                   shared / num_text_grams)
+        else:
+            grams = get_ngrams(query, self.n)
+            shared = self.shared_counts(grams)
+            scores = 2.0 * shared / (len(grams) + self.num_grams)
+            scores[shared == 0] = 0
+        ids = numpy.flatnonzero(scores)
+        if len(ids) > num_candidates:
+            top = numpy.argpartition(-scores[ids],
+                                     num_candidates - 1)[:num_candidates]
+            ids = ids[top]
+        return ids[numpy.argsort(-scores[ids], kind='stable')]
+
+    def save(self, path):
+        """Save the index into a folder."""
+        if not os.path.exists(path):
+            os.makedirs(path)
+        for name in ('offsets', 'postings', 'num_grams'):
+            numpy.save(os.path.join(path, name + '.npy'), getattr(self, name))
+        with open(os.path.join(path, index_file), 'w') as fh:
+            json.dump({'n': self.n, 'texts_hash': self.texts_hash,
+                       'texts': self.texts, 'grams': self.grams}, fh)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Return the index saved in a folder."""
+        index = cls.__new__(cls)
+        for name in ('offsets', 'postings', 'num_grams'):
+            setattr(index, name,
+                    numpy.load(os.path.join(path, name + '.npy'),
+                               mmap_mode='r' if mmap else None))
+        with open(os.path.join(path, index_file), 'r') as fh:
+            data = json.load(fh)
+        index.n = data['n']
+        index.texts = data['texts']
+        index.texts_hash = data['texts_hash']
+        index.grams = data['grams']
+        index.gram_codes = {gram: ix for ix, gram in enumerate(index.grams)}
+        index._short_ids = None
+        return index
+
+
+def open_ngram_index(path, texts, n=3):
+    """Return the n-gram index of a list of texts saved in a folder, building
+    and saving it first if it doesn't exist or was built from other texts."""
+    if os.path.exists(os.path.join(path, index_file)):
+        index = NgramIndex.load(path)
+        if index.n == n and index.texts_hash == get_texts_hash(texts):
+            return index
+    index = NgramIndex(texts, n)
+    index.save(path)
+    return index
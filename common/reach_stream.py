@@ -0,0 +1,136 @@
+"""Extract entities and event arguments from REACH JSON output.
+
+The statistics of REACH entities only need the text, xrefs and frame-id of
+each entity frame and the arguments of each event frame, but a REACH output
+parsed with json.loads also holds sentences, positions, verbose texts, etc.
+as Python objects. If ijson is installed, documents are stream-parsed here
+instead and only compact records of the needed fields are kept; otherwise
+json.loads is used and the records are extracted from the parsed document.
+"""
+import io
+import json
+from collections import namedtuple
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+# xrefs is a tuple of (namespace, id) tuples
+EntityRecord = namedtuple('EntityRecord', ['frame_id', 'text', 'xrefs'])
+
+_entity_prefix = 'entities.frames.item'
+_xref_prefix = _entity_prefix + '.xrefs.item'
+_arg_prefix = 'events.frames.item.arguments.item'
+
+
+def _open(source):
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    if isinstance(source, str):
+        return open(source, 'rb')
+    return source
+
+
+def _parse_stream(fh):
+    entities = []
+    event_args = []
+    entity = xref = arg = None
+    for prefix, event, value in ijson.parse(fh):
+        if prefix == _entity_prefix:
+            if event == 'start_map':
+                entity = {'frame-id': None, 'text': None, 'xrefs': []}
+            elif event == 'end_map':
+                entities.append(EntityRecord(entity['frame-id'],
+                                             entity['text'],
+                                             tuple(entity['xrefs'])))
+                entity = None
+        elif prefix == _xref_prefix:
+            if event == 'start_map':
+                xref = {}
+            elif event == 'end_map':
+                entity['xrefs'].append((xref.get('namespace'),
+                                        xref.get('id')))
+        elif prefix == _arg_prefix:
+            if event == 'start_map':
+                arg = {}
+            elif event == 'end_map':
+                if arg.get('argument-type') == 'entity':
+                    event_args.append(arg.get('arg'))
+        elif event == 'string':
+            parent, _, key = prefix.rpartition('.')
+            if parent == _entity_prefix and key in ('frame-id', 'text'):
+                entity[key] = value
+            elif parent == _xref_prefix and key in ('namespace', 'id'):
+                xref[key] = value
+            elif parent == _arg_prefix and key in ('argument-type', 'arg'):
+                arg[key] = value
+    return entities, event_args
+
+
+def _parse_loaded(fh):
+    reach_json = json.load(fh)
+    entities = [EntityRecord(ent.get('frame-id'), ent.get('text'),
+                             tuple((xref.get('namespace'), xref.get('id'))
+                                   for xref in ent.get('xrefs') or []))
+                for ent in reach_json['entities']['frames']]
+    event_args = [arg['arg'] for event in reach_json['events']['frames']
+                  for arg in event.get('arguments', [])
+                  if arg['argument-type'] == 'entity']
+    return entities, event_args
+
+
+def parse_reach_json(source, stream=None):
+    """Return the entity records and event argument references of a REACH
+    output.
+
+    Parameters
+    ----------
+    source : str or bytes or file
+        The path of a REACH JSON file, the contents of one as bytes, or a
+        binary file object.
+    stream : Optional[bool]
+        If True, stream-parse with ijson, if False, use json.load. Default:
+        stream-parse if ijson is installed.
+
+    Returns
+    -------
+    entities : list[EntityRecord]
+        The entity frames of the output.
+    event_args : list[str]
+        The frame-ids of the entities that are arguments of events, once per
+        argument.
+    """
+    if stream is None:
+        stream = ijson is not None
+    fh = _open(source)
+    try:
+        return _parse_stream(fh) if stream else _parse_loaded(fh)
+    finally:
+        if fh is not source:
+            fh.close()
+
+
+def get_entities(source, stream=None):
+    """Return raw entities and event-extracted entities from REACH output.
+
+    Parameters
+    ----------
+    source : str or bytes or file
+        The REACH output, see parse_reach_json.
+    stream : Optional[bool]
+        Whether to stream-parse the output with ijson, see
+        parse_reach_json.
+
+    Returns
+    -------
+    entities : list[EntityRecord]
+        All entity frames of the output.
+    event_entities : list[EntityRecord]
+        The entity of each event argument that refers to an entity frame,
+        once per argument, so entities in several events appear repeatedly.
+    """
+    entities, event_args = parse_reach_json(source, stream)
+    entity_map = {ent.frame_id: ent for ent in entities}
+    return entities, [entity_map[frame_id] for frame_id in event_args]
@@ -0,0 +1,245 @@
+"""A content-addressed on-disk cache for the results of expensive functions.
+
+Results are keyed by the qualified name and the source code of the
+function, the SHA-256 hashes of the contents of its input files and the repr
+of its parameters (including the default values of those not given), so a
+result is reused after unrelated edits but recomputed as soon as the
+function or an input file changes. Results are pickled into a cache folder
+whose total size is kept under a limit by evicting the least recently used
+entries.
+
+Usage as a decorator::
+
+    @cached(files=lambda fname, min_count=1: [fname])
+    def expensive_stats(fname, min_count=1):
+        ...
+
+where `files` takes the same arguments as the decorated function and
+returns the paths of its input files (files or folders). Results can also be
+cached explicitly with ResultCache.get_or_compute.
+"""
+import os
+import json
+import time
+import pickle
+import inspect
+import hashlib
+import functools
+
+default_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 os.pardir, '.result_cache')
+default_max_size = 4 * 1024**3
+hash_memo_file = 'file_hashes.json'
+
+
+def _hash_file(path, block_size=2**20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class ResultCache(object):
+    """A folder of cached results.
+
+    Parameters
+    ----------
+    cache_dir : Optional[str]
+        The folder in which results are stored. Default: .result_cache in
+        the root of this repository, or the RESULT_CACHE_DIR environment
+        variable if set.
+    max_size : Optional[int]
+        The maximum total size of the cached results in bytes.
+    """
+    def __init__(self, cache_dir=None, max_size=default_max_size):
+        if cache_dir is None:
+            cache_dir = os.environ.get('RESULT_CACHE_DIR', default_cache_dir)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        # File hashes are remembered with the size and modification time of
+        # each file, so that unchanged files are not hashed again
+        self.memo_path = os.path.join(cache_dir, hash_memo_file)
+        self.hash_memo = self._load_memo()
+        self._new_hashes = {}
+
+    def _load_memo(self):
+        try:
+            with open(self.memo_path, 'r') as fh:
+                memo = json.load(fh)
+        except (IOError, ValueError):
+            return {}
+        # Only [size, mtime_ns, hash] entries by path are kept, which drops
+        # the entries of an older memo format
+        return {path: entry for path, entry in memo.items()
+                if isinstance(entry, list) and len(entry) == 3}
+
+    def flush(self):
+        """Save the file hashes computed since the last flush into the memo
+        file, merged with those saved by other processes meanwhile."""
+        if not self._new_hashes:
+            return
+        memo = self._load_memo()
+        memo.update(self._new_hashes)
+        tmp_path = self.memo_path + '.%d.tmp' % os.getpid()
+        with open(tmp_path, 'w') as fh:
+            json.dump(memo, fh)
+        os.replace(tmp_path, self.memo_path)
+        self.hash_memo = memo
+        self._new_hashes = {}
+
+    def file_hash(self, path):
+        """Return the content hash of a file, or of all files in a folder."""
+        file_hash = self._file_hash(path)
+        self.flush()
+        return file_hash
+
+    def _file_hash(self, path):
+        if not os.path.exists(path):
+            return 'missing'
+        if os.path.isdir(path):
+            sha = hashlib.sha256()
+            for root, dirs, fnames in os.walk(path):
+                dirs.sort()
+                for fname in sorted(fnames):
+                    fpath = os.path.join(root, fname)
+                    sha.update(os.path.relpath(fpath, path).encode('utf-8'))
+                    sha.update(self._file_hash(fpath).encode('utf-8'))
+            return sha.hexdigest()
+        stat = os.stat(path)
+        abs_path = os.path.abspath(path)
+        entry = self.hash_memo.get(abs_path)
+        if entry is None or entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+            # Replacing the entry of the path drops its outdated hash
+            entry = [stat.st_size, stat.st_mtime_ns, _hash_file(path)]
+            self.hash_memo[abs_path] = entry
+            self._new_hashes[abs_path] = entry
+        return entry[2]
+
+    def make_key(self, name, files=(), params=None):
+        """Return the cache key for a computation.
+
+        Parameters
+        ----------
+        name : str
+            The name of the computation, e.g. file.py:function.
+        files : Optional[list[str]]
+            The paths of the input files or folders of the computation.
+        params : Optional[object]
+            The parameters of the computation, identified by their repr.
+        """
+        key = {'name': name,
+               'files': [self._file_hash(path) for path in files],
+               'params': repr(params)}
+        self.flush()
+        return hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.pkl')
+
+    def get(self, key):
+        """Return a (found, value) tuple for a key."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fh:
+                value = pickle.load(fh)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            return False, None
+        # Mark the entry as recently used
+        os.utime(path, None)
+        return True, value
+
+    def put(self, key, value):
+        """Save a value under a key and evict old entries if needed."""
+        path = self._path(key)
+        tmp_path = path + '.%d.tmp' % os.getpid()
+        with open(tmp_path, 'wb') as fh:
+            pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in
+        its maximum size."""
+        entries = []
+        for fname in os.listdir(self.cache_dir):
+            if not fname.endswith('.pkl'):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, fname))
+            entries.append((stat.st_mtime, stat.st_size, fname))
+        total = sum(entry[1] for entry in entries)
+        for _, size, fname in sorted(entries):
+            if total <= self.max_size:
+                break
+            os.remove(os.path.join(self.cache_dir, fname))
+            total -= size
+
+    def get_or_compute(self, name, func, files=(), params=None):
+        """Return the cached result of a computation, computing and caching
+        it if needed.
+
+        Parameters
+        ----------
+        name : str
+            The name of the computation.
+        func : function
+            A function without arguments doing the computation.
+        files : Optional[list[str]]
+            The paths of the input files or folders of the computation.
+        params : Optional[object]
+            The parameters of the computation.
+        """
+        key = self.make_key(name, files, params)
+        found, value = self.get(key)
+        if found:
+            print('Using cached result of %s' % name)
+            return value
+        ts = time.time()
+        value = func()
+        print('Computed %s in %.1fs' % (name, time.time() - ts))
+        self.put(key, value)
+        return value
+
+
+def cached(files=None, cache=None):
+    """Return a decorator that caches the results of a function.
+
+    Parameters
+    ----------
+    files : Optional[function]
+        A function taking the same arguments as the decorated function and
+        returning the list of paths of its input files or folders.
+    cache : Optional[ResultCache]
+        The cache to use. Default: a ResultCache in the default folder,
+        created on first use.
+    """
+    def decorator(func):
+        # Functions of scripts run directly are in the __main__ module, so
+        # they are named by their file instead
+        name = '%s:%s' % (os.path.basename(func.__code__.co_filename),
+                          func.__qualname__)
+        signature = inspect.signature(func)
+        source_hash = _source_hash(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            result_cache = cache if cache is not None else ResultCache()
+            input_files = files(*args, **kwargs) if files else []
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = (source_hash, list(bound.arguments.items()))
+            return result_cache.get_or_compute(
+                name, lambda: func(*args, **kwargs), input_files, params)
+        return wrapper
+    return decorator
+
+
+def _source_hash(func):
+    """Return the hash of the source code of a function."""
+    try:
+        source = inspect.getsource(func).encode('utf-8')
+    except (IOError, TypeError):
+        source = func.__code__.co_code
+    return hashlib.sha256(source).hexdigest()
@@ -0,0 +1,371 @@
+"""A sharded store of INDRA Statements keyed by PMID.
+
+The monolithic PMID->Statements pickles produced in steps 2 and 3 have to be
+loaded into memory as a whole. A statement store is instead a directory of
+shard files, each holding the Statements of a few thousand papers as
+consecutive pickled (pmid, stmts) records, and an index giving the shard,
+byte offset and length of each paper's record. Single papers, PMID ranges
+and PMID lists can therefore be loaded lazily, and since shards are
+independent files they can be processed in parallel.
+
+A store is by convention saved next to the pickle it replaces, with the
+.pkl extension dropped, e.g. training_pmid_stmts.pkl -> training_pmid_stmts/.
+The open_statements and iter_statements functions accept a pickle file name
+and use the store instead if one exists.
+"""
+import os
+import json
+import pickle
+import bisect
+import argparse
+from multiprocessing import Pool
+
+
+index_file = 'index.json'
+store_version = 1
+
+
+def pmid_sort_key(pmid):
+    """Return a key sorting numeric PMIDs numerically, others after them."""
+    pmid = str(pmid)
+    return (0, int(pmid), '') if pmid.isdigit() else (1, 0, pmid)
+
+
+def get_pmid(stmt):
+    """Return the PMID of a Statement's first evidence, if any."""
+    for ev in stmt.evidence:
+        if ev.pmid:
+            return str(ev.pmid)
+    return None
+
+
+class StatementStoreWriter(object):
+    """Write papers' Statements into a new statement store.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the store, created if it doesn't exist.
+    shard_size : Optional[int]
+        The number of papers written into each shard. Default: 5000
+    """
+    def __init__(self, path, shard_size=5000):
+        self.path = path
+        self.shard_size = shard_size
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.shards = []
+        self.entries = {}
+        self.fh = None
+        self.shard_count = 0
+
+    def add(self, pmid, stmts):
+        """Add the list of Statements for a given PMID."""
+        pmid = str(pmid)
+        if pmid in self.entries:
+            raise ValueError('PMID %s is already in the store' % pmid)
+        if self.fh is None or self.shard_count >= self.shard_size:
+            self._new_shard()
+        offset = self.fh.tell()
+        pickle.dump((pmid, stmts), self.fh, protocol=pickle.HIGHEST_PROTOCOL)
+        self.entries[pmid] = (len(self.shards) - 1, offset,
+                              self.fh.tell() - offset)
+        self.shard_count += 1
+
+    def _new_shard(self):
+        if self.fh is not None:
+            self.fh.close()
+        shard_name = 'shard_%05d.pkl' % len(self.shards)
+        self.shards.append(shard_name)
+        self.fh = open(os.path.join(self.path, shard_name), 'wb')
+        self.shard_count = 0
+
+    def close(self):
+        """Close the last shard and write the index of the store."""
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+        pmids = sorted(self.entries.keys(), key=pmid_sort_key)
+        index = {'version': store_version,
+                 'shards': self.shards,
+                 'pmids': pmids,
+                 'entries': [self.entries[pmid] for pmid in pmids]}
+        with open(os.path.join(self.path, index_file), 'w') as fh:
+            json.dump(index, fh)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StatementStore(object):
+    """Read Statements lazily from a statement store.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the store.
+
+    Attributes
+    ----------
+    pmids : list[str]
+        The PMIDs in the store, in ascending order.
+    shards : list[str]
+        The file names of the shards, relative to the store directory.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, index_file), 'r') as fh:
+            index = json.load(fh)
+        if index['version'] != store_version:
+            raise ValueError('Unsupported statement store version %s' %
+                             index['version'])
+        self.shards = index['shards']
+        self.pmids = index['pmids']
+        self._pmid_keys = [pmid_sort_key(pmid) for pmid in self.pmids]
+        self._entries = dict(zip(self.pmids,
+                                 [tuple(e) for e in index['entries']]))
+
+    def __len__(self):
+        return len(self.pmids)
+
+    def __contains__(self, pmid):
+        return str(pmid) in self._entries
+
+    def __iter__(self):
+        return iter(self.pmids)
+
+    def __getitem__(self, pmid):
+        return self.get(pmid)
+
+    def keys(self):
+        """Return the PMIDs in the store."""
+        return list(self.pmids)
+
+    def get(self, pmid):
+        """Return the list of Statements for a given PMID."""
+        shard_ix, offset, length = self._entries[str(pmid)]
+        with open(os.path.join(self.path, self.shards[shard_ix]), 'rb') as fh:
+            fh.seek(offset)
+            _, stmts = pickle.loads(fh.read(length))
+        return stmts
+
+    def get_many(self, pmids):
+        """Return a dict of Statements for a list of PMIDs in the store."""
+        entries = sorted(self._entries[str(pmid)] + (str(pmid),)
+                         for pmid in pmids)
+        stmts_by_pmid = {}
+        fh = None
+        shard_open = None
+        # Read the records in shard and offset order to minimize seeking
+        for shard_ix, offset, length, pmid in entries:
+            if shard_ix != shard_open:
+                if fh is not None:
+                    fh.close()
+                fh = open(os.path.join(self.path, self.shards[shard_ix]),
+                          'rb')
+                shard_open = shard_ix
+            fh.seek(offset)
+            _, stmts_by_pmid[pmid] = pickle.loads(fh.read(length))
+        if fh is not None:
+            fh.close()
+        return stmts_by_pmid
+
+    def get_range(self, start, end):
+        """Return a dict of Statements for PMIDs with start <= PMID < end."""
+        lo = bisect.bisect_left(self._pmid_keys, pmid_sort_key(start))
+        hi = bisect.bisect_left(self._pmid_keys, pmid_sort_key(end))
+        return self.get_many(self.pmids[lo:hi])
+
+    def iter_shard(self, shard_ix):
+        """Iterate over the (pmid, stmts) records of a given shard."""
+        with open(os.path.join(self.path, self.shards[shard_ix]), 'rb') as fh:
+            while True:
+                try:
+                    yield pickle.load(fh)
+                except EOFError:
+                    break
+
+    def load_shard(self, shard_ix):
+        """Return a dict of Statements by PMID for a given shard."""
+        return dict(self.iter_shard(shard_ix))
+
+    def iter_shards(self):
+        """Iterate over the shards as dicts of Statements by PMID."""
+        for shard_ix in range(len(self.shards)):
+            yield self.load_shard(shard_ix)
+
+    def iter_items(self):
+        """Iterate over the (pmid, stmts) records of the whole store."""
+        for shard_ix in range(len(self.shards)):
+            for item in self.iter_shard(shard_ix):
+                yield item
+
+    def in_pmid_order(self):
+        """Return True if the records are stored in PMID order, so that
+        iter_items yields them in the order of pmids."""
+        positions = [self._entries[pmid][:2] for pmid in self.pmids]
+        return all(pos < next_pos for pos, next_pos in
+                   zip(positions, positions[1:]))
+
+    def iter_statements(self):
+        """Iterate over all Statements in the store."""
+        for _, stmts in self.iter_items():
+            for stmt in stmts:
+                yield stmt
+
+    def map_shards(self, func, processes=None):
+        """Apply a function to each shard in parallel and return the results.
+
+        Parameters
+        ----------
+        func : function
+            A top-level function taking a dict of Statements by PMID.
+        processes : Optional[int]
+            The number of worker processes. Default: the number of CPUs.
+
+        Returns
+        -------
+        results : list
+            The return value of func for each shard, in shard order.
+        """
+        tasks = [(self.path, shard_ix, func)
+                 for shard_ix in range(len(self.shards))]
+        pool = Pool(processes)
+        try:
+            return pool.map(_apply_to_shard, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+
+_worker_stores = {}
+
+
+def _apply_to_shard(task):
+    path, shard_ix, func = task
+    # Each worker reads the store's index only once
+    if path not in _worker_stores:
+        _worker_stores[path] = StatementStore(path)
+    return func(_worker_stores[path].load_shard(shard_ix))
+
+
+def get_store_path(fname):
+    """Return the path of the store for a given pickle file name, or None."""
+    if os.path.isdir(fname):
+        path = fname
+    elif fname.endswith('.pkl'):
+        path = fname[:-len('.pkl')]
+    else:
+        return None
+    if os.path.exists(os.path.join(path, index_file)):
+        return path
+    return None
+
+
+def convert_pickle(pkl_file, path=None, shard_size=5000):
+    """Convert a Statement pickle into a statement store.
+
+    The pickle can contain either a dict of Statement lists by PMID, or a
+    flat list of Statements, which are then grouped by the PMID of their
+    evidence (Statements without one are stored under the PMID 'None').
+
+    Parameters
+    ----------
+    pkl_file : str
+        The pickle file to convert.
+    path : Optional[str]
+        The directory of the store. Default: the pickle file name without
+        the .pkl extension.
+    shard_size : Optional[int]
+        The number of papers in each shard.
+
+    Returns
+    -------
+    store : StatementStore
+        The new store.
+    """
+    if path is None:
+        path = pkl_file[:-len('.pkl')]
+    print('Loading %s' % pkl_file)
+    with open(pkl_file, 'rb') as fh:
+        stmts = pickle.load(fh)
+    if not isinstance(stmts, dict):
+        stmts_by_pmid = {}
+        for stmt in stmts:
+            stmts_by_pmid.setdefault(str(get_pmid(stmt)), []).append(stmt)
+        stmts = stmts_by_pmid
+    print('Writing %d papers into %s' % (len(stmts), path))
+    with StatementStoreWriter(path, shard_size) as writer:
+        for pmid in sorted(stmts.keys(), key=pmid_sort_key):
+            writer.add(pmid, stmts[pmid])
+    return StatementStore(path)
+
+
+def open_statements(fname):
+    """Return a StatementStore for a file if one exists, otherwise the
+    unpickled contents of the file.
+
+    This can be used in place of pickle.load or ac.load_statements on the
+    Statement pickles. Code that only iterates over papers or Statements
+    should use iter_statements or iter_chunks instead, which work the same
+    on both kinds of input.
+    """
+    path = get_store_path(fname)
+    if path:
+        return StatementStore(path)
+    print('Loading %s' % fname)
+    with open(fname, 'rb') as fh:
+        return pickle.load(fh)
+
+
+def iter_chunks(source):
+    """Iterate over dicts of Statements by PMID, one shard at a time.
+
+    Parameters
+    ----------
+    source : str or StatementStore or dict or list
+        A Statement pickle or store file name, an opened store, a dict of
+        Statements by PMID, or a flat list of Statements (which is yielded
+        as a single chunk grouped by PMID).
+    """
+    if isinstance(source, str):
+        source = open_statements(source)
+    if isinstance(source, StatementStore):
+        for chunk in source.iter_shards():
+            yield chunk
+    elif isinstance(source, dict):
+        yield source
+    else:
+        stmts_by_pmid = {}
+        for stmt in source:
+            stmts_by_pmid.setdefault(str(get_pmid(stmt)), []).append(stmt)
+        yield stmts_by_pmid
+
+
+def iter_statements(source):
+    """Iterate over all Statements of a source accepted by iter_chunks."""
+    if isinstance(source, str):
+        source = open_statements(source)
+    if isinstance(source, StatementStore):
+        for stmt in source.iter_statements():
+            yield stmt
+    elif isinstance(source, dict):
+        for stmts in source.values():
+            for stmt in stmts:
+                yield stmt
+    else:
+        for stmt in source:
+            yield stmt
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert Statement pickles into statement stores.')
+    parser.add_argument('pickles', nargs='+')
+    parser.add_argument('--shard-size', type=int, default=5000)
+    args = parser.parse_args()
+    for pkl_file in args.pickles:
+        convert_pickle(pkl_file, shard_size=args.shard_size)
@@ -0,0 +1,166 @@
+"""Match texts against the grounding map up to spelling variants.
+
+A TextMatcher folds the texts of a grounding map (or any list of texts)
+into a normal form, with all hyphen and dash characters replaced by '-',
+whitespace collapsed and case folded, and keeps them in a hash table. Gene
+prefixes and suffixes from FamPlex's gene_prefixes.csv, such as the p of
+pAKT or the -GFP of AKT-GFP, are kept in a trie of prefixes and a trie of
+reversed suffixes, so that a text can also be matched after stripping them.
+A text is matched by folding it, looking it up, and then walking the tries
+along its start and end, looking up the rest of the text at each affix
+found. This works the same for annotation texts and for agent texts of
+Statements.
+"""
+import re
+import csv
+
+# Hyphen and dash characters, including the minus sign
+dash_chars = '\u002d\u2010\u2011\u2012\u2013\u2014\u2015\u2212' \
+    '\ufe58\ufe63\uff0d'
+dash_pattern = re.compile('[%s]' % re.escape(dash_chars))
+space_pattern = re.compile(r'\s+')
+gene_name_pattern = '{Gene name}'
+
+
+def fold_text(text):
+    """Return the normal form of a text for matching: dashes replaced by
+    '-', soft hyphens removed, whitespace collapsed and case folded."""
+    text = dash_pattern.sub('-', text.replace('\u00ad', ''))
+    text = space_pattern.sub(' ', text).strip()
+    return text.upper()
+
+
+def norm_text(text):
+    """Return the normal form of a text as originally used in the BioCreative
+    evaluation: only the U+2010 hyphen replaced by '-' and case folded."""
+    return text.replace('\u2010', '-').upper()
+
+
+def load_gene_affixes(filename, categories=None):
+    """Return the gene prefixes and suffixes of a gene_prefixes.csv file.
+
+    Parameters
+    ----------
+    filename : str
+        The file, with rows of a pattern such as p{Gene name} or
+        {Gene name}-GFP and a category.
+    categories : Optional[list[str]]
+        If given, only the patterns of these categories (e.g.
+        'experimental context') are loaded.
+
+    Returns
+    -------
+    prefixes, suffixes : list[str]
+        The folded prefixes and suffixes, without the dashes and spaces
+        separating them from the gene name.
+    """
+    prefixes = []
+    suffixes = []
+    with open(filename, 'r', encoding='utf-8') as fh:
+        for row in csv.reader(fh):
+            if len(row) < 2 or gene_name_pattern not in row[0]:
+                continue
+            if categories and row[1] not in categories:
+                continue
+            before, _, after = row[0].partition(gene_name_pattern)
+            before = fold_text(before).rstrip('- ')
+            after = fold_text(after).lstrip('- ')
+            if before:
+                prefixes.append(before)
+            if after:
+                suffixes.append(after)
+    return prefixes, suffixes
+
+
+def _make_trie(strings):
+    trie = {}
+    for s in strings:
+        node = trie
+        for char in s:
+            node = node.setdefault(char, {})
+        node[None] = len(s)
+    return trie
+
+
+class TextMatcher(object):
+    """A matcher of texts to a fixed list of texts.
+
+    Parameters
+    ----------
+    texts : iterable[str]
+        The texts to match against, e.g. the texts of a grounding map. Of
+        several texts with the same normal form, the first one is matched.
+    prefixes, suffixes : Optional[list[str]]
+        Gene prefixes and suffixes that can be stripped from texts before
+        matching, see load_gene_affixes.
+    fold : Optional[function]
+        The function normalizing texts for matching. Default: fold_text.
+        norm_text gives the narrower matching of the original evaluation.
+    """
+    def __init__(self, texts, prefixes=(), suffixes=(), fold=fold_text):
+        self.fold = fold
+        self.table = {}
+        for text in texts:
+            self.table.setdefault(fold(text), text)
+        self.prefix_trie = _make_trie(fold(p) for p in prefixes)
+        self.suffix_trie = _make_trie(fold(s)[::-1] for s in suffixes)
+
+    @classmethod
+    def from_grounding_map(cls, gmap, gene_prefix_file=None,
+                           categories=None, fold=fold_text):
+        """Return a matcher of the texts of a GroundingMap, optionally with
+        the gene prefixes and suffixes of a gene_prefixes.csv file."""
+        prefixes, suffixes = load_gene_affixes(gene_prefix_file, categories) \
+            if gene_prefix_file else ([], [])
+        return cls(gmap.db_refs, prefixes, suffixes, fold)
+
+    def __len__(self):
+        return len(self.table)
+
+    def __contains__(self, text):
+        return self.match(text) is not None
+
+    def _iter_affix_lengths(self, trie, text):
+        node = trie
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                return
+            if None in node:
+                yield node[None]
+
+    def match(self, text, strip_affixes=True):
+        """Return the text matching a given text, or None.
+
+        Parameters
+        ----------
+        text : str
+            The text to match.
+        strip_affixes : Optional[bool]
+            If True (default), a text that doesn't match as it is is also
+            matched after stripping a gene prefix, a gene suffix, or both.
+
+        The text is folded and the affix tries are walked from its start
+        and its end in O(len(text)), but every combination of a prefix and
+        a suffix found is then looked up with a slice of the text. The cost
+        is therefore O(len(text)) per combination. That is a single lookup
+        for texts without affixes and a few for texts with nested ones, such
+        as the p and pp prefixes, but it is not O(len(text)) overall.
+        """
+        folded = self.fold(text)
+        matched = self.table.get(folded)
+        if matched is not None or not strip_affixes:
+            return matched
+        starts = [0] + [length for length in
+                        self._iter_affix_lengths(self.prefix_trie, folded)]
+        ends = [len(folded)] + [len(folded) - length for length in
+                                self._iter_affix_lengths(self.suffix_trie,
+                                                         folded[::-1])]
+        for start in starts:
+            for end in ends:
+                if (start, end) == (0, len(folded)) or start >= end:
+                    continue
+                matched = self.table.get(folded[start:end].strip('- '))
+                if matched is not None:
+                    return matched
+        return None
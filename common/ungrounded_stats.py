@@ -0,0 +1,138 @@
+"""Statistics of ungrounded agents in a Statement corpus, in one pass.
+
+An agent is ungrounded if its db_refs only have a TEXT entry. For a corpus,
+UngroundedStats counts the Statements with all and with any of their agents
+ungrounded (as in step4_stmt_entity_stats/agent_sample_stats.py, an agent
+that is None counts as grounded), the number of ungrounded mentions of each
+text, and the same Statement counts broken down by Statement type. Stats of
+separate shards of a corpus are computed in parallel and merged.
+"""
+import os
+import sys
+import numpy
+from collections import Counter
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.stmt_store import StatementStore, open_statements, \
+    iter_statements
+from common.mention_table import MentionTable, open_mention_table
+
+
+class UngroundedStats(object):
+    """Counts of ungrounded agents and Statements.
+
+    Attributes
+    ----------
+    num_stmts, all_ungrounded, any_ungrounded : int
+        The number of Statements, and of Statements with all and with any
+        of their agents ungrounded.
+    text_counts : collections.Counter
+        The number of ungrounded mentions of each text.
+    by_type : dict
+        [num_stmts, all_ungrounded, any_ungrounded] lists by Statement type.
+    """
+    def __init__(self):
+        self.num_stmts = 0
+        self.all_ungrounded = 0
+        self.any_ungrounded = 0
+        self.text_counts = Counter()
+        self.by_type = {}
+
+    def add_statements(self, stmts):
+        """Add the counts of a list of Statements."""
+        for stmt in stmts:
+            num_agents = 0
+            num_ungrounded = 0
+            for ag in stmt.agent_list():
+                num_agents += 1
+                if ag is not None and list(ag.db_refs.keys()) == ['TEXT']:
+                    num_ungrounded += 1
+                    self.text_counts[ag.db_refs['TEXT']] += 1
+            all_ungrounded = int(num_ungrounded == num_agents)
+            any_ungrounded = int(num_ungrounded > 0)
+            self.num_stmts += 1
+            self.all_ungrounded += all_ungrounded
+            self.any_ungrounded += any_ungrounded
+            type_counts = self.by_type.setdefault(type(stmt).__name__,
+                                                  [0, 0, 0])
+            type_counts[0] += 1
+            type_counts[1] += all_ungrounded
+            type_counts[2] += any_ungrounded
+
+    def merge(self, other):
+        """Add the counts of another UngroundedStats."""
+        self.num_stmts += other.num_stmts
+        self.all_ungrounded += other.all_ungrounded
+        self.any_ungrounded += other.any_ungrounded
+        self.text_counts.update(other.text_counts)
+        for stmt_type, counts in other.by_type.items():
+            type_counts = self.by_type.setdefault(stmt_type, [0, 0, 0])
+            for ix, count in enumerate(counts):
+                type_counts[ix] += count
+
+    @classmethod
+    def from_mention_table(cls, table):
+        """Return the stats of the corpus of a MentionTable."""
+        stats = cls()
+        all_ungrounded, any_ungrounded = table.statement_ungrounded_masks()
+        stats.num_stmts = len(table.stmt_pmid)
+        stats.all_ungrounded = int(all_ungrounded.sum())
+        stats.any_ungrounded = int(any_ungrounded.sum())
+        stats.text_counts = Counter(dict(table.sorted_text_counts(
+            table.ungrounded_text_counts())))
+        stmt_type = numpy.asarray(table.stmt_type)
+        num_types = len(table.stmt_types)
+        for ix, type_counts in enumerate(zip(
+                numpy.bincount(stmt_type, minlength=num_types).tolist(),
+                numpy.bincount(stmt_type[all_ungrounded],
+                               minlength=num_types).tolist(),
+                numpy.bincount(stmt_type[any_ungrounded],
+                               minlength=num_types).tolist())):
+            if type_counts[0]:
+                stats.by_type[table.stmt_types[ix]] = list(type_counts)
+        return stats
+
+    def all_ungrounded_pct(self):
+        return 100 * (self.all_ungrounded / float(self.num_stmts))
+
+    def any_ungrounded_pct(self):
+        return 100 * (self.any_ungrounded / float(self.num_stmts))
+
+    def agent_counts(self):
+        """Return the ungrounded mention counts of texts in descending
+        order, like the counts of grounding_mapper.ungrounded_texts."""
+        return sorted(self.text_counts.values(), reverse=True)
+
+
+def _get_shard_stats(stmts_by_pmid):
+    stats = UngroundedStats()
+    for stmts in stmts_by_pmid.values():
+        stats.add_statements(stmts)
+    return stats
+
+
+def get_ungrounded_stats(source, processes=None):
+    """Return the UngroundedStats of a Statement corpus.
+
+    Parameters
+    ----------
+    source : str or StatementStore or MentionTable or dict or list
+        A Statement pickle or store file name, or any other form accepted by
+        stmt_store.iter_statements, or a mention table. Given a file name,
+        the mention table of the corpus is used if it exists.
+    processes : Optional[int]
+        The number of worker processes for the shards of a statement
+        store. Default: the number of CPUs.
+    """
+    if isinstance(source, str):
+        table = open_mention_table(source)
+        source = table if table is not None else open_statements(source)
+    if isinstance(source, MentionTable):
+        return UngroundedStats.from_mention_table(source)
+    stats = UngroundedStats()
+    if isinstance(source, StatementStore):
+        for shard_stats in source.map_shards(_get_shard_stats, processes):
+            stats.merge(shard_stats)
+    else:
+        stats.add_statements(iter_statements(source))
+    return stats
@@ -0,0 +1,137 @@
+"""This module builds and queries an on-disk index of the PMIDs curated for
+each gene, made from a local NCBI gene2pubmed dump
+(ftp://ftp.ncbi.nlm.nih.gov/gene/DATA/gene2pubmed.gz).
+
+The index is a directory of plain numpy arrays that can be memory-mapped:
+
+- entrez_ids.npy: the sorted Entrez Gene IDs
+- offsets.npy: for the gene at position i, its PMIDs are
+  pmids[offsets[i]:offsets[i+1]]
+- pmids.npy: the sorted PMIDs of all genes, concatenated
+- symbols.json: a map from gene symbol to Entrez Gene ID
+"""
+import os
+import json
+import numpy
+import pandas
+
+
+def _read_gene2pubmed(gene2pubmed_file, tax_id, chunksize=5000000):
+    """Return arrays of Entrez IDs and PMIDs for one species."""
+    entrez_chunks = []
+    pmid_chunks = []
+    reader = pandas.read_csv(gene2pubmed_file, sep='\t', header=None,
+                             skiprows=1, names=['tax_id', 'entrez', 'pmid'],
+                             dtype=numpy.int64, chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk[chunk.tax_id == tax_id]
+        entrez_chunks.append(chunk.entrez.values)
+        pmid_chunks.append(chunk.pmid.values)
+    return numpy.concatenate(entrez_chunks), numpy.concatenate(pmid_chunks)
+
+
+def _read_symbols(gene_info_file, tax_id):
+    """Return a dict of gene symbols to Entrez IDs from an NCBI gene_info
+    file."""
+    df = pandas.read_csv(gene_info_file, sep='\t', header=None, skiprows=1,
+                         usecols=[0, 1, 2], names=['tax_id', 'entrez', 'symbol'],
+                         dtype={'tax_id': numpy.int64, 'entrez': numpy.int64,
+                                'symbol': str})
+    df = df[df.tax_id == tax_id]
+    return {symbol: int(entrez) for symbol, entrez in
+            zip(df.symbol.values, df.entrez.values)}
+
+
+def _hgnc_symbols():
+    """Return a dict of HGNC gene symbols to Entrez IDs."""
+    from indra.databases import hgnc_client
+    symbols = {}
+    for hgnc_id, symbol in hgnc_client.hgnc_names.items():
+        entrez_id = hgnc_client.get_entrez_id(hgnc_id)
+        if entrez_id:
+            symbols[symbol] = int(entrez_id)
+    return symbols
+
+
+def build_index(gene2pubmed_file, index_dir, gene_info_file=None,
+                tax_id=9606):
+    """Build a gene to PMIDs index from a gene2pubmed dump.
+
+    Parameters
+    ----------
+    gene2pubmed_file : str
+        Path to the gene2pubmed file, optionally gzipped.
+    index_dir : str
+        The directory in which the index is saved.
+    gene_info_file : Optional[str]
+        Path to an NCBI gene_info file used to map gene symbols to Entrez
+        IDs. If not given, the HGNC symbol mappings in INDRA are used.
+    tax_id : Optional[int]
+        The NCBI taxonomy ID of the species to index. Default: human.
+    """
+    entrez, pmids = _read_gene2pubmed(gene2pubmed_file, tax_id)
+    # Sort by gene, then by PMID, and drop duplicate pairs
+    order = numpy.lexsort((pmids, entrez))
+    entrez, pmids = entrez[order], pmids[order]
+    keep = numpy.ones(len(entrez), dtype=bool)
+    keep[1:] = (entrez[1:] != entrez[:-1]) | (pmids[1:] != pmids[:-1])
+    entrez, pmids = entrez[keep], pmids[keep]
+    entrez_ids, starts = numpy.unique(entrez, return_index=True)
+    offsets = numpy.append(starts, len(pmids)).astype(numpy.int64)
+
+    if gene_info_file:
+        symbols = _read_symbols(gene_info_file, tax_id)
+    else:
+        symbols = _hgnc_symbols()
+
+    if not os.path.exists(index_dir):
+        os.makedirs(index_dir)
+    numpy.save(os.path.join(index_dir, 'entrez_ids.npy'), entrez_ids)
+    numpy.save(os.path.join(index_dir, 'offsets.npy'), offsets)
+    numpy.save(os.path.join(index_dir, 'pmids.npy'),
+               pmids.astype(numpy.uint32))
+    with open(os.path.join(index_dir, 'symbols.json'), 'w') as fh:
+        json.dump(symbols, fh)
+    print('Indexed %d PMID references for %d genes' %
+          (len(pmids), len(entrez_ids)))
+
+
+class Gene2PubmedIndex(object):
+    """A memory-mapped gene to PMIDs index made by build_index.
+
+    Parameters
+    ----------
+    index_dir : str
+        The directory containing the index.
+    """
+    def __init__(self, index_dir):
+        def load(fname):
+            return numpy.load(os.path.join(index_dir, fname), mmap_mode='r')
+        self.entrez_ids = load('entrez_ids.npy')
+        self.offsets = load('offsets.npy')
+        self.pmids = load('pmids.npy')
+        with open(os.path.join(index_dir, 'symbols.json'), 'r') as fh:
+            self.symbols = json.load(fh)
+
+    def get_pmids(self, genes):
+        """Return a dict of PMIDs for each gene symbol in a list.
+
+        Genes without an Entrez ID are left out of the result, genes that
+        have an Entrez ID but no curated PMIDs map to an empty list. The
+        PMIDs are strings, as returned by the PubMed client.
+        """
+        known = [gene for gene in genes if gene in self.symbols]
+        entrez = numpy.array([self.symbols[gene] for gene in known],
+                             dtype=numpy.int64)
+        # Look up the positions of all the genes at once
+        pos = numpy.searchsorted(self.entrez_ids, entrez)
+        pos = numpy.minimum(pos, len(self.entrez_ids) - 1)
+        found = self.entrez_ids[pos] == entrez
+        pmids_for_genes = {}
+        for gene, ix, is_found in zip(known, pos, found):
+            if not is_found:
+                pmids_for_genes[gene] = []
+                continue
+            pmids = self.pmids[self.offsets[ix]:self.offsets[ix+1]]
+            pmids_for_genes[gene] = [str(pmid) for pmid in pmids]
+        return pmids_for_genes
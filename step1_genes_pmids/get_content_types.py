@@ -1,35 +1,181 @@
 """This script queries S3 to get the content type associated with
 each PMID in the corpus and reports statistics.
 
+Lookups run in a bounded thread pool and each result is saved in a local
+SQLite cache as soon as it arrives. On later runs only PMIDs that are not
+in the cache, or whose lookup failed, are queried again, so statistics can
+be updated after papers are added without re-fetching everything.
+
+With --local, content is looked up in a local folder that mirrors the S3
+layout (<folder>/PMID<pmid>/fulltext/pmc_oa_xml, <folder>/PMID<pmid>/abstract,
+etc., optionally gzipped) instead of S3.
+
 NOTE: the S3 storage is not publicly accessible.
 """
 
+import os
 import time
-from multiprocessing import Pool
+import sqlite3
+import argparse
 from collections import Counter
-from indra.literature.s3_client import get_full_text
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# The content keys checked for each paper, in order of preference
+content_keys = [('fulltext/pmc_oa_xml', 'pmc_oa_xml'),
+                ('fulltext/pmc_auth_xml', 'pmc_auth_xml'),
+                ('fulltext/elsevier_xml', 'elsevier_xml'),
+                ('fulltext/txt', 'txt'),
+                ('abstract', 'abstract')]
+
 
 def get_ct(pmid):
     """Return the content type associated with the given PMID"""
-    try:
-        _, content_type = get_full_text(pmid, True)
-    except Exception:
-        content_type = None
+    from indra.literature.s3_client import get_full_text
+    _, content_type = get_full_text(pmid, True)
     return content_type
 
+
+class LocalSource(object):
+    """Look up content types in a local folder mirroring the S3 layout."""
+    def __init__(self, root):
+        self.root = root
+
+    def get_ct(self, pmid):
+        """Return the content type associated with the given PMID"""
+        paper_dir = os.path.join(self.root, 'PMID%s' % pmid)
+        for key, content_type in content_keys:
+            path = os.path.join(paper_dir, *key.split('/'))
+            if os.path.exists(path) or os.path.exists(path + '.gz'):
+                return content_type
+        return None
+
+
+class ContentTypeCache(object):
+    """A SQLite cache of content type lookup results by PMID."""
+    def __init__(self, db_file):
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS content_types '
+                          '(pmid TEXT PRIMARY KEY, content_type TEXT, '
+                          'status TEXT, error TEXT, updated REAL)')
+        self.conn.commit()
+
+    def get_results(self):
+        """Return a dict of (status, content_type) tuples by PMID."""
+        cur = self.conn.execute('SELECT pmid, status, content_type '
+                                'FROM content_types')
+        return {pmid: (status, ct) for pmid, status, ct in cur}
+
+    def save(self, results):
+        """Save a list of (pmid, content_type, status, error) tuples."""
+        now = time.time()
+        self.conn.executemany('INSERT OR REPLACE INTO content_types VALUES '
+                              '(?, ?, ?, ?, ?)',
+                              [res + (now,) for res in results])
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def survey(pmids, cache, get_content_type=get_ct, num_workers=32,
+           max_retries=2, backoff=1.0, report_interval=10):
+    """Look up the content type of each PMID that isn't cached yet.
+
+    Parameters
+    ----------
+    pmids : list[str]
+        The PMIDs to get content types for.
+    cache : ContentTypeCache
+        The cache in which results are looked up and saved.
+    get_content_type : Optional[function]
+        A function returning the content type of a PMID, or None if there
+        is no content. Default: look up the content in S3.
+    num_workers : Optional[int]
+        The maximum number of concurrent lookups.
+    max_retries : Optional[int]
+        The number of times a failed lookup is retried within this run.
+    backoff : Optional[float]
+        Seconds to wait before the first retry, doubled on each attempt.
+    report_interval : Optional[float]
+        Seconds between progress reports.
+
+    Returns
+    -------
+    content_type_stats : collections.Counter
+        The number of PMIDs with each content type. PMIDs whose lookup
+        failed are counted under 'error'.
+    """
+    def lookup(pmid):
+        for attempt in range(max_retries + 1):
+            try:
+                return (pmid, get_content_type(pmid), 'ok', None)
+            except Exception as e:
+                if attempt == max_retries:
+                    return (pmid, None, 'error', str(e))
+                time.sleep(backoff * 2 ** attempt)
+
+    cached = cache.get_results()
+    todo = [pmid for pmid in pmids
+            if pmid not in cached or cached[pmid][0] == 'error']
+    print('%d PMIDs cached, %d to look up' % (len(pmids) - len(todo),
+                                              len(todo)))
+    status_counts = Counter()
+    ts = time.time()
+    last_report = ts
+    todo_iter = iter(todo)
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        # Keep a bounded number of lookups in flight
+        running = set()
+        for pmid in todo_iter:
+            running.add(executor.submit(lookup, pmid))
+            if len(running) >= 2 * num_workers:
+                break
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            results = [future.result() for future in done]
+            cache.save(results)
+            status_counts.update(res[2] for res in results)
+            for pmid in todo_iter:
+                running.add(executor.submit(lookup, pmid))
+                if len(running) >= 2 * num_workers:
+                    break
+            now = time.time()
+            if now - last_report >= report_interval or not running:
+                ndone = sum(status_counts.values())
+                print('%d/%d looked up (%d errors), %.1f/s' %
+                      (ndone, len(todo), status_counts['error'],
+                       ndone / (now - ts)))
+                last_report = now
+
+    cached = cache.get_results()
+    return Counter('error' if cached[pmid][0] == 'error' else cached[pmid][1]
+                   for pmid in pmids)
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Survey the content types available for the corpus.')
+    parser.add_argument('--pmids', default='combined_pmids.txt')
+    parser.add_argument('--cache', default='content_types.sqlite')
+    parser.add_argument('--local',
+                        help='A local folder to look up content in '
+                             'instead of S3.')
+    parser.add_argument('--workers', type=int, default=64)
+    args = parser.parse_args()
+
     # Read the combined PMIDs from the text file
-    with open('combined_pmids.txt', 'r') as fh:
+    with open(args.pmids, 'r') as fh:
         pmids = [l.strip() for l in fh.readlines()]
 
-    # In many parallel threads, get the content type from S3
-    # for each of the PMIDs
-    p = Pool(64)
+    get_content_type = LocalSource(args.local).get_ct if args.local \
+        else get_ct
+    cache = ContentTypeCache(args.cache)
     ts = time.time()
-    content_types = p.map(get_ct, pmids)
+    content_type_stats = survey(pmids, cache, get_content_type,
+                                num_workers=args.workers)
     te = time.time()
+    cache.close()
     print('%.2fs' % (te-ts))
 
-    # Make a Counter for the content types and print it
-    content_type_stats = Counter(content_types)
+    # Print the Counter for the content types
     print(content_type_stats)
@@ -1,26 +1,212 @@
-"""This script obtains a list of PMIDs by running searches on PubMed."""
-import csv
+"""This script obtains a list of PMIDs by running searches on PubMed.
+
+Genes are looked up in Entrez Gene concurrently, under a configurable
+requests-per-second limit, with retries and exponential backoff on transient
+errors. Each result is appended to a checkpoint file as soon as it arrives so
+that an interrupted run resumes with the genes that are still missing.
+
+Alternatively, with --index, the PMIDs are looked up offline in an index
+built from a local NCBI gene2pubmed dump (see gene2pubmed_index.py).
+"""
+import os
+import json
+import time
 import pickle
-from indra.literature import pubmed_client
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from xml.etree import ElementTree as ET
+import requests
+from gene2pubmed_index import Gene2PubmedIndex, build_index
 
 
-if __name__ == '__main__':
-    # Open the list of Reactome signaling genes
-    with open('combined_genes.txt', 'rt') as f:
-        genes = [line.strip() for line in f.readlines()]
+entrez_fetch_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi'
+
+
+class RateLimiter(object):
+    """Space out calls from any number of threads to at most `rate` per
+    second."""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_time = 0
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class TransientError(Exception):
+    """An error after which the request is worth retrying."""
+    pass
+
+
+def get_entrez_id(gene):
+    """Return the Entrez ID for an HGNC gene symbol, or None."""
+    from indra.databases import hgnc_client
+    hgnc_id = hgnc_client.get_hgnc_id(gene)
+    if hgnc_id is None:
+        return None
+    return hgnc_client.get_entrez_id(hgnc_id)
+
+
+def fetch_gene_pmids(entrez_id, url=entrez_fetch_url, api_key=None,
+                     timeout=60):
+    """Return the PMIDs curated for a given Entrez gene.
+
+    Parameters
+    ----------
+    entrez_id : str
+        The Entrez Gene ID to query.
+    url : Optional[str]
+        The efetch endpoint to send the query to. Pointing this at a local
+        server makes it possible to run the harvester without NCBI.
+    api_key : Optional[str]
+        An NCBI API key, which raises the allowed request rate.
+    timeout : Optional[float]
+        Seconds to wait for a response.
+
+    Returns
+    -------
+    pmids : list[str]
+        The sorted, unique list of PMIDs for the gene.
+    """
+    params = {'db': 'gene', 'retmode': 'xml', 'id': entrez_id}
+    if api_key:
+        params['api_key'] = api_key
+    try:
+        res = requests.get(url, params=params, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        raise TransientError(str(e))
+    if res.status_code == 429 or res.status_code >= 500:
+        raise TransientError('HTTP %d' % res.status_code)
+    res.raise_for_status()
+    tree = ET.fromstring(res.content)
+    error = tree.find('ERROR')
+    if error is not None:
+        raise ValueError(error.text)
+    return sorted(set(idt.text for idt in tree.iter('PubMedId')))
+
+
+def make_entrez_getter(url=entrez_fetch_url, api_key=None):
+    """Return a function that gets the PMIDs for a gene symbol from Entrez."""
+    def get_pmids(gene):
+        entrez_id = get_entrez_id(gene)
+        if entrez_id is None:
+            raise ValueError('No Entrez ID for %s' % gene)
+        return fetch_gene_pmids(entrez_id, url=url, api_key=api_key)
+    return get_pmids
 
-    # Assemble a list of PMIDs curated in Entrez gene
+
+def load_checkpoint(checkpoint_file):
+    """Return the genes already harvested and the ones that failed
+    permanently, as recorded in a checkpoint file."""
     pmids_for_genes = {}
-    for gene_ix, gene in enumerate(genes):
-        print("%d of %d: Getting PMIDs for %s" % (gene_ix + 1, len(genes),
-                                                  gene))
-        try:
-            pmids_for_genes[gene] = pubmed_client.get_ids_for_gene(gene)
-        except:
-            print("Skipping %s" % gene)
-            continue
+    skipped = {}
+    try:
+        with open(checkpoint_file, 'rt') as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A partially written last line after a crash
+                    continue
+                if 'pmids' in entry:
+                    pmids_for_genes[entry['gene']] = entry['pmids']
+                    skipped.pop(entry['gene'], None)
+                else:
+                    skipped[entry['gene']] = entry['error']
+    except IOError:
+        pass
+    return pmids_for_genes, skipped
+
+
+def harvest(genes, checkpoint_file, get_pmids=None, rate=3, num_workers=8,
+            max_retries=5, backoff=1.0, retry_skipped=False):
+    """Return a dict of PMIDs for each gene, querying only missing genes.
+
+    Parameters
+    ----------
+    genes : list[str]
+        The HGNC gene symbols to get PMIDs for.
+    checkpoint_file : str
+        A JSON lines file to which each result is appended as it arrives,
+        and from which earlier results are read at startup.
+    get_pmids : Optional[function]
+        A function taking a gene symbol and returning its list of PMIDs.
+        It should raise TransientError for errors worth retrying and
+        any other exception for permanent failures. By default the
+        getter returned by make_entrez_getter is used.
+    rate : Optional[float]
+        The maximum number of requests per second across all workers.
+    num_workers : Optional[int]
+        The number of concurrent requests.
+    max_retries : Optional[int]
+        The number of times to retry a gene after a transient error.
+    backoff : Optional[float]
+        Initial delay in seconds before a retry, doubled on each attempt.
+    retry_skipped : Optional[bool]
+        If True, genes that failed permanently in an earlier run are
+        queried again.
+
+    Returns
+    -------
+    pmids_for_genes : dict[str, list[str]]
+        PMIDs for every gene that could be harvested.
+    """
+    if get_pmids is None:
+        get_pmids = make_entrez_getter()
+
+    pmids_for_genes, skipped = load_checkpoint(checkpoint_file)
+    todo = [gene for gene in genes if gene not in pmids_for_genes and
+            (retry_skipped or gene not in skipped)]
+    print('%d genes done in earlier runs, %d to query' %
+          (len(genes) - len(todo), len(todo)))
+    limiter = RateLimiter(rate)
+
+    def get_with_retry(gene):
+        for attempt in range(max_retries + 1):
+            limiter.wait()
+            try:
+                return get_pmids(gene)
+            except TransientError as e:
+                if attempt == max_retries:
+                    raise
+                print('Retrying %s after error: %s' % (gene, e))
+                time.sleep(backoff * 2 ** attempt)
+
+    with open(checkpoint_file, 'at') as fh, \
+            ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(get_with_retry, gene): gene
+                   for gene in todo}
+        for ix, future in enumerate(as_completed(futures)):
+            gene = futures[future]
+            try:
+                pmids = future.result()
+                pmids_for_genes[gene] = pmids
+                entry = {'gene': gene, 'pmids': pmids}
+                print('%d of %d: Got %d PMIDs for %s' %
+                      (ix + 1, len(todo), len(pmids), gene))
+            except Exception as e:
+                entry = {'gene': gene, 'error': str(e)}
+                print('%d of %d: Skipping %s: %s' %
+                      (ix + 1, len(todo), gene, e))
+            fh.write(json.dumps(entry) + '\n')
+            fh.flush()
+    # Return the genes in the order of the input list
+    return {gene: pmids_for_genes[gene] for gene in genes
+            if gene in pmids_for_genes}
+
+
+def save_pmids(pmids_for_genes, pkl_file='combined_genes_to_pmids.pkl',
+               txt_file='combined_pmids.txt'):
+    """Save the dict mapping genes to PMIDs and the list of unique PMIDs."""
     # Save the dict mapping genes to publications
-    with open('combined_genes_to_pmids.pkl', 'wb') as f:
+    with open(pkl_file, 'wb') as f:
         pickle.dump(pmids_for_genes, f, protocol=2)
 
     # Get the list of unique PMIDs
@@ -29,6 +215,55 @@ if __name__ == '__main__':
 
     # Save the PMIDs to a file
     print("Saving PMIDs")
-    with open('combined_pmids.txt', 'wt') as f:
-        for pmid in pmids:
+    with open(txt_file, 'wt') as f:
+        for pmid in sorted(pmids, key=int):
             f.write('%s\n' % pmid)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Get the PMIDs curated in Entrez Gene for a gene list.')
+    parser.add_argument('--genes', default='combined_genes.txt')
+    parser.add_argument('--checkpoint', default='combined_genes_to_pmids.jsonl',
+                        help='File to which results are appended as they '
+                             'arrive, and from which a run resumes.')
+    parser.add_argument('--rate', type=float, default=3,
+                        help='Maximum requests per second (NCBI allows 3, '
+                             'or 10 with an API key).')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--api-key')
+    parser.add_argument('--entrez-url', default=entrez_fetch_url,
+                        help='The efetch endpoint, e.g. a local stand-in.')
+    parser.add_argument('--retry-skipped', action='store_true')
+    parser.add_argument('--index',
+                        help='Look up PMIDs offline in this gene2pubmed '
+                             'index directory instead of querying Entrez.')
+    parser.add_argument('--gene2pubmed',
+                        help='A gene2pubmed dump from which to build the '
+                             '--index directory if it does not exist.')
+    parser.add_argument('--gene-info',
+                        help='An NCBI gene_info file mapping symbols to '
+                             'Entrez IDs for building the index.')
+    args = parser.parse_args()
+
+    # Open the list of Reactome signaling genes
+    with open(args.genes, 'rt') as f:
+        genes = [line.strip() for line in f.readlines()]
+
+    if args.index:
+        # Look up all the genes in the local gene2pubmed index
+        if not os.path.exists(args.index):
+            build_index(args.gene2pubmed, args.index, args.gene_info)
+        pmids_for_genes = Gene2PubmedIndex(args.index).get_pmids(genes)
+        for gene in genes:
+            if gene not in pmids_for_genes:
+                print("Skipping %s" % gene)
+    else:
+        # Assemble a list of PMIDs curated in Entrez gene
+        get_pmids = make_entrez_getter(args.entrez_url, args.api_key)
+        pmids_for_genes = harvest(genes, args.checkpoint, get_pmids=get_pmids,
+                                  rate=args.rate, num_workers=args.workers,
+                                  max_retries=args.retries,
+                                  retry_skipped=args.retry_skipped)
+    save_pmids(pmids_for_genes)
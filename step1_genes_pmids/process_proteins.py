@@ -1,51 +1,120 @@
 """This script obtains a list of all signaling genes from Reactome, and
 takes the union with those covered by FamPlex to get a gene list for
-literature search."""
+literature search.
 
+UniProt IDs are resolved to gene names with INDRA's UniProt client one at a
+time by default. With --uniprot-table, a local UniProt table (a tab-separated
+download with the Entry, Organism (ID) and Gene Names (primary) columns) is
+loaded once and all IDs are resolved in a single join instead.
+"""
+
+import argparse
+import numpy
 import pandas
-from indra.databases import uniprot_client
 
-def get_signaling_genes():
-    """Return a list of gene names that are in Reactome signaling pathways."""
+human_tax_id = '9606'
+
+uniprot_columns = {'Entry': 'up_id',
+                   'Organism (ID)': 'organism',
+                   'Organism ID': 'organism',
+                   'Gene Names (primary)': 'gene_name',
+                   'Gene names  (primary )': 'gene_name'}
+
+
+def load_uniprot_table(fname):
+    """Return a DataFrame of organism and gene name by UniProt ID from a
+    UniProt table download."""
+    df = pandas.read_csv(fname, sep='\t', dtype=str)
+    df = df.rename(columns=uniprot_columns)
+    df = df[['up_id', 'organism', 'gene_name']]
+    # Entries can list several primary gene names, we take the first one
+    df['gene_name'] = df.gene_name.str.split(';').str[0].str.strip()
+    return df
+
+
+def resolve_proteins(up_ids, up_table):
+    """Return gene names and resolution status for a list of UniProt IDs.
+
+    Parameters
+    ----------
+    up_ids : list[str]
+        UniProt IDs, possibly with isoform suffixes.
+    up_table : pandas.DataFrame
+        The table returned by load_uniprot_table.
+
+    Returns
+    -------
+    resolved : pandas.DataFrame
+        A table with the Identifier, gene_name and status columns, where
+        status is one of 'ok', 'not_human', 'no_gene_name' or 'unmapped'.
+    """
+    df = pandas.DataFrame({'Identifier': up_ids})
+    df['up_id'] = df.Identifier.str.split('-').str[0]
+    df = df.merge(up_table, on='up_id', how='left')
+    df['status'] = numpy.select(
+        [df.organism.isnull(), df.organism != human_tax_id,
+         df.gene_name.isnull() | (df.gene_name == '')],
+        ['unmapped', 'not_human', 'no_gene_name'], 'ok')
+    return df[['Identifier', 'gene_name', 'status']]
+
+
+def get_signaling_genes(up_table=None, report_file='unresolved_proteins.tsv'):
+    """Return a list of gene names that are in Reactome signaling pathways.
+
+    If a UniProt table from load_uniprot_table is given, the IDs are
+    resolved with it in bulk and the IDs that could not be resolved to a
+    human gene are written into a report file.
+    """
     df = pandas.read_csv('signaling_proteins.tsv', sep='\t', index_col=None)
-    gene_names = []
-    for up_id in df['Identifier']:
-        #terms = mn.split(' ')
-        #if len(terms) == 2:
-        #    gene_name = terms[1]
-        #    gene_names.append(gene_name)
-        if not uniprot_client.is_human(up_id):
-            print("%s is not a human gene" % up_id)
-            continue
-        gene_name = uniprot_client.get_gene_name(up_id)
-        if not gene_name:
-            print("Could not get gene name for %s" % up_id)
-            continue
-        gene_names.append(gene_name)
+    if up_table is not None:
+        resolved = resolve_proteins(df['Identifier'], up_table)
+        unresolved = resolved[resolved.status != 'ok']
+        unresolved[['Identifier', 'status']].to_csv(report_file, sep='\t',
+                                                    index=False)
+        print('%d IDs not resolved to human genes, see %s' %
+              (len(unresolved), report_file))
+        gene_names = resolved.gene_name[resolved.status == 'ok'].tolist()
+    else:
+        from indra.databases import uniprot_client
+        gene_names = []
+        for up_id in df['Identifier']:
+            if not uniprot_client.is_human(up_id):
+                print("%s is not a human gene" % up_id)
+                continue
+            gene_name = uniprot_client.get_gene_name(up_id)
+            if not gene_name:
+                print("Could not get gene name for %s" % up_id)
+                continue
+            gene_names.append(gene_name)
     gene_names = sorted(list(set(gene_names)))
     with open('signaling_genes.txt', 'wt') as fh:
         for gn in gene_names:
             fh.write('%s\n' % gn)
     return gene_names
 
+
 def get_relations_genes():
     """Read the FamPlex relations table and get covered gene names."""
     df = pandas.read_csv('../relations.csv', index_col=None, header=None)
-    gene_names = []
-    for _, row in df.iterrows():
-        if row[0] == 'HGNC':
-            gene_names.append(row[1])
-    gene_names = sorted(list(set(gene_names)))
+    gene_names = sorted(set(df[df[0] == 'HGNC'][1]))
     return gene_names
 
+
 if __name__ == '__main__':
-    signaling_genes = get_signaling_genes()
+    parser = argparse.ArgumentParser(
+        description='Make the list of genes for literature search.')
+    parser.add_argument('--uniprot-table',
+                        help='A local UniProt table to resolve IDs with.')
+    args = parser.parse_args()
+
+    up_table = load_uniprot_table(args.uniprot_table) \
+        if args.uniprot_table else None
+    signaling_genes = get_signaling_genes(up_table)
     relations_genes = get_relations_genes()
     covered_genes = set(signaling_genes).intersection(set(relations_genes))
     missing_genes = set(signaling_genes).difference(set(relations_genes))
     combined_genes = set(signaling_genes).union(set(relations_genes))
 
     with open('combined_genes.txt', 'wt') as f:
-        for gene in combined_genes:
+        for gene in sorted(combined_genes):
             f.write('%s\n' % gene)
-
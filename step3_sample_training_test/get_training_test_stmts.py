@@ -1,40 +1,211 @@
+"""This script partitions the papers read in step 2 into training and test
+sets.
+
+By default the PMIDs are sorted, shuffled with a fixed seed and the first 80%
+are taken as the training set, which reproduces the split used in the paper.
+
+With --stream, each PMID is instead assigned to a split by a seeded hash of
+the PMID itself, so no global shuffle is needed: papers are read one at a
+time (one shard at a time if the input is a statement store) and written
+straight into a statement store per split. Several fraction splits and
+k-fold splits can be made in the same pass over the corpus, e.g.
+
+    python get_training_test_stmts.py --stream \\
+        --split training:0.8,test:0.2 --split training:0.9,test:0.1 --folds 5
+
+Since every split scheme uses the same hash value of a PMID, the splits are
+nested: e.g. the 10% test set above is contained in the 20% test set.
+"""
+import os
+import sys
 import random
 import pickle
+import bisect
+import hashlib
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.stmt_store import StatementStoreWriter, iter_chunks
+
+
+input_file = ('../step2_read_no_famplex/'
+              'combined_genes_no_bioentities_stmts.pkl')
+
+
+def shuffle_split(source=input_file, training_fraction=0.8):
+    """Split the PMIDs by sorting and shuffling them as in the paper."""
+    # Load dict of PMIDs->statements
+    with open(source, 'rb') as f:
+        print("Loading statements")
+        pmid_stmts = pickle.load(f)
+
+    # Get the PMIDs and sort
+    pmids = sorted(list(pmid_stmts.keys()))
+    # Seed the random number generator for reproducibility
+    random.seed(1)
+    # Shuffle the PMIDs
+    random.shuffle(pmids)
+
+    # Partition the shuffled PMIDs into training/test sets
+    partition = int(training_fraction * len(pmids))
+    training_pmids = pmids[0:partition]
+    test_pmids = pmids[partition:]
+    with open('test_pmids.txt', 'w') as fh:
+        for pmid in test_pmids:
+            fh.write('%s\n' % pmid)
+    with open('training_pmids.txt', 'w') as fh:
+        for pmid in training_pmids:
+            fh.write('%s\n' % pmid)
+
+    # Get the statements for the training/test sets
+    training_stmts = {pmid: pmid_stmts[pmid] for pmid in training_pmids}
+    test_stmts = {pmid: pmid_stmts[pmid] for pmid in test_pmids}
+
+    # Save the training/test sets to pickle files
+    with open('training_pmid_stmts.pkl', 'wb') as f:
+        print("Saving training stmts")
+        pickle.dump(training_stmts, f)
+    with open('test_pmid_stmts.pkl', 'wb') as f:
+        print("Saving test stmts")
+        pickle.dump(test_stmts, f)
+
+
+def hash_fraction(pmid, seed):
+    """Return a number in [0, 1) determined by the PMID and the seed."""
+    digest = hashlib.md5(('%s:%s' % (seed, pmid)).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / float(2**64)
+
+
+class SplitScheme(object):
+    """Assign hash values to named splits.
+
+    Parameters
+    ----------
+    label : str
+        A name for the scheme, used as the output folder name.
+    names : list[str]
+        The names of the splits.
+    bounds : list[float]
+        The upper bound of the hash value range of each split. Hash values
+        above the last bound (if it is below 1) are not assigned to any
+        split.
+    """
+    def __init__(self, label, names, bounds):
+        self.label = label
+        self.names = names
+        self.bounds = bounds
+
+    @classmethod
+    def from_fractions(cls, spec):
+        """Make a scheme from a spec like 'training:0.8,test:0.2'."""
+        names = []
+        bounds = []
+        label_parts = []
+        total = 0
+        for part in spec.split(','):
+            name, fraction = part.split(':')
+            total += float(fraction)
+            names.append(name)
+            bounds.append(total)
+            label_parts.append('%s%d' % (name, round(100 * float(fraction))))
+        if total > 1 + 1e-9:
+            raise ValueError('Split fractions add up to more than 1: %s' %
+                             spec)
+        return cls('_'.join(label_parts), names, bounds)
+
+    @classmethod
+    def from_folds(cls, num_folds):
+        """Make a scheme splitting into a given number of equal folds."""
+        names = ['fold%d' % ix for ix in range(num_folds)]
+        bounds = [(ix + 1) / float(num_folds) for ix in range(num_folds)]
+        return cls('folds%d' % num_folds, names, bounds)
+
+    def assign(self, value):
+        """Return the name of the split for a hash value, or None."""
+        ix = bisect.bisect_right(self.bounds, value)
+        return self.names[ix] if ix < len(self.names) else None
+
+
+def stream_split(source, schemes, seed=1, out_dir='.', shard_size=5000):
+    """Partition a Statement corpus into splits in a single pass.
+
+    Parameters
+    ----------
+    source : str
+        A Statement pickle or statement store file name.
+    schemes : list[SplitScheme]
+        The split schemes to apply.
+    seed : Optional[int]
+        The seed of the PMID hash.
+    out_dir : Optional[str]
+        The folder into which each split's statement store
+        (<split>_pmid_stmts/) and PMID list (<split>_pmids.txt) are written.
+        If there is more than one scheme, each is written into a subfolder
+        named by its label.
+    shard_size : Optional[int]
+        The number of papers in each shard of the output stores.
+
+    Returns
+    -------
+    split_sizes : dict
+        The number of papers in each split, keyed by (scheme label, split).
+    """
+    outputs = {}
+    for scheme in schemes:
+        scheme_dir = out_dir if len(schemes) == 1 else \
+            os.path.join(out_dir, scheme.label)
+        for name in scheme.names:
+            writer = StatementStoreWriter(
+                os.path.join(scheme_dir, '%s_pmid_stmts' % name), shard_size)
+            pmid_fh = open(os.path.join(scheme_dir, '%s_pmids.txt' % name),
+                           'w')
+            outputs[(scheme.label, name)] = (writer, pmid_fh)
+    split_sizes = {key: 0 for key in outputs}
+
+    for chunk in iter_chunks(source):
+        for pmid, stmts in chunk.items():
+            value = hash_fraction(pmid, seed)
+            for scheme in schemes:
+                name = scheme.assign(value)
+                if name is None:
+                    continue
+                writer, pmid_fh = outputs[(scheme.label, name)]
+                writer.add(pmid, stmts)
+                pmid_fh.write('%s\n' % pmid)
+                split_sizes[(scheme.label, name)] += 1
+
+    for writer, pmid_fh in outputs.values():
+        writer.close()
+        pmid_fh.close()
+    for (label, name), size in sorted(split_sizes.items()):
+        print('%s/%s: %d papers' % (label, name, size))
+    return split_sizes
+
 
-# Load dict of PMIDs->statements
-with open('../step2_read_no_famplex/'
-          'combined_genes_no_bioentities_stmts.pkl', 'rb') as f:
-    print("Loading statements")
-    pmid_stmts = pickle.load(f)
-
-# Get the PMIDs and sort
-pmids = sorted(list(pmid_stmts.keys()))
-# Seed the random number generator for reproducibility
-random.seed(1)
-# Shuffle the PMIDs
-random.shuffle(pmids)
-
-# Partition the shuffled PMIDs into training/test sets
-training_fraction = 0.8
-partition = int(training_fraction * len(pmids))
-training_pmids = pmids[0:partition]
-test_pmids = pmids[partition:]
-with open('test_pmids.txt', 'w') as fh:
-    for pmid in test_pmids:
-        fh.write('%s\n' % pmid)
-with open('training_pmids.txt', 'w') as fh:
-    for pmid in training_pmids:
-        fh.write('%s\n' % pmid)
-
-# Get the statements for the training/test sets
-training_stmts = {pmid: pmid_stmts[pmid] for pmid in training_pmids}
-test_stmts = {pmid: pmid_stmts[pmid] for pmid in test_pmids}
-
-# Save the training/test sets to pickle files
-with open('training_pmid_stmts.pkl', 'wb') as f:
-    print("Saving training stmts")
-    pickle.dump(training_stmts, f)
-with open('test_pmid_stmts.pkl', 'wb') as f:
-    print("Saving test stmts")
-    pickle.dump(test_stmts, f)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Partition papers into training and test sets.')
+    parser.add_argument('--stream', action='store_true',
+                        help='Split by PMID hash into statement stores '
+                             'instead of shuffling.')
+    parser.add_argument('--input', default=input_file)
+    parser.add_argument('--split', action='append', default=[],
+                        help='Fraction split, e.g. training:0.8,test:0.2. '
+                             'Can be given multiple times.')
+    parser.add_argument('--folds', type=int, action='append', default=[],
+                        help='Number of folds of a k-fold split. Can be '
+                             'given multiple times.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out-dir', default='.')
+    parser.add_argument('--shard-size', type=int, default=5000)
+    args = parser.parse_args()
 
+    if not args.stream:
+        shuffle_split(args.input)
+    else:
+        schemes = [SplitScheme.from_fractions(spec) for spec in args.split]
+        schemes += [SplitScheme.from_folds(k) for k in args.folds]
+        if not schemes:
+            schemes = [SplitScheme.from_fractions('training:0.8,test:0.2')]
+        stream_split(args.input, schemes, args.seed, args.out_dir,
+                     args.shard_size)
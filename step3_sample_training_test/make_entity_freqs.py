@@ -1,11 +1,29 @@
 """This script compares the frequency of entities that
 appear in the test set with those in the training set, and
-produces plots that show the comparison."""
+produces plots that show the comparison.
+
+Entity texts are interned into a vocabulary shared by all the corpora being
+compared, and counted with numpy.bincount into one row per corpus of a dense
+count matrix whose columns share the same index, so any number of corpora
+(e.g. several versions of a corpus) can be compared at once:
+
+    python make_entity_freqs.py training_pmid_stmts.pkl test_pmid_stmts.pkl \\
+        other_version_stmts.pkl
+"""
 import os
-import pickle
+import sys
+import array
 import numpy
-from collections import Counter
 import matplotlib.pyplot as plt
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.stmt_store import iter_chunks, get_store_path
+from common.mention_table import Vocabulary, open_mention_table, \
+    get_table_path
+from common.result_cache import cached
+
+default_corpora = ('training_pmid_stmts.pkl', 'test_pmid_stmts.pkl')
+default_labels = ('Training', 'Test')
 
 
 def get_strings(stmts):
@@ -21,62 +39,116 @@ def get_strings(stmts):
     return strs
 
 
-def get_counts(fname):
-    """Return entitiy counts from a pickle file of Statements."""
-    print('Loading %s' % fname)
-    with open(fname, 'rb') as fh:
-        stmts = pickle.load(fh)
-        strs = get_strings(stmts)
-        counts = Counter(strs)
-        countsl = sorted(list(counts.items()),
-                         key=lambda x: x[1], reverse=True)
-        return countsl
-
-
-def align_lists(l1, l2):
-    """Align two lists so that they share the same joint ordering."""
-    d = {}
-    for k, v in l1:
-        d[k] = [v, 0]
-    for k, v in l2:
-        try:
-            d[k][1] = v
-        except KeyError:
-            d[k] = [0, v]
-    dsort = sorted(d.values(), key=lambda x: x[0], reverse=True)
-    ll1, ll2 = [[e1 for e1, e2 in dsort],
-                [e2 for e1, e2 in dsort]]
-    ll1 = numpy.array(ll1) / numpy.sum(ll1)
-    ll2 = numpy.array(ll2) / numpy.sum(ll2)
-    return ll1, ll2
-
-
-def plot_hist_subfig(l1, l2, nents):
+def get_corpus_paths(fnames):
+    """Return the paths that the Statements of corpora can be read from."""
+    paths = []
+    for fname in fnames:
+        paths += [fname, get_store_path(fname) or fname[:-len('.pkl')],
+                  get_table_path(fname)]
+    return paths
+
+
+@cached(files=get_corpus_paths)
+def count_entities(fnames):
+    """Return entity counts for a list of Statement corpora.
+
+    Parameters
+    ----------
+    fnames : list[str]
+        Statement pickle or store file names. The mention table of a corpus
+        is used instead of its Statements if it exists.
+
+    Returns
+    -------
+    texts : list[str]
+        The entity texts appearing in any of the corpora.
+    counts : numpy.ndarray
+        A matrix with one row per corpus and one column per entry of texts
+        holding the number of times the text appears in the corpus.
+    """
+    vocab = Vocabulary()
+    corpus_counts = []
+    for fname in fnames:
+        table = open_mention_table(fname)
+        if table is not None:
+            # Map the codes of the table's own vocabulary to shared codes
+            codes = numpy.array([vocab.get_code(text)
+                                 for text in table.texts], dtype=numpy.int64)
+            corpus_counts.append((codes, table.text_counts()))
+            continue
+        codes = array.array('q')
+        # Count one shard at a time if the Statements are in a store
+        for stmts in iter_chunks(fname):
+            codes.extend(vocab.get_code(txt) for txt in get_strings(stmts))
+        codes = numpy.frombuffer(codes, dtype=numpy.int64)
+        corpus_counts.append((None, numpy.bincount(codes)))
+
+    counts = numpy.zeros((len(fnames), len(vocab)), dtype=numpy.int64)
+    for row, (codes, text_counts) in enumerate(corpus_counts):
+        if codes is None:
+            counts[row, :len(text_counts)] = text_counts
+        else:
+            counts[row, codes] = text_counts
+    return vocab.strings, counts
+
+
+def align_counts(counts, ref_ix=0):
+    """Return relative frequencies of entities, ordered by decreasing
+    frequency in a reference corpus.
+
+    Parameters
+    ----------
+    counts : numpy.ndarray
+        A count matrix as returned by count_entities.
+    ref_ix : Optional[int]
+        The row of the reference corpus. Default: 0
+
+    Returns
+    -------
+    freqs : numpy.ndarray
+        The relative frequency of each entity in each corpus, with the
+        columns sorted by the reference corpus.
+    order : numpy.ndarray
+        The column of counts at each column of freqs.
+    """
+    order = numpy.argsort(-counts[ref_ix], kind='stable')
+    totals = counts.sum(axis=1, keepdims=True).astype(float)
+    freqs = counts[:, order] / numpy.maximum(totals, 1)
+    return freqs, order
+
+
+def plot_hist_subfig(freqs, labels, nents, colors=('red', 'blue')):
     plt.figure(figsize=(12,10))
     for i, nent in enumerate(nents):
         plt.subplot(221 + i)
-        plt.plot(l2[:nent], color='blue', label='Test')
-        plt.plot(l1[:nent], color='red', label='Training')
+        # Plot the reference corpus last so it is on top
+        for row in reversed(range(len(freqs))):
+            plt.plot(freqs[row][:nent], color=colors[row % len(colors)],
+                     label=labels[row])
         plt.ylim([-0.0005, 0.018])
         plt.title('Top %d entities' % nent)
         plt.ylabel('Realtive frequency of occurrence')
-        plt.xlabel('Entity (in order of frequency of occurrence in training set)')
+        plt.xlabel('Entity (in order of frequency of occurrence in %s set)' %
+                   labels[0].lower())
         plt.legend()
     plt.savefig('entity_freqs_train_test.png')
 
 
+def make_entity_freqs_figure(fnames=default_corpora,
+                             labels=default_labels):
+    """Plot the entity frequencies of corpora, aligned with the ordering of
+    the first one."""
+    texts, counts = count_entities(list(fnames))
+    # Align the frequencies with the ordering of the first corpus
+    freqs, _ = align_counts(counts)
+    # Plot frequencies as subfigures
+    plot_hist_subfig(freqs, labels, [10, 100, 1000, 10000])
+
+
 if __name__ == '__main__':
-    # Cache the counts pickle because getting counts is fairly slow
-    if os.path.exists('counts.pkl'):
-        with open('counts.pkl', 'rb') as fh:
-            tr_counts, te_counts = pickle.load(fh)
+    if len(sys.argv) > 1:
+        fnames = sys.argv[1:]
+        labels = [os.path.basename(fname).split('.')[0] for fname in fnames]
+        make_entity_freqs_figure(fnames, labels)
     else:
-        tr_counts = get_counts('training_pmid_stmts.pkl')
-        te_counts = get_counts('test_pmid_stmts.pkl')
-        with open('counts.pkl', 'wb') as fh:
-            pickle.dump([tr_counts, te_counts], fh)
-
-    # Align the two lists obtained from training and test sets
-    trl, tel = align_lists(tr_counts, te_counts)
-    # Plot frequencies as subfigures
-    plot_hist_subfig(trl, tel, [10, 100, 1000, 10000])
+        make_entity_freqs_figure()
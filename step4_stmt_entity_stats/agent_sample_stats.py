@@ -3,51 +3,43 @@ import os
 import sys
 import pickle
 import numpy as np
-import pandas as pd
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from matplotlib import pyplot as plt
-import indra.tools.assemble_corpus as ac
-from indra.preassembler import grounding_mapper as gm
 from indra.util import write_unicode_csv, plot_formatting as pf
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.ungrounded_stats import get_ungrounded_stats
+from common.curves import coverage_curve, downsample
+from common.curation_stats import default_scheme, load_curated, \
+    category_stats, accuracy_by_sample_size
 
 with_fplx_label = 'With FamPlex'
 without_fplx_label = 'Without FamPlex'
+curated_files = OrderedDict([
+    ('training', 'training_agents_sample_curated.csv'),
+    ('test', 'test_agents_with_fplx_sample_curated.csv')])
 
-def make_ungrounded_stats():
-    """Return statistics of ungrounded entities for plotting."""
-    def get_ungrounded_stats(stmts):
-        # What fraction of statements grounded?
-        all_ungrounded = 0
-        any_ungrounded = 0
-        for stmt in stmts:
-            agents_ungrounded = []
-            for ag in stmt.agent_list():
-                if ag is not None and list(ag.db_refs.keys()) == ['TEXT']:
-                    agents_ungrounded.append(True)
-                else:
-                    agents_ungrounded.append(False)
-            if all(agents_ungrounded):
-                all_ungrounded += 1
-            if any(agents_ungrounded):
-                any_ungrounded += 1
-        all_ungrounded_ratio = 100 * (all_ungrounded / float(len(stmts)))
-        any_ungrounded_ratio = 100 * (any_ungrounded / float(len(stmts)))
-        return all_ungrounded_ratio, any_ungrounded_ratio
+def make_ungrounded_stats(processes=None):
+    """Return statistics of ungrounded entities for plotting.
 
-    def get_agent_counts(stmts):
-        agents = gm.ungrounded_texts(stmts)
-        agent_counts = [t[1] for t in agents]
-        return agent_counts
+    Each corpus is scanned once (in parallel over the shards of a statement
+    store, or vectorized over its mention table if it has one), see
+    common/ungrounded_stats.py.
+    """
+    def get_stats(fname):
+        stats = get_ungrounded_stats(fname, processes)
+        for stmt_type, (num, allu, anyu) in sorted(stats.by_type.items()):
+            print('%s: %d statements, %.1f%% all ungrounded, '
+                  '%.1f%% any ungrounded' %
+                  (stmt_type, num, 100.0 * allu / num, 100.0 * anyu / num))
+        return (stats.all_ungrounded_pct(), stats.any_ungrounded_pct(),
+                stats.agent_counts())
 
     fname = '../step3_sample_training_test/famplex_test_stmts_mapped.pkl'
-    stmts = ac.load_statements(fname)
-    allu_test, anyu_test = get_ungrounded_stats(stmts)
-    counts_test = get_agent_counts(stmts)
+    allu_test, anyu_test, counts_test = get_stats(fname)
 
     fname = '../step3_sample_training_test/training_pmid_stmts.pkl'
-    stmts = ac.load_statements(fname)
-    allu_train, anyu_train = get_ungrounded_stats(stmts)
-    counts_train = get_agent_counts(stmts)
+    allu_train, anyu_train, counts_train = get_stats(fname)
 
     return (allu_test, anyu_test, allu_train, anyu_train,
             counts_train, counts_test)
@@ -77,32 +69,12 @@ def plot_ungrounded_stats(allu_test, anyu_test, allu_train, anyu_train):
 def plot_ungrounded_frequencies(counts_list, labels, colors, plot_filename):
     """Plot the distribution of ungrounded strings in training vs test corpus.
     """
-    bin_interval = 1
-    fracs_total_list = []
-    bin_starts_list = []
-    for counts in counts_list:
-        freq_dist = []
-        bin_starts = list(range(0, len(counts), bin_interval))
-        bin_starts_list.append(bin_starts)
-        for bin_start_ix in bin_starts:
-            bin_end_ix = bin_start_ix + bin_interval
-            if bin_end_ix < len(counts):
-                freq_dist.append(np.sum(counts[bin_start_ix:bin_end_ix]))
-            else:
-                freq_dist.append(np.sum(counts[bin_start_ix:]))
-        freq_dist = np.array(freq_dist)
-        fracs_total = np.cumsum(freq_dist)
-        fracs_total_list.append(fracs_total)
-
     fig = plt.figure(figsize=(2.3, 2.2), dpi=300)
-    plt.ion()
     ax = fig.gca()
-    for i, (bin_starts, fracs_total) in \
-        enumerate(zip(bin_starts_list, fracs_total_list)):
-        xvals = np.array(bin_starts) / len(counts_list[i])
-        yvals = fracs_total / float(np.sum(counts_list[i]))
+    for i, counts in enumerate(counts_list):
+        xvals, yvals = downsample(*coverage_curve(counts, sort=False))
         ax.plot(xvals, yvals, color=colors[i])
-    ax.plot(xvals, xvals, color='gray', linestyle='dotted')
+    ax.plot([0, 1], [0, 1], color='gray', linestyle='dotted')
     labels = list(labels)
     labels.append('Uniform distribution')
     pf.format_axis(ax)
@@ -115,39 +87,27 @@ def plot_ungrounded_frequencies(counts_list, labels, colors, plot_filename):
     plt.savefig(plot_filename)
 
 
-cats = (['P'], ['F', 'C', 'X'], ['S'], ['B'], ['U'], ['M'])
-cat_names = ('Protein/gene', 'Family/complex', 'Small molecule',
-             'Biological process', 'Other/unknown', 'microRNA')
+cats = tuple(codes for _, codes in default_scheme)
+cat_names = tuple(name for name, _ in default_scheme)
 
 def grounding_stats(data, plot=False):
-    rows = []
-    num_agents = len(data)
+    """Return the number and grounding accuracy of curated agents in each
+    category, see common/curation_stats.py."""
+    if 'corpus' not in data:
+        data = data.assign(corpus='')
+    stats = category_stats(data, num_replicates=0)
+    rows = [(cat, number, pct, correct, correct_pct, stderr)
+            for cat, number, pct, correct, correct_pct, stderr in
+            zip(cats, stats.number, stats.pct, stats.correct,
+                stats.correct_pct, stats.stderr)]
     if plot:
         plt.figure(figsize=(2.2, 2), dpi=300)
-    for ix, cat in enumerate(cats):
-        cat_rows = data[data.EntityType.apply(lambda et: et in cat)]
-        cat_number = len(cat_rows)
-        cat_pct = (100 * cat_number / float(num_agents))
-        cat_pct_str = '%.1f' % cat_pct
-        correct_rows = cat_rows[cat_rows.Grounding == 1]
-        correct_number = len(correct_rows)
-        correct_pct = (100 * correct_number / float(cat_number)) if \
-            cat_number > 0 else 0
-        correct_pct_of_total = (100 * correct_number) / float(num_agents)
-        correct_pct_str = '%.1f' % correct_pct
-        def stderr(k, n):
-            return np.sqrt(((k/float(n)) * (1-(k/float(n)))) / float(n))
-        stderr_inc = 100 * stderr(cat_number - correct_number, cat_number)
-        stderr_corr = 100 * stderr(correct_number, cat_number)
-        rows.append((cat, cat_number, cat_pct, correct_number,
-                     correct_pct, stderr_corr))
-        if plot:
-            inc_handle = plt.bar(ix, cat_pct, color=pf.ORANGE, align='center',
-                                 yerr=stderr_inc, linewidth=0.5)
-            corr_handle = plt.bar(ix, correct_pct_of_total, color=pf.GREEN,
-                                  align='center', yerr=stderr_corr,
-                                  linewidth=0.5)
-    if plot:
+        correct_pct_of_total = stats.pct * stats.correct_pct / 100.0
+        inc_handle = plt.bar(range(len(cats)), stats.pct, color=pf.ORANGE,
+                             align='center', yerr=stats.stderr, linewidth=0.5)
+        corr_handle = plt.bar(range(len(cats)), correct_pct_of_total,
+                              color=pf.GREEN, align='center',
+                              yerr=stats.stderr, linewidth=0.5)
         plt.xticks(range(len(cats)), cat_names, rotation=90)
         plt.ylabel('Pct. Curated Entities')
         plt.subplots_adjust(left=0.18, bottom=0.43, top=0.96)
@@ -155,7 +115,6 @@ def grounding_stats(data, plot=False):
         pf.format_axis(ax)
         plt.legend((corr_handle, inc_handle), ('Correct', 'Incorrect'),
                    loc='upper right', frameon=False, fontsize=pf.fontsize)
-        plt.show()
     write_unicode_csv('agents_sample_stats.csv', rows)
     return rows
 
@@ -188,7 +147,6 @@ def combined_graph(results):
                frameon=False, fontsize=pf.fontsize)
     plt.subplots_adjust(left=0.22, bottom=0.15, top=0.94, right=0.94)
     plt.savefig('combined_results.pdf')
-    plt.show()
 
 
 def print_combined_table(results):
@@ -243,30 +201,39 @@ def to_latex_table(rows):
     print(latex)
 
 
-if __name__ == '__main__':
+def make_ungrounded_figures():
+    """Plot the ungrounded statistics of the training and test corpora."""
     pf.set_fig_params()
-    plt.ion()
-    family_cats = ('F', 'C', 'X')
-    filenames = {'training': 'training_agents_sample_curated.csv',
-                 'test': 'test_agents_with_fplx_sample_curated.csv'}
-    file_keys = ['training', 'test']
-
-    results = {}
-    for file_key in file_keys:
-        filename = filenames[file_key]
-        with open(filename, 'rb') as f:
-            data = pd.read_csv(f)
-
-        num_curated = 300
-        curated = data[0:num_curated]
-        results[file_key] = grounding_stats(curated)
-
-    rows = print_combined_table(results)
-    combined_graph(results)
     ug_stats = make_ungrounded_stats()
-
     plot_ungrounded_stats(*ug_stats[:4])
     plot_ungrounded_frequencies(ug_stats[4:],
                                 (without_fplx_label, with_fplx_label),
                                 (pf.ORANGE, pf.GREEN),
                                 'ungrounded_frequencies.pdf')
+
+
+def make_curation_figures(data=None):
+    """Plot and tabulate the grounding accuracy of the curated samples."""
+    pf.set_fig_params()
+    if data is None:
+        data = load_curated(curated_files)
+    results = {}
+    for file_key in curated_files:
+        results[file_key] = grounding_stats(data[data.corpus == file_key])
+    print_combined_table(results)
+    combined_graph(results)
+
+
+if __name__ == '__main__':
+    plt.ion()
+    # Only the first rows of the samples are curated
+    data = load_curated(curated_files)
+    for file_key in curated_files:
+        accuracy_by_sample_size(data[data.corpus == file_key]).to_csv(
+            '%s_accuracy_by_sample_size.csv' % file_key)
+    # Bootstrap confidence intervals of the accuracies
+    category_stats(data).to_csv('agents_sample_category_stats.csv',
+                                index=False)
+
+    make_curation_figures(data)
+    make_ungrounded_figures()
@@ -1,45 +1,182 @@
+"""This script generates HTML pages with links to the groundings of sampled
+agents, for ease of curation.
+
+The rows of the sample are streamed into pages of a fixed size in an output
+folder, with links to the previous and next page and an index page. Links
+are resolved once per distinct (namespace, id) pair. Rows can be filtered by
+EntityType and by grounding namespace. A manifest of the hash of each page's
+rows is kept in the output folder, so that on later runs only the pages
+whose rows changed are written again:
+
+    python generate_agent_links.py training --entity-type F --entity-type C
+"""
 import os
-import sys
 import csv
+import json
+import hashlib
+import argparse
+from functools import lru_cache
 from indra.databases import get_identifiers_url
 
+manifest_file = 'manifest.json'
+
+
+@lru_cache(maxsize=None)
 def get_link(db_name, db_ref):
     url = get_identifiers_url(db_name, db_ref)
     link = '<a href="%s" target="_blank">%s:%s</a>' % (url, db_name, db_ref)
     return link
 
+
+def iter_rows(sample_file, entity_types=None, namespaces=None):
+    """Iterate over (row number, row) pairs of a sample CSV file.
+
+    Parameters
+    ----------
+    sample_file : str
+        The sample CSV file.
+    entity_types : Optional[list[str]]
+        If given, only rows with one of these EntityTypes are kept.
+    namespaces : Optional[list[str]]
+        If given, only rows with a grounding in one of these namespaces are
+        kept.
+    """
+    with open(sample_file, 'r') as fh:
+        reader = csv.reader(fh)
+        next(reader)
+        for row_num, row in enumerate(reader, 1):
+            if entity_types and row[0] not in entity_types:
+                continue
+            if namespaces and not set(row[3:9:2]) & set(namespaces):
+                continue
+            yield row_num, row
+
+
+def render_row(row_num, row):
+    """Return the HTML table row of a sample row."""
+    cells = ['<tr><td>%d</td><td>%s</td>' % (row_num, row[2])]
+    link = 'https://www.ncbi.nlm.nih.gov/pubmed/%s' % row[9]
+    cells.append('<td><a href="%s" target="_blank">%s</a></td>' %
+                 (link, row[9]))
+    for i in range(3):
+        db_name = row[2*i+3]
+        if db_name == 'IPR':
+            db_name = 'IP'
+        db_id = row[2*i+4]
+        if not db_name:
+            cells.append('<td>&nbsp;</td>')
+            continue
+        cells.append('<td>%s</td>' % get_link(db_name, db_id))
+    cells.append('</tr>')
+    return ''.join(cells)
+
+
+def get_page_file(page_ix):
+    return 'page_%04d.html' % page_ix
+
+
+def render_page(page_ix, rows, has_next):
+    """Return the HTML of a page of rows."""
+    nav = ['<a href="index.html">Index</a>']
+    if page_ix > 0:
+        nav.insert(0, '<a href="%s">Previous</a>' % get_page_file(page_ix-1))
+    if has_next:
+        nav.append('<a href="%s">Next</a>' % get_page_file(page_ix+1))
+    nav = '<p>%s</p>' % ' | '.join(nav)
+    return ''.join(['<html><body>', nav, '<table border=1>'] +
+                   [render_row(row_num, row) for row_num, row in rows] +
+                   ['</table>', nav, '</body></html>'])
+
+
+def iter_pages(rows, page_size):
+    """Iterate over (page rows, has next page) pairs of a row iterator."""
+    page = []
+    for row in rows:
+        if len(page) == page_size:
+            yield page, True
+            page = []
+        page.append(row)
+    if page:
+        yield page, False
+
+
+def write_pages(rows, out_dir, page_size=200):
+    """Write rows into pages in a folder, skipping unchanged pages.
+
+    Parameters
+    ----------
+    rows : iterable[tuple]
+        (row number, row) pairs as produced by iter_rows.
+    out_dir : str
+        The output folder.
+    page_size : Optional[int]
+        The number of rows per page.
+
+    Returns
+    -------
+    num_written, num_pages : tuple[int]
+        The number of pages written in this run and the total number of
+        pages.
+    """
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    manifest_path = os.path.join(out_dir, manifest_file)
+    try:
+        with open(manifest_path, 'r') as fh:
+            old_manifest = json.load(fh)
+    except (IOError, ValueError):
+        old_manifest = {}
+    manifest = {}
+    index_entries = []
+    num_written = 0
+    for page_ix, (page, has_next) in enumerate(iter_pages(rows, page_size)):
+        page_file = get_page_file(page_ix)
+        page_hash = hashlib.sha256(
+            json.dumps([page, has_next]).encode('utf-8')).hexdigest()
+        manifest[page_file] = page_hash
+        index_entries.append('<li><a href="%s">Rows %d-%d</a>: %s</li>' %
+                             (page_file, page[0][0], page[-1][0],
+                              page[0][1][2]))
+        path = os.path.join(out_dir, page_file)
+        if old_manifest.get(page_file) == page_hash and os.path.exists(path):
+            continue
+        with open(path, 'w') as fh:
+            fh.write(render_page(page_ix, page, has_next))
+        num_written += 1
+    # Remove pages left over from a longer previous run
+    for page_file in set(old_manifest) - set(manifest):
+        path = os.path.join(out_dir, page_file)
+        if os.path.exists(path):
+            os.remove(path)
+    with open(os.path.join(out_dir, 'index.html'), 'w') as fh:
+        fh.write('<html><body><ul>%s</ul></body></html>' %
+                 ''.join(index_entries))
+    with open(manifest_path, 'w') as fh:
+        json.dump(manifest, fh, indent=1)
+    return num_written, len(manifest)
+
+
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print('Usage: %s [training|test]' % os.path.basename(__file__))
-        sys.exit()
-    mode = sys.argv[1]
-    if mode not in ('training', 'test'):
-        print('Usage: %s [training|test]' % os.path.basename(__file__))
-        sys.exit()
+    parser = argparse.ArgumentParser(
+        description='Generate pages of links to the groundings of sampled '
+                    'agents.')
+    parser.add_argument('mode', choices=['training', 'test'])
+    parser.add_argument('--page-size', type=int, default=200)
+    parser.add_argument('--entity-type', action='append',
+                        help='Only include rows with this EntityType.')
+    parser.add_argument('--namespace', action='append',
+                        help='Only include rows grounded to this namespace.')
+    parser.add_argument('--out-dir',
+                        help='The output folder. Default: '
+                             '<sample file>_links')
+    args = parser.parse_args()
+    mode = args.mode
 
     sample_file = 'training_agents_sample_curated.csv' if mode == 'training' \
         else 'test_agents_with_fplx_sample.csv'
-    out_file = 'training_agents_sample_links.html' if mode == 'training' \
-            else 'test_agents_with_fplx_sample.html'
+    out_dir = args.out_dir or sample_file[:-len('.csv')] + '_links'
 
-    with open(sample_file, 'r') as fh1, open(out_file, 'w') as fh:
-        reader = csv.reader(fh1)
-        next(reader)
-        fh.write('<body><table border=1>')
-        for row in reader:
-            fh.write('<tr><td>%s</td>' % row[2])
-            link = 'https://www.ncbi.nlm.nih.gov/pubmed/%s' % row[9]
-            fh.write('<td><a href="%s" target="_blank">%s</a></td>' %
-                     (link, row[9]))
-            for i in range(3):
-                db_name = row[2*i+3]
-                if db_name == 'IPR':
-                    db_name = 'IP'
-                db_id = row[2*i+4]
-                if not db_name:
-                    fh.write('<td>&nbsp;</td>')
-                    continue
-                link = get_link(db_name, db_id)
-                fh.write('<td>%s</td>' % link)
-            fh.write('</tr>')
-        fh.write('</table></body>')
+    rows = iter_rows(sample_file, args.entity_type, args.namespace)
+    num_written, num_pages = write_pages(rows, out_dir, args.page_size)
+    print('Wrote %d of %d pages into %s, %d distinct links' %
+          (num_written, num_pages, out_dir, get_link.cache_info().currsize))
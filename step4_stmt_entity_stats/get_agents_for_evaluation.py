@@ -1,41 +1,212 @@
+"""This script samples agents from the training or test Statements for
+curation, and optionally reports grounding statistics.
+
+Agents are sampled in a single pass over the Statements with reservoir
+sampling, so the flat list of all Statements is never built. The sample is
+seeded and depends only on the Statements, which are visited in PMID order
+for the training set (whether it's a pickle or a statement store written in
+PMID order) and in list order for the test set. With --stratify, the sample
+is stratified by the namespace of the agents' first grounding or by
+Statement type, with the number of agents sampled from each stratum
+proportional to its size. The grounding report of INDRA's
+reading_results_stats needs all Statements in a list, so it is only made
+with --report.
+"""
 import os
 import sys
-import pickle
-from indra.preassembler import grounding_mapper as gm
+import random
+import argparse
 from indra.tools.reading import reading_results_stats as rrs
+from indra.util import write_unicode_csv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.stmt_store import open_statements, pmid_sort_key, \
+    StatementStore
+
+header = ['EntityType', 'Grounding', 'Text', 'DB_Ns1', 'DB_Id1', 'DB_Ns2',
+          'DB_Id2', 'DB_Ns3', 'DB_Id3', 'PMID', 'Sentence']
+
+
+def iter_ordered_statements(stmts):
+    """Iterate over Statements in PMID order if they are grouped by PMID,
+    otherwise in list order.
+
+    A statement store is read in one pass, shard by shard. Stores written in
+    PMID order (as by stmt_store.convert_pickle) are visited in PMID order
+    like the pickle they were made from; other stores are visited in shard
+    order with the papers of each shard in PMID order.
+    """
+    if isinstance(stmts, list):
+        for stmt in stmts:
+            yield stmt
+        return
+    if isinstance(stmts, StatementStore):
+        if stmts.in_pmid_order():
+            items = stmts.iter_items()
+        else:
+            items = (item for shard in stmts.iter_shards()
+                     for item in sorted(shard.items(),
+                                        key=lambda x: pmid_sort_key(x[0])))
+        for _, pmid_stmts in items:
+            for stmt in pmid_stmts:
+                yield stmt
+        return
+    for pmid in sorted(stmts.keys(), key=pmid_sort_key):
+        for stmt in stmts[pmid]:
+            yield stmt
+
+
+def iter_agents(stmts):
+    """Iterate over (agent, evidence) pairs of agents with a TEXT."""
+    for stmt in stmts:
+        ev = stmt.evidence[0] if stmt.evidence else None
+        for agent in stmt.agent_list():
+            if agent is not None and agent.db_refs.get('TEXT'):
+                yield agent, ev
+
+
+def reservoir_sample(items, num_samples, rng):
+    """Return a uniform random sample of items from an iterator.
+
+    Each item is kept with probability num_samples / (items seen so far),
+    replacing a random item of the sample (Algorithm R), so the sample is
+    drawn in one pass and in O(num_samples) memory.
+    """
+    sample = []
+    for ix, item in enumerate(items):
+        if ix < num_samples:
+            sample.append(item)
+        else:
+            jx = rng.randint(0, ix)
+            if jx < num_samples:
+                sample[jx] = item
+    return sample
+
+
+def stratified_sample(items, num_samples, get_stratum, rng):
+    """Return a stratified random sample of items from an iterator.
+
+    A reservoir of num_samples items is kept for each stratum, from which
+    a number of items proportional to the stratum's size is then drawn
+    (rounded by largest remainder).
+    """
+    reservoirs = {}
+    sizes = {}
+    for item in items:
+        stratum = get_stratum(item)
+        size = sizes.get(stratum, 0)
+        reservoir = reservoirs.setdefault(stratum, [])
+        if size < num_samples:
+            reservoir.append(item)
+        else:
+            jx = rng.randint(0, size)
+            if jx < num_samples:
+                reservoir[jx] = item
+        sizes[stratum] = size + 1
+    total = sum(sizes.values())
+    if not total:
+        return []
+    num_samples = min(num_samples, total)
+    strata = sorted(sizes, key=str)
+    quotas = {s: num_samples * sizes[s] // total for s in strata}
+    remainders = sorted(strata, key=lambda s: num_samples * sizes[s] % total,
+                        reverse=True)
+    for stratum in remainders[:num_samples - sum(quotas.values())]:
+        quotas[stratum] += 1
+    sample = []
+    for stratum in strata:
+        sample += rng.sample(reservoirs[stratum], quotas[stratum])
+    rng.shuffle(sample)
+    return sample
+
+
+def get_namespace(item):
+    """Return the namespace of an agent's first grounding, if any."""
+    agent, _ = item
+    for ns in agent.db_refs:
+        if ns != 'TEXT':
+            return ns
+    return None
+
+
+def sample_agents(stmts, num_samples, seed=1, stratify=None):
+    """Return a sample of agents from Statements.
+
+    Parameters
+    ----------
+    stmts : iterable[indra.statements.Statement]
+        The Statements to sample agents from.
+    num_samples : int
+        The number of agents to sample.
+    seed : Optional[int]
+        The random seed. Default: 1
+    stratify : Optional[str]
+        'namespace' to stratify by the namespace of the first grounding,
+        'stmt_type' to stratify by Statement type, or None (default) for
+        a uniform sample.
+
+    Returns
+    -------
+    sample : list[tuple]
+        (agent, evidence) tuples of the sampled agents.
+    """
+    rng = random.Random(seed)
+    if stratify is None:
+        return reservoir_sample(iter_agents(stmts), num_samples, rng)
+    if stratify == 'stmt_type':
+        items = ((agent, ev, type(stmt).__name__) for stmt in stmts
+                 for agent, ev in iter_agents([stmt]))
+        sample = stratified_sample(items, num_samples, lambda x: x[2], rng)
+        return [(agent, ev) for agent, ev, _ in sample]
+    return stratified_sample(iter_agents(stmts), num_samples, get_namespace,
+                             rng)
+
+
+def write_agent_sample(sample, out_file):
+    """Write sampled agents into a CSV file for curation."""
+    rows = [header]
+    for agent, ev in sample:
+        groundings = [(ns, db_id) for ns, db_id in agent.db_refs.items()
+                      if ns != 'TEXT'][:3]
+        refs = []
+        for ns, db_id in groundings:
+            refs += [ns, db_id]
+        refs += [''] * (6 - len(refs))
+        rows.append(['', '', agent.db_refs['TEXT']] + refs +
+                    [ev.pmid if ev and ev.pmid else '',
+                     ev.text if ev and ev.text else ''])
+    write_unicode_csv(out_file, rows)
+
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print('Usage: %s [training|test]' % os.path.basename(__file__))
-        sys.exit()
-    mode = sys.argv[1]
-    if mode not in ('training', 'test'):
-        print('Usage: %s [training|test]' % os.path.basename(__file__))
-        sys.exit()
+    parser = argparse.ArgumentParser(
+        description='Sample agents for curation.')
+    parser.add_argument('mode', choices=['training', 'test'])
+    parser.add_argument('--num-agents', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--stratify', choices=['namespace', 'stmt_type'])
+    parser.add_argument('--report', action='store_true',
+                        help='Also make the grounding report, which needs '
+                             'all Statements in memory.')
+    args = parser.parse_args()
+    mode = args.mode
 
     filename = '../step3_sample_training_test/%s.pkl' % \
             ('training_pmid_stmts' if mode == 'training' else \
              'famplex_test_stmts_mapped')
-    with open(filename, 'rb') as f:
-        stmts = pickle.load(f)
+    stmts = open_statements(filename)
 
     if mode == 'training':
-        print("No. of papers in %s set: %d" % len(stmts.keys()))
-
-        # Sort the statements by PMID key
-        sorted_pmids = sorted(stmts.keys())
-        stmts_list = []
-        for pmid in sorted_pmids:
-            for s in stmts[pmid]:
-                stmts_list.append(s)
-        stmts = stmts_list
+        print("No. of papers in %s set: %d" % (mode, len(stmts.keys())))
 
-    # Get 10000 randomly selected agents from the full statement list
+    # Get randomly selected agents from the full statement list
     out_file = 'training_agents_sample.csv' if mode == 'training' else \
         'test_agents_with_fplx_sample.csv'
-    gm.raw_agent_texts(stmts, 10000, out_file)
-
-    plot_prefix = 'training' if mode == 'training' else 'test_with_fplx'
-    rrs.report_grounding(stmts, bin_interval=100,
-                         plot_prefix=plot_prefix)
+    sample = sample_agents(iter_ordered_statements(stmts), args.num_agents,
+                           seed=args.seed, stratify=args.stratify)
+    write_agent_sample(sample, out_file)
 
+    if args.report:
+        plot_prefix = 'training' if mode == 'training' else 'test_with_fplx'
+        rrs.report_grounding(list(iter_ordered_statements(stmts)),
+                             bin_interval=100, plot_prefix=plot_prefix)
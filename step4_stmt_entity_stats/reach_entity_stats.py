@@ -1,90 +1,202 @@
 """This script calculates ranked lists of entities directly from the REACH
 output to measure whether there is difference in constructing the same
-statistics from event-extraction-based INDRA Statements."""
+statistics from event-extraction-based INDRA Statements.
 
-from indra.literature import s3_client
+The PMIDs are split into shards that are processed by a pool of worker
+processes. Each worker reads the REACH output of the papers in its shard
+from S3 (or, with --local, from a folder of <pmid>.json files), and saves
+partial counts of raw and event entities for the shard into the --out-dir
+folder. The partial counts are then merged. Shards whose partial counts
+already exist are skipped, so an interrupted run can be resumed, and
+--max-papers limits the run to the first papers of the list.
 
-def get_entities(reach_json):
-    """Return raw entities and event-extracted entities from REACH output.
+Only the entity frames and event arguments of each REACH output are
+extracted, by stream-parsing it if ijson is installed (see
+common/reach_stream.py).
+
+NOTE: the S3 storage is not publicly accessible.
+"""
+
+import os
+import sys
+import pickle
+import argparse
+from multiprocessing import Pool
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.entity_counts import EntityCounts
+from common.reach_stream import get_entities
+
+
+class S3Source(object):
+    """Read REACH output from S3."""
+    def __init__(self, reader='reach_no_famplex'):
+        self.reader = reader
+
+    def get_json(self, pmid):
+        """Return the REACH JSON for a PMID as bytes, or None if there is
+        none."""
+        from indra.literature import s3_client
+        reach_json = s3_client.get_reader_output(self.reader, pmid)
+        return reach_json.encode('utf-8') if reach_json else None
+
+
+class LocalSource(object):
+    """Read REACH output from a local folder of <pmid>.json files."""
+    def __init__(self, root):
+        self.root = root
+
+    def get_json(self, pmid):
+        """Return the REACH JSON for a PMID as bytes, or None if there is
+        none."""
+        path = os.path.join(self.root, '%s.json' % pmid)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as fh:
+            return fh.read()
+
+
+def get_shard_file(out_dir, shard_ix):
+    return os.path.join(out_dir, 'shard_%05d.pkl' % shard_ix)
+
+
+def load_shard_counts(fname, pmids):
+    """Return the partial counts saved for a shard, or None if they don't
+    exist or were made for a different list of PMIDs."""
+    if not os.path.exists(fname):
+        return None
+    with open(fname, 'rb') as fh:
+        counts = pickle.load(fh)
+    return counts if counts['pmids'] == pmids else None
+
+
+def process_shard(args):
+    """Count the raw and event entities in the REACH output of a shard of
+    PMIDs and save the partial counts into a file."""
+    source, pmids, fname, stream = args
+    raw_entities_all = EntityCounts()
+    event_entities_all = EntityCounts()
+    num_missing = 0
+    for pmid in pmids:
+        reach_json = source.get_json(pmid)
+        if not reach_json:
+            num_missing += 1
+            continue
+        # Extract the entities from the JSON and update counts
+        raw_entities, event_entities = get_entities(reach_json, stream)
+        raw_entities_all.update_records(raw_entities)
+        event_entities_all.update_records(event_entities)
+    counts = {'pmids': pmids, 'num_missing': num_missing,
+              'raw': raw_entities_all, 'event': event_entities_all}
+    # Write to a temporary file first so an interrupted shard isn't reused
+    tmp_fname = fname + '.tmp'
+    with open(tmp_fname, 'wb') as fh:
+        pickle.dump(counts, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_fname, fname)
+    return fname
+
+
+def count_entities(pmids, source, out_dir, shard_size=1000, num_workers=8,
+                   stream=None):
+    """Return counts of raw and event entities over a list of PMIDs.
 
     Parameters
     ----------
-    reach_json : str
-        The output of REACH for a given PMID.
+    pmids : list[str]
+        The PMIDs whose REACH output is processed.
+    source : S3Source or LocalSource
+        The source of REACH output.
+    out_dir : str
+        The folder in which the partial counts of each shard are saved.
+    shard_size : Optional[int]
+        The number of PMIDs per shard.
+    num_workers : Optional[int]
+        The number of worker processes.
+    stream : Optional[bool]
+        Whether to stream-parse REACH output, see
+        reach_stream.parse_reach_json.
 
     Returns
     -------
-    raw_entities, event_entities : tuple
-        raw_entities: the full list of entities found in text irrespective
-            of their appearence in events
-        event_entities: the list of entities that are arguments of extracted
-            events
+    raw_entities_all, event_entities_all : tuple[EntityCounts]
+        The number of times each entity text was extracted with each
+        (namespace, id) grounding, for all entities and for entities that
+        are event arguments.
     """
-    raw_entities = reach_json['entities']['frames']
-    raw_entity_map = {ent['frame-id']: ent for ent in raw_entities}
-    events = reach_json['events']['frames']
-    event_entities = []
-    for event in events:
-        args = event.get('arguments', [])
-        for arg in args:
-            if arg['argument-type'] == 'entity':
-                entity = raw_entity_map[arg['arg']]
-                event_entities.append(entity)
-    print('%d/%d: %d/%d entities from %s' %
-          (i, len(pmids), len(raw_entities), len(event_entities), pmid))
-    return raw_entities, event_entities
-
-
-def update_entity_dict(entity_dict, entities):
-    """Update a summary dict of entities and groundings given new entities."""
-    for entity in entities:
-        txt = entity.get('text')
-        if not txt:
-            continue
-        if txt not in entity_dict:
-            entity_dict[txt] = {}
-        xrefs = entity['xrefs']
-        if not xrefs:
-            key = (None, None)
-            try:
-                entity_dict[txt][key] += 1
-            except KeyError:
-                entity_dict[txt][key] = 1
-        else:
-            for xref in xrefs:
-                if xref['namespace'] == 'uaz':
-                    key = ('uaz', 'UAZ')
-                else:
-                    key = (xref['namespace'], xref['id'])
-                try:
-                    entity_dict[txt][key] += 1
-                except KeyError:
-                    entity_dict[txt][key] = 1
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    shards = [pmids[i:i+shard_size] for i in range(0, len(pmids), shard_size)]
+    shard_files = [get_shard_file(out_dir, ix) for ix in range(len(shards))]
+    todo = [(source, shard, fname, stream)
+            for shard, fname in zip(shards, shard_files)
+            if load_shard_counts(fname, shard) is None]
+    print('%d/%d shards done, %d to process' %
+          (len(shards) - len(todo), len(shards), len(todo)))
+    if todo:
+        with Pool(num_workers) as pool:
+            for ndone, fname in enumerate(
+                    pool.imap_unordered(process_shard, todo), 1):
+                print('%d/%d: saved %s' % (ndone, len(todo), fname))
+
+    # Merge the partial counts of all shards
+    raw_entities_all = EntityCounts()
+    event_entities_all = EntityCounts()
+    num_missing = 0
+    for shard, fname in zip(shards, shard_files):
+        counts = load_shard_counts(fname, shard)
+        raw_entities_all.merge(counts['raw'])
+        event_entities_all.merge(counts['event'])
+        num_missing += counts['num_missing']
+    print('Counted entities in %d papers, %d without REACH output' %
+          (len(pmids) - num_missing, num_missing))
+    return raw_entities_all, event_entities_all
 
 
 if __name__ == '__main__':
-    raw_entities_all = {}  # All raw entities and groundings
-    event_entities_all = {}  # All event argument entities and groundings
+    parser = argparse.ArgumentParser(
+        description='Compare raw and event entities in REACH output.')
+    parser.add_argument('--pmids',
+                        default='../step1_genes_pmids/combined_pmids.txt')
+    parser.add_argument('--local',
+                        help='A folder of <pmid>.json REACH output files to '
+                             'read instead of S3.')
+    parser.add_argument('--reader', default='reach_no_famplex',
+                        help='The reader whose output is read from S3.')
+    parser.add_argument('--out-dir', default='reach_entity_shards',
+                        help='The folder of partial counts per shard.')
+    parser.add_argument('--shard-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--max-papers', type=int,
+                        help='Only process this many papers from the start '
+                             'of the PMID list.')
+    parser.add_argument('--no-stream', action='store_true',
+                        help='Parse REACH output with json.loads even if '
+                             'ijson is installed.')
+    args = parser.parse_args()
 
     # Read in list of PMIDs
-    with open('../step1_genes_pmids/combined_pmids.txt', 'r') as fh:
+    with open(args.pmids, 'r') as fh:
         pmids = [l.strip() for l in fh.readlines()]
+    if args.max_papers is not None:
+        pmids = pmids[:args.max_papers]
 
-    # Download and prcess output for each PMID and update dicts of entities
-    for i, pmid in enumerate(pmids):
-        # Get REACH JSON string from S3 for given PMID
-        reach_json = s3_client.get_reader_output('reach_no_famplex', pmid)
-        if not reach_json:
-            continue
-        # Extract the entities from the JSON and update dicts
-        raw_entities, event_entities = get_entities(reach_json)
-        update_entity_dict(raw_entities_all, raw_entities)
-        update_entity_dict(event_entities_all, event_entities)
+    source = LocalSource(args.local) if args.local else S3Source(args.reader)
+    raw_entities_all, event_entities_all = \
+        count_entities(pmids, source, args.out_dir,
+                       shard_size=args.shard_size, num_workers=args.workers,
+                       stream=False if args.no_stream else None)
     # Rank list of entities for each case according to number of times
     # extracted
-    raw_ranked = sorted(raw_entities_all.items(),
-                        key=lambda x: sum([v for k, v in x[1].items()]),
-                        reverse=True)
-    event_ranked = sorted(event_entities_all.items(),
-                          key=lambda x: sum([v for k, v in x[1].items()]),
-                          reverse=True)
+    raw_entities_all.save('reach_raw_entity_counts')
+    event_entities_all.save('reach_event_entity_counts')
+    raw_ranked = raw_entities_all.top_k(50)
+    event_ranked = event_entities_all.top_k()
+
+    # Compare the top of the two rankings
+    print('%d raw entity texts, %d event entity texts' %
+          (len(raw_entities_all.texts), len(event_entities_all.texts)))
+    event_ranks = {txt: rank for rank, (txt, _) in enumerate(event_ranked)}
+    for rank, (txt, counts) in enumerate(raw_ranked):
+        event_rank = event_ranks.get(txt)
+        print('%d\t%s\t%d\t%s' % (rank, txt, sum(counts.values()),
+                                  '-' if event_rank is None else event_rank))
@@ -1,39 +1,53 @@
+"""This script counts the synonyms of each FamPlex entry in the grounding map
+and plots the distribution of their number."""
+import os
+import sys
 from indra.util import read_unicode_csv, plot_formatting as pf
 from os.path import join
 from collections import Counter
 from matplotlib import pyplot as plt
-
-pf.set_fig_params()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.grounding_map import get_grounding_map
 
 be_path = join('..', '..', 'famplex')
 
-# Open entities list
-be_entities = [row[0] for row in read_unicode_csv(join(be_path, 'entities.csv'))]
-be_counts = dict([(be, 0) for be in be_entities])
-# Count groundings for each entity
-ns_list = []
-for row in read_unicode_csv(join(be_path, 'grounding_map.csv')):
-    ns_list.append(row[1])
-    if row[1] == 'FPLX':
-        be_counts[row[2]] += 1
-    assert 'FPLX' not in row[2:]
-be_ctr = Counter(be_counts.values())
-
-ns_ctr = Counter(ns_list)
-print("%d grounding map entries total" % len(ns_list))
-print("%d entries for FPLX" % ns_ctr['FPLX'])
-
-# Plot
-plt.ion()
-plt.figure(figsize=(3, 2), dpi=150)
-for num, freq in be_ctr.items():
-    plt.bar(num, freq, width=0.8, align="center", color='gray')
-ax = plt.gca()
-max_count = max(be_ctr.keys())
-xticks = range(1, max_count + 1)
-ax.set_xticks(xticks)
-ax.set_xlabel('Number of synonyms')
-ax.set_ylabel('Count')
-pf.format_axis(ax, tick_padding=2)
-plt.subplots_adjust(bottom=0.15)
-plt.savefig('num_groundings.pdf')
+
+def count_groundings(famplex_path=be_path):
+    """Return the number of FamPlex entries with each number of synonyms
+    and the grounding map."""
+    # Open entities list
+    be_entities = [row[0] for row in
+                   read_unicode_csv(join(famplex_path, 'entities.csv'))]
+    gmap = get_grounding_map(join(famplex_path, 'grounding_map.csv'))
+    be_ctr = Counter(gmap.num_synonyms(be) for be in be_entities)
+    return be_ctr, gmap
+
+
+def plot_num_groundings(be_ctr):
+    """Plot the number of FamPlex entries with each number of synonyms."""
+    pf.set_fig_params()
+    plt.figure(figsize=(3, 2), dpi=150)
+    for num, freq in be_ctr.items():
+        plt.bar(num, freq, width=0.8, align="center", color='gray')
+    ax = plt.gca()
+    max_count = max(be_ctr.keys())
+    xticks = range(1, max_count + 1)
+    ax.set_xticks(xticks)
+    ax.set_xlabel('Number of synonyms')
+    ax.set_ylabel('Count')
+    pf.format_axis(ax, tick_padding=2)
+    plt.subplots_adjust(bottom=0.15)
+    plt.savefig('num_groundings.pdf')
+
+
+def make_num_groundings_figure():
+    be_ctr, gmap = count_groundings()
+    print("%d grounding map entries total" % len(gmap))
+    print("%d entries for FPLX" % gmap.namespace_counts['FPLX'])
+    plot_num_groundings(be_ctr)
+
+
+if __name__ == '__main__':
+    plt.ion()
+    make_num_groundings_figure()
@@ -0,0 +1,193 @@
+"""This script searches the agent texts of the training corpus for candidate
+synonyms of all FamPlex entries in one batch run.
+
+Each entry of entities.csv is searched for by its name and by all of its
+lexicalizations in grounding_map.csv, and optionally Reactome families are
+searched for by name as well. The searches are run in parallel over
+keywords with the n-gram index of texts_for_gene.py, texts that are already
+in the grounding map (up to case, dash and whitespace variants, see
+common/grounding_map.py) are dropped, and the best matches of each entry are
+written into a single CSV file, ranked by match ratio and then by the
+number of times the text appears in the corpus:
+
+    python find_synonyms.py --reactome reactome_families.csv
+"""
+import os
+import sys
+import argparse
+from multiprocessing import Pool
+from indra.util import read_unicode_csv, write_unicode_csv
+from texts_for_gene import get_keyword_matches, load_texts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.grounding_map import get_grounding_map
+
+famplex_path = os.path.join('..', '..', 'famplex')
+header = ['Namespace', 'ID', 'Text', 'Ratio', 'Keyword', 'Count',
+          'Groundings']
+
+
+def unique(kws):
+    """Return keywords without case-insensitive duplicates, in order."""
+    seen = set()
+    kws_unique = []
+    for kw in kws:
+        if kw.upper() not in seen:
+            seen.add(kw.upper())
+            kws_unique.append(kw)
+    return kws_unique
+
+
+def get_famplex_keywords(famplex_path=famplex_path):
+    """Return the search keywords of each FamPlex entry and the grounding
+    map.
+
+    Returns
+    -------
+    keywords : list[tuple]
+        (('FPLX', entry), keywords) tuples in the order of entities.csv,
+        with the name of the entry (with underscores replaced by spaces)
+        and its lexicalizations as keywords.
+    gmap : common.grounding_map.GroundingMap
+        The grounding map.
+    """
+    gmap = get_grounding_map(os.path.join(famplex_path, 'grounding_map.csv'))
+    keywords = []
+    for row in read_unicode_csv(os.path.join(famplex_path, 'entities.csv')):
+        entry = row[0]
+        kws = [entry.replace('_', ' ')] + gmap.fplx_texts.get(entry, [])
+        keywords.append((('FPLX', entry), unique(kws)))
+    return keywords, gmap
+
+
+def get_reactome_keywords(fname):
+    """Return the search keywords of Reactome families from a CSV file with
+    rows of Reactome ID and family name."""
+    return [(('REACTOME', row[0]), [row[1]])
+            for row in read_unicode_csv(fname) if len(row) > 1 and row[1]]
+
+
+_texts = None
+_index = None
+
+
+def _init_worker(texts, index):
+    global _texts, _index
+    _texts = texts
+    _index = index
+
+
+def _search(args):
+    key, kw, match_type, top_k = args
+    hits = get_keyword_matches(kw, _texts, match_type, index=_index,
+                               top_k=top_k)
+    return key, kw, [(entry[0], ratio) for entry, ratio in hits]
+
+
+def find_synonyms(keywords, texts, index, gmap=None,
+                  match_type='partial', top_k=20, min_ratio=80,
+                  processes=None):
+    """Return candidate synonyms of entries among agent texts.
+
+    Parameters
+    ----------
+    keywords : list[tuple]
+        (key, keywords) tuples, where key identifies an entry, e.g.
+        ('FPLX', 'AMPK').
+    texts : list[tuple]
+        Agent texts with groundings as returned by
+        agent_texts_with_grounding.
+    index : common.ngram_index.NgramIndex
+        The n-gram index of the texts.
+    gmap : Optional[common.grounding_map.GroundingMap]
+        If given, texts matching a text of the grounding map up to
+        normalization (see GroundingMap.has_norm_match) are left out of the
+        candidates.
+    match_type : Optional[str]
+        'partial' (default) or 'ratio', see get_keyword_matches.
+    top_k : Optional[int]
+        The number of best matches kept per keyword and per entry.
+    min_ratio : Optional[int]
+        The minimal match ratio of candidates.
+    processes : Optional[int]
+        The number of worker processes. Default: the number of CPUs.
+
+    Returns
+    -------
+    candidates : list[tuple]
+        (key, text, ratio, keyword, entry) tuples, where entry is the entry
+        of the text in texts, the best match of each text for each key,
+        ranked by decreasing ratio and count.
+    """
+    entries = {entry[0]: entry for entry in texts}
+    # Keep more matches than needed since mapped texts are dropped
+    tasks = [(key, kw, match_type, top_k + len(kws) * 5)
+             for key, kws in keywords for kw in kws]
+    best = {}
+    pool = Pool(processes, initializer=_init_worker, initargs=(texts, index))
+    try:
+        for key, kw, hits in pool.imap_unordered(_search, tasks,
+                                                 chunksize=16):
+            for text, ratio in hits:
+                if ratio < min_ratio or \
+                        (gmap is not None and gmap.has_norm_match(text)):
+                    continue
+                if ratio > best.get((key, text), (-1,))[0]:
+                    best[(key, text)] = (ratio, kw)
+    finally:
+        pool.close()
+        pool.join()
+
+    by_key = {}
+    for (key, text), (ratio, kw) in best.items():
+        by_key.setdefault(key, []).append((key, text, ratio, kw,
+                                           entries[text]))
+    candidates = []
+    for key, _ in keywords:
+        key_candidates = sorted(by_key.get(key, []),
+                                key=lambda c: (-c[2], -c[4][2], c[1]))
+        candidates += key_candidates[:top_k]
+    candidates.sort(key=lambda c: (-c[2], -c[4][2]))
+    return candidates
+
+
+def write_candidates(candidates, fname):
+    """Write candidate synonyms into a CSV file."""
+    rows = [header]
+    for (ns, db_id), text, ratio, kw, entry in candidates:
+        groundings = '|'.join('%s:%s:%d' % (g[0], g[1], g[2])
+                              for g in entry[1] if g[0] is not None)
+        rows.append([ns, db_id, text, ratio, kw, entry[2], groundings])
+    write_unicode_csv(fname, rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Search the training corpus for candidate synonyms of '
+                    'FamPlex entries.')
+    parser.add_argument('--stmts',
+                        default='../step3_sample_training_test/'
+                                'training_pmid_stmts.pkl')
+    parser.add_argument('--reactome',
+                        help='A CSV file of Reactome family IDs and names '
+                             'to search for as well.')
+    parser.add_argument('--match-type', choices=['partial', 'ratio'],
+                        default='partial')
+    parser.add_argument('--top-k', type=int, default=20,
+                        help='The number of candidates kept per entry.')
+    parser.add_argument('--min-ratio', type=int, default=80)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--output', default='synonym_candidates.csv')
+    args = parser.parse_args()
+
+    keywords, gmap = get_famplex_keywords()
+    if args.reactome:
+        keywords += get_reactome_keywords(args.reactome)
+    texts, index = load_texts(args.stmts)
+    candidates = find_synonyms(keywords, texts, index, gmap,
+                               args.match_type, args.top_k, args.min_ratio,
+                               args.processes)
+    write_candidates(candidates, args.output)
+    print('Wrote %d candidates for %d of %d entries into %s' %
+          (len(candidates), len(set(c[0] for c in candidates)),
+           len(keywords), args.output))
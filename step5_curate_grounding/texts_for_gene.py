@@ -1,10 +1,43 @@
-import pickle
+import os
+import sys
 from indra.preassembler.grounding_mapper import *
 from fuzzywuzzy import fuzz
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.grounding_table import open_grounding_table
+from common.ngram_index import open_ngram_index, get_index_path
 
-def get_keyword_matches(kw, texts, match_type='partial'):
+def get_keyword_matches(kw, texts, match_type='partial', index=None,
+                        top_k=None, num_candidates=200):
+    """Return (entry, ratio) pairs of the texts matching a keyword, sorted by
+    decreasing fuzzy match ratio.
+
+    Parameters
+    ----------
+    kw : str
+        The keyword to search for.
+    texts : list[tuple]
+        Entries of agent texts with groundings, as returned by
+        agent_texts_with_grounding, with the text first.
+    match_type : Optional[str]
+        'partial' (default) for fuzz.partial_ratio, otherwise fuzz.ratio.
+    index : Optional[common.ngram_index.NgramIndex]
+        An n-gram index of the texts of the entries. If given, only the
+        num_candidates entries sharing the most n-grams with the keyword are
+        scored, otherwise all entries are.
+    top_k : Optional[int]
+        The number of best matches to return. Default: all scored entries.
+    num_candidates : Optional[int]
+        The number of candidates taken from the index.
+    """
+    if index is not None:
+        ids = index.candidates(kw, max(num_candidates, top_k or 0),
+                               partial=(match_type == 'partial'))
+        entries = [texts[ix] for ix in ids]
+    else:
+        entries = texts
     hits = []
-    for entry in texts:
+    for entry in entries:
         text = entry[0]
         if match_type == 'partial':
             ratio = fuzz.partial_ratio(kw.upper(), text.upper())
@@ -12,21 +45,32 @@ def get_keyword_matches(kw, texts, match_type='partial'):
             ratio = fuzz.ratio(kw.upper(), text.upper())
         hits.append((entry, ratio))
     hits.sort(key=lambda x: x[1], reverse=True)
-    return hits
+    return hits[:top_k] if top_k else hits
+
+def load_texts(stmts_filename):
+    """Return the agent texts with groundings of a Statement corpus and an
+    n-gram index of the texts.
+
+    The texts are read from the grounding table of the corpus, which is
+    built on first use, see common/grounding_table.py.
+    """
+    texts = open_grounding_table(stmts_filename)
+    # Queries only score the texts sharing the most trigrams with the keyword
+    index = open_ngram_index(get_index_path(stmts_filename), texts.texts)
+    return texts, index
+
 
 if __name__ == '__main__':
     stmts_filename = '../step3_sample_training_test/training_pmid_stmts.pkl'
-    with open(stmts_filename, 'rb') as f:
-        stmts_by_paper = pickle.load(f)
-    stmts = [s for stmt_list in stmts_by_paper.values() for s in stmt_list]
-
-    texts = agent_texts_with_grounding(stmts)
+    texts, index = load_texts(stmts_filename)
     #with open('../entities.csv', 'rt') as f:
     #    famplexes = [line.strip() for line in f.readlines()]
-    def getp(kw):
-        return get_keyword_matches(kw, texts, match_type='partial')
-    def getr(kw):
-        return get_keyword_matches(kw, texts, match_type='ratio')
+    def getp(kw, top_k=50):
+        return get_keyword_matches(kw, texts, match_type='partial',
+                                   index=index, top_k=top_k)
+    def getr(kw, top_k=50):
+        return get_keyword_matches(kw, texts, match_type='ratio',
+                                   index=index, top_k=top_k)
 
     # Workflow:
     #
@@ -46,6 +90,7 @@ if __name__ == '__main__':
     #   - Dump out a text file with the candidate texts, csv-separated with
     #     the FPLX identifier used to search
     #   - Add texts to grounding map for
+    #   (find_synonyms.py does the searches in one batch run)
 
     #
     #    How to store multiple REACH versions? Change to use key like
@@ -1,20 +1,18 @@
 import os
+import sys
 import csv
 import random
+import argparse
 from xml.etree import ElementTree as ET
 from collections import namedtuple, Counter, defaultdict
 from matplotlib import pyplot as plt
 from indra.sources import reach
 from indra.databases import hgnc_client, uniprot_client
 from indra.util import write_unicode_csv, plot_formatting as pf
-from indra.preassembler.grounding_mapper import load_grounding_map
-
-
-def norm_text(text):
-    """Normalize text for case-insensitive matches."""
-    normed = text.replace('‐', '-')
-    normed = normed.upper()
-    return normed
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, os.pardir))
+from common.grounding_map import get_grounding_map
+from common.text_matcher import TextMatcher, fold_text, norm_text
 
 
 def sorted_ctr(items):
@@ -95,11 +93,13 @@ def get_annotation_text(ann):
     return passage
 
 
-def write_curation_tsv(annotations, be_strings, output_file):
+def write_curation_tsv(annotations, matcher, output_file,
+                       strip_gene_prefixes=False):
     rows = []
     for ix, ann in enumerate(annotations):
         ix += 1
-        in_bioent = 1 if norm_text(ann.text) in be_strings_norm else 0
+        in_bioent = 1 if matcher.match(ann.text, strip_gene_prefixes) \
+            else 0
         passage = get_annotation_text(ann)
         fl = int(ann.first_left)
         lr = int(ann.last_right)
@@ -119,7 +119,8 @@ def write_curation_tsv(annotations, be_strings, output_file):
     write_unicode_csv(output_file, rows, delimiter='\t')
 
 
-def write_curation_html(annotations, be_strings, output_file):
+def write_curation_html(annotations, matcher, output_file,
+                        strip_gene_prefixes=False):
     # Header for the HTML file
     html = """
         <html>
@@ -137,7 +138,7 @@ def write_curation_html(annotations, be_strings, output_file):
         ix += 1
         in_bioent = 'False'
         # Check if this text is matched in the grounding map
-        if norm_text(ann.text) in be_strings_norm:
+        if matcher.match(ann.text, strip_gene_prefixes):
             in_bioent = 'True'
         # Get the annotation text
         passage = get_annotation_text(ann)
@@ -210,12 +211,32 @@ def filter_human(annotations):
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Evaluate FamPlex on the BioCreative VI BioID '
+                    'annotations.')
+    parser.add_argument('--broad-matching', action='store_true',
+                        help='Match annotation texts to the grounding map '
+                             'up to all dash variants, soft hyphens and '
+                             'runs of whitespace, rather than only up to '
+                             'case and the U+2010 hyphen as in the '
+                             'published results.')
+    parser.add_argument('--strip-gene-prefixes', action='store_true',
+                        help='Also match annotation texts after stripping '
+                             'the gene prefixes and suffixes of '
+                             'gene_prefixes.csv (e.g. pAKT).')
+    args = parser.parse_args()
+    strip_gene_prefixes = args.strip_gene_prefixes
+
     # Load and normalize the grounding map
     bioentities_path = os.environ['BIOENTITIES_HOME']
-    be_grounding_map = load_grounding_map(os.path.join(bioentities_path,
+    be_grounding_map = get_grounding_map(os.path.join(bioentities_path,
                                          'grounding_map.csv'))
-    be_strings_norm = [norm_text(text) for text in be_grounding_map]
     be_gene_prefix_file = os.path.join(bioentities_path, 'gene_prefixes.csv')
+    # By default texts are matched up to case and the U+2010 hyphen, which
+    # reproduces the published counts
+    be_matcher = TextMatcher.from_grounding_map(
+        be_grounding_map, be_gene_prefix_file,
+        fold=fold_text if args.broad_matching else norm_text)
     norm_prefixes = process_gene_prefixes(be_gene_prefix_file)
 
     # Get the annotation data
@@ -257,7 +278,7 @@ if __name__ == '__main__':
     # Next, identify which of these can be matched to FamPlex
     automated_eval_results = {'in_be': [], 'not_in_be': []}
     for ann in gp_multi_grounding:
-        if norm_text(ann.text) in be_strings_norm:
+        if be_matcher.match(ann.text, strip_gene_prefixes):
             automated_eval_results['in_be'].append(ann)
         else:
             automated_eval_results['not_in_be'].append(ann)
@@ -278,6 +299,6 @@ if __name__ == '__main__':
     random.seed(1)
     random.shuffle(anns_for_curation)
 
-    write_curation_tsv(anns_for_curation, be_strings_norm,
-                      'annotations_for_curation.tsv')
+    write_curation_tsv(anns_for_curation, be_matcher,
+                      'annotations_for_curation.tsv', strip_gene_prefixes)
 
@@ -0,0 +1,175 @@
+"""This script counts the mentions of FamPlex entries in raw text by
+dictionary tagging, without running a reader.
+
+The texts of the grounding map and the HGNC gene symbols are compiled into
+an Aho-Corasick automaton (see common/dict_tagger.py), and each document is
+scanned once to find their mentions. Documents are read from folders of
+plain text files (e.g. the abstracts in trips/trips_abstracts) and BioC XML
+files (e.g. the figure captions in biocreative/BioIDtraining_2/caption_bioc),
+each .txt file being one document and each BioC document one document with
+its passages tagged separately. Files are tagged in parallel:
+
+    python dictionary_coverage.py trips/trips_abstracts
+
+Since every mention of a grounding map text counts, whether or not a reader
+would recognize it as an entity, the counts are an upper bound on the
+coverage of FamPlex in the documents.
+"""
+import os
+import sys
+import argparse
+from xml.etree import ElementTree as ET
+from collections import Counter
+from multiprocessing import Pool
+from indra.util import write_unicode_csv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.grounding_map import get_grounding_map
+from common.dict_tagger import DictionaryTagger, get_hgnc_entries
+
+be_grounding_map_file = os.path.join('..', '..', 'famplex',
+                                     'grounding_map.csv')
+header = ['FPLX', 'Mentions', 'Documents', 'Texts']
+
+
+def get_files(paths):
+    """Return the .txt and .xml files of a list of files and folders."""
+    fnames = []
+    for path in paths:
+        if not os.path.isdir(path):
+            fnames.append(path)
+            continue
+        for root, _, files in os.walk(path):
+            fnames += [os.path.join(root, fname) for fname in sorted(files)
+                       if fname.endswith(('.txt', '.xml'))]
+    return fnames
+
+
+def iter_documents(fname):
+    """Yield the documents of a file, each as a list of passage texts."""
+    if fname.endswith('.xml'):
+        tree = ET.parse(fname)
+        for doc in tree.getroot().findall('./document'):
+            yield [passage.text for passage in
+                   doc.findall('./passage/text') if passage.text]
+    else:
+        with open(fname, 'rb') as fh:
+            yield [fh.read().decode('utf-8')]
+
+
+_tagger = None
+
+
+def _init_worker(tagger):
+    global _tagger
+    _tagger = tagger
+
+
+def _tag_file(fname):
+    num_docs = 0
+    text_counts = Counter()
+    fplx_docs = Counter()
+    for passages in iter_documents(fname):
+        num_docs += 1
+        doc_fplx = set()
+        for passage in passages:
+            for _, _, string in _tagger.tag(passage):
+                text_counts[string] += 1
+                db_refs = _tagger.db_refs[string]
+                if db_refs and 'FPLX' in db_refs:
+                    doc_fplx.add(db_refs['FPLX'])
+        fplx_docs.update(doc_fplx)
+    return num_docs, text_counts, fplx_docs
+
+
+def tag_files(tagger, fnames, processes=None):
+    """Return mention counts of dictionary strings in a list of files.
+
+    Parameters
+    ----------
+    tagger : common.dict_tagger.DictionaryTagger
+        The tagger of the dictionary strings.
+    fnames : list[str]
+        The .txt and BioC .xml files to tag.
+    processes : Optional[int]
+        The number of worker processes. Default: the number of CPUs.
+
+    Returns
+    -------
+    num_docs : int
+        The number of documents tagged.
+    text_counts : collections.Counter
+        The number of mentions of each dictionary string.
+    fplx_docs : collections.Counter
+        The number of documents mentioning each FamPlex entry.
+    """
+    num_docs = 0
+    text_counts = Counter()
+    fplx_docs = Counter()
+    pool = Pool(processes, initializer=_init_worker, initargs=(tagger,))
+    try:
+        for file_docs, file_counts, file_fplx in \
+                pool.imap_unordered(_tag_file, fnames, chunksize=8):
+            num_docs += file_docs
+            text_counts += file_counts
+            fplx_docs += file_fplx
+    finally:
+        pool.close()
+        pool.join()
+    return num_docs, text_counts, fplx_docs
+
+
+def get_fplx_counts(tagger, text_counts, fplx_docs):
+    """Return rows of the mention and document counts of each FamPlex
+    entry, with its mentioned texts, in descending order of mentions."""
+    fplx_counts = Counter()
+    fplx_texts = {}
+    for text, count in text_counts.items():
+        db_refs = tagger.db_refs[text]
+        if db_refs and 'FPLX' in db_refs:
+            fplx_counts[db_refs['FPLX']] += count
+            fplx_texts.setdefault(db_refs['FPLX'], []).append((text, count))
+    rows = []
+    for fplx_id, count in fplx_counts.most_common():
+        texts = sorted(fplx_texts[fplx_id], key=lambda x: x[1], reverse=True)
+        rows.append([fplx_id, count, fplx_docs[fplx_id],
+                     '|'.join('%s:%d' % text_count for text_count in texts)])
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Count the mentions of FamPlex entries in raw text by '
+                    'dictionary tagging.')
+    parser.add_argument('paths', nargs='+',
+                        help='Folders or files of .txt documents and BioC '
+                             'XML files.')
+    parser.add_argument('--grounding-map', default=be_grounding_map_file)
+    parser.add_argument('--no-hgnc', action='store_true',
+                        help='Leave the HGNC gene symbols out of the '
+                             'dictionary.')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--output', default='dictionary_coverage.csv')
+    args = parser.parse_args()
+
+    gmap = get_grounding_map(args.grounding_map)
+    tagger = DictionaryTagger.from_grounding_map(
+        gmap, [] if args.no_hgnc else get_hgnc_entries())
+    fnames = get_files(args.paths)
+    print('Tagging %d files with %d dictionary strings' %
+          (len(fnames), len(tagger)))
+    num_docs, text_counts, fplx_docs = tag_files(tagger, fnames,
+                                                 args.processes)
+    rows = get_fplx_counts(tagger, text_counts, fplx_docs)
+    write_unicode_csv(args.output, [header] + rows)
+
+    ns_counts = Counter()
+    for text, count in text_counts.items():
+        for ns in (tagger.db_refs[text] or {'Not grounded': None}):
+            if ns != 'TEXT':
+                ns_counts[ns] += count
+    print('%d documents, %d mentions' % (num_docs, sum(text_counts.values())))
+    for ns, count in ns_counts.most_common():
+        print('%s: %d mentions' % (ns, count))
+    print('%d FamPlex entries mentioned, results in %s' %
+          (len(rows), args.output))
@@ -1,17 +1,22 @@
 """This script generates overall statistics describing the FamPlex resource."""
 
 import os
+import sys
 import json
 import numpy
 from collections import Counter
-import matplotlib
-matplotlib.use('svg')
 import matplotlib.pyplot as plt
 from util import *
 from indra.literature.pubmed_client import get_ids
 from indra.databases import uniprot_client
 from indra.util import plot_formatting as pf
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.result_cache import cached
 
+famplex_files = ['../../famplex/entities.csv',
+                 '../../famplex/relations.csv',
+                 '../../famplex/grounding_map.csv']
 entities = load_entity_list('../../famplex/entities.csv')
 relations = load_relationships('../../famplex/relations.csv')
 gmap = load_grounding_map('../../famplex/grounding_map.csv')
@@ -72,14 +77,12 @@ def num_child_concepts():
             print('%s: %s' % (entity, len(children)))
 
     pf.set_fig_params()
-    plt.ion()
     plt.figure(figsize=(2.5, 2.5), dpi=300)
     plt.hist(child_nums, 60, color=pf.GREEN)
     plt.xlabel('Number of distinct children in FamPlex')
     plt.ylabel('Number of FamPlex entries')
     pf.format_axis(plt.gca())
     plt.savefig('fplx_children_hist.pdf')
-    plt.show()
 
     print('Number of children: %.2f +/- %.2f, median: %d' %
           (numpy.average(child_nums), numpy.std(child_nums),
@@ -104,9 +107,13 @@ def top_level_depths():
               (num_level, count))
 
 
+@cached(files=lambda: famplex_files)
 def num_citations():
     """Calculate the number of citations for each top-level entity and its
-    children."""
+    children.
+
+    The results are cached until one of the FamPlex tables changes.
+    """
     def get_pmids(search_terms):
         pmids = set()
         for lex in search_terms:
@@ -120,14 +127,14 @@ def num_citations():
     all_pmids = set()
     for entity in entities:
         # Lexicalizations for the entry itself
-        lexes = gmap_reverse.get(entity, set())
+        lexes = set(gmap_reverse.get(entity, set()))
         lexes.add(entity.replace('_', '-'))
         pmids_entry = get_pmids(lexes)
         # Lexicalizations for the entries children
         children = get_children('FPLX', entity)
         for child_ns, child_name in children:
             if child_ns == 'FPLX':
-                lexes |= gmap_reverse.get(child_name)
+                lexes |= gmap_reverse.get(child_name, set())
             elif child_ns == 'HGNC':
                 lexes.add(child_name)
             elif child_ns == 'UP':
@@ -154,12 +161,8 @@ def num_citations():
 
 def plot_cit_nums():
     """Plot the histogram of citation numbers for each FamPlex entry."""
-    if not os.path.exists('fplx_citations.json'):
-        num_citations()
-    with open('fplx_citations.json', 'r') as fh:
-        cit_nums = json.load(fh)
+    cit_nums, _ = num_citations()
     pf.set_fig_params()
-    plt.ion()
     plt.figure(figsize=(3.5, 2.5), dpi=300)
     cit_sort = sorted(cit_nums.values(), key=lambda x: x[1], reverse=True)
     y1 = [c[0] for c in cit_sort]
@@ -174,7 +177,6 @@ def plot_cit_nums():
     plt.legend()
     pf.format_axis(plt.gca())
     plt.savefig('fplx_pmids_bar.pdf')
-    plt.show()
 
 
 def num_genes_covered():
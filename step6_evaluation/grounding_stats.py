@@ -1,17 +1,26 @@
+import os
+import sys
 import csv
 import numpy
-import pickle
 import matplotlib.pyplot as plt
 from collections import defaultdict
 from indra.util import plot_formatting as pf
 from indra.databases import hgnc_client
 from indra.preassembler.hierarchy_manager import entity_hierarchy as eh
 from util import *
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.stmt_store import iter_statements
+from common.mention_table import MentionTable, open_mention_table
+from common.curves import coverage_curve, quantile_index, downsample
 
 
 def get_coverage_stats(stmts):
     """Return the number of times each FamPlex entry is grounded to."""
     counts = defaultdict(int)
+    if isinstance(stmts, MentionTable):
+        counts.update(stmts.grounding_counts('FPLX'))
+        return counts
     for stmt in stmts:
         for agent in stmt.agent_list():
             if agent is not None:
@@ -24,6 +33,12 @@ def get_coverage_stats(stmts):
 def get_hgnc_coverage_stats(stmts):
     """Return the number of times each HGNC gene is grounded to."""
     counts = defaultdict(int)
+    if isinstance(stmts, MentionTable):
+        for hgnc_id, count in stmts.grounding_counts('HGNC').items():
+            hgnc_name = hgnc_client.get_hgnc_name(hgnc_id)
+            if hgnc_name:
+                counts[hgnc_name] += count
+        return counts
     for stmt in stmts:
         for agent in stmt.agent_list():
             if agent is not None:
@@ -48,8 +63,8 @@ def plot_counts_by_entry(counts):
     counts_ord = sorted(counts.items(), key=lambda x: x[1], reverse=True)
     names = [cc[0] for cc in counts_ord]
     counts_for_name = numpy.array([float(cc[1]) for cc in counts_ord])
-    vals = numpy.cumsum(counts_for_name) / numpy.sum(counts_for_name)
-    idx50 = [i for i, v in enumerate(vals) if v >= 0.5][0]
+    _, vals = coverage_curve(counts_for_name, sort=False)
+    idx50 = quantile_index(vals, 0.5)
 
     # Plot absolute counts
     xvals = range(len(names))
@@ -65,12 +80,11 @@ def plot_counts_by_entry(counts):
     pf.format_axis(ax)
     plt.subplots_adjust(left=0.14, bottom=0.11, top=0.93, right=0.95)
     plt.savefig('entity_coverage_test_corpus.pdf')
-    plt.show()
 
     # Plot cumulative percentage
     print('50%% of mentions is covered by the first %d entries' % (idx50))
     plt.figure(figsize=(2.5, 2.5), dpi=300)
-    plt.plot(range(len(names)), vals, color=pf.GREEN)
+    plt.plot(*downsample(numpy.arange(len(names)), vals), color=pf.GREEN)
     plt.plot([0, idx50], [0.5, 0.5], color='black', linestyle='dashed')
     plt.plot([idx50, idx50], [0, 0.5], color='black', linestyle='dashed')
     plt.xlim([0, len(names)])
@@ -81,7 +95,6 @@ def plot_counts_by_entry(counts):
     pf.format_axis(ax)
     plt.subplots_adjust(left=0.19, bottom=0.11, top=0.93, right=0.95)
     plt.savefig('entity_coverage_test_corpus_distr.pdf')
-    plt.show()
 
     # Print top table
     ntop = 5
@@ -196,7 +209,6 @@ def plot_stacks_groups(stacks_groups, counts, hgnc_counts, labels):
     ax = plt.gca()
     pf.format_axis(ax)
     plt.savefig('entity_levels_coverage_test_corpus.pdf')
-    plt.show()
 
 
 def plc_groundings(stmts, counts, hgnc_counts):
@@ -222,11 +234,15 @@ def plc_groundings(stmts, counts, hgnc_counts):
             print('%s: %.2f' % (element, 100.0*count / allc))
 
 
-if __name__ == '__main__':
+def make_coverage_figures():
+    """Print and plot the statistics of groundings to FamPlex entries in the
+    test corpus."""
     # Load Statements from test corpus reading output with FamPlex
     fname = '../step3_sample_training_test/famplex_test_stmts_mapped.pkl'
-    with open(fname, 'rb') as fh:
-        stmts = pickle.load(fh)
+    # Use the mention table of the corpus if there is one
+    stmts = open_mention_table(fname)
+    if stmts is None:
+        stmts = list(iter_statements(fname))
 
     # Load list of FamPlex entries
     entries = load_entity_list('../../famplex/entities.csv')
@@ -250,6 +266,10 @@ if __name__ == '__main__':
     groups_to_plot = ['AMPK', 'G_protein', 'PPP2', 'PLC', 'Activin']
     stacks_groups = get_stacks_groups(groups_to_plot)
     labels = [g.replace('_', ' ') for g in groups_to_plot]
-    plt.ion()
     plot_stacks_groups(stacks_groups, counts, hgnc_counts, labels)
     plot_counts_by_entry(counts)
+
+
+if __name__ == '__main__':
+    plt.ion()
+    make_coverage_figures()
@@ -51,7 +51,9 @@ def plot_venn_diagram(group_entries, missing):
     plt.savefig('famplex_mapping.pdf')
     return v3
 
-if __name__ == '__main__':
+def make_mapping_figure():
+    """Print the coverage of equivalences and plot the Venn diagram of
+    mappings of FamPlex entries to other resources."""
     # Read all entities in FamPlex
     entities_file = os.path.join(fplx_path, 'entities.csv')
     entities = load_entity_list(entities_file)
@@ -75,4 +77,9 @@ if __name__ == '__main__':
     # Plot Venn diagram of mappings
     groups = [['IP', 'PF','NXP', 'GO'], ['NCIT', 'MESH'], ['BEL', 'RE']]
     group_entries, num_missing = get_entries_by_group(db_mappings, groups)
-    v3 = plot_venn_diagram(group_entries, num_missing)
+    plot_venn_diagram(group_entries, num_missing)
+
+
+if __name__ == '__main__':
+    plt.ion()
+    make_mapping_figure()
@@ -1,40 +1,79 @@
 """This script looks up all the mappings from FPLX to NCIT and
 checks if the NCIT entry has any child concepts."""
 
+import io
 import os
+import sys
 import csv
 import requests
 import zipfile
 from collections import defaultdict
 from util import load_equivalences
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.result_cache import cached
 
 flat_file = 'https://evs.nci.nih.gov/ftp1/NCI_Thesaurus/Thesaurus_18.02d.FLAT.zip'
+flat_zip = os.path.basename(flat_file)
 
-if not os.path.exists('Thesaurus.txt'):
-    res = requests.get(flat_file)
-    with open('Thesaurus_18.02d.FLAT.zip', 'wb') as fh:
-        fh.write(res.content)
-    with zipfile.ZipFile('Thesaurus_18.02d.FLAT.zip', 'r') as fh:
-        fh.extractall('.')
 
-children_dict = defaultdict(set)
+def get_local_file():
+    """Return the NCI Thesaurus flat file (extracted or zipped) in the
+    working directory, or None if there is none."""
+    for fname in ('Thesaurus.txt', flat_zip):
+        if os.path.exists(fname):
+            return fname
+    return None
 
-with open('Thesaurus.txt', 'r') as fh:
-    reader = csv.reader(fh, delimiter='\t')
-    for row in reader:
+
+def read_thesaurus(fname):
+    """Return the rows of an NCI Thesaurus flat file, extracted or
+    zipped."""
+    if not fname.endswith('.zip'):
+        with open(fname, 'r', encoding='utf-8') as fh:
+            return list(csv.reader(fh, delimiter='\t'))
+    with zipfile.ZipFile(fname, 'r') as zfh:
+        with zfh.open('Thesaurus.txt', 'r') as fh:
+            return list(csv.reader(io.TextIOWrapper(fh, encoding='utf-8'),
+                                   delimiter='\t'))
+
+
+@cached(files=lambda url=flat_file, local_file=None:
+        [local_file] if local_file else [])
+def get_ncit_children(url=flat_file, local_file=None):
+    """Return a dict of the child concepts of each NCIT concept.
+
+    The NCI Thesaurus flat file is read from local_file if given, otherwise
+    it is downloaded from the given (versioned) URL and saved in the working
+    directory, so later runs can use it offline. The result is cached by
+    URL and by the content of the local file.
+    """
+    if local_file is None:
+        res = requests.get(url)
+        res.raise_for_status()
+        local_file = os.path.basename(url)
+        with open(local_file, 'wb') as fh:
+            fh.write(res.content)
+    children_dict = defaultdict(set)
+    for row in read_thesaurus(local_file):
         child = row[0]
         parents = row[2].strip().split('|')
         for parent in parents:
             children_dict[parent].add(child)
+    return dict(children_dict)
+
+
+if __name__ == '__main__':
+    children_dict = get_ncit_children(local_file=get_local_file())
+
+    equivalences = load_equivalences('../../famplex/equivalences.csv')
+    ncit_ids = [e[1] for e in equivalences if e[0] == 'NCIT']
 
-equivalences = load_equivalences('../../famplex/equivalences.csv')
-ncit_ids = [e[1] for e in equivalences if e[0] == 'NCIT']
-
-has_children = 0
-num_ids = len(ncit_ids)
-for ncit_id in ncit_ids:
-    children = children_dict[ncit_id]
-    if children:
-        has_children += 1
-print('Number of NCIT mappings: %d, has children: %d, %.2f%%' % 
-      (num_ids, has_children, 100*has_children/num_ids))
+    has_children = 0
+    num_ids = len(ncit_ids)
+    for ncit_id in ncit_ids:
+        children = children_dict.get(ncit_id)
+        if children:
+            has_children += 1
+    print('Number of NCIT mappings: %d, has children: %d, %.2f%%' %
+          (num_ids, has_children, 100*has_children/num_ids))
@@ -1,9 +1,12 @@
 """This file contains various utility functions for other scripts to use,
 including loading various tables of FamPlex."""
 
+import os
 import csv
 import sys
-from collections import defaultdict
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.grounding_map import get_grounding_map
 
 
 def read_csv(fh, delimiter, quotechar):
@@ -48,26 +51,11 @@ def load_relationships(filename):
 
 
 def load_grounding_map(filename):
-    gm_rows = load_csv(filename)
-    g_map = {}
-    for row in gm_rows:
-        key = row[0]
-        db_refs = {'TEXT': key}
-        keys = [entry for entry in row[1::2] if entry != '']
-        values = [entry for entry in row[2::2] if entry != '']
-        db_refs.update(dict(zip(keys, values)))
-        if len(db_refs.keys()) > 1:
-            g_map[key] = db_refs
-        else:
-            g_map[key] = None
-    return g_map
+    """Return the db_refs of each text of a grounding map, or None for texts
+    that should not be grounded."""
+    return get_grounding_map(filename).to_dict()
 
 
 def load_gmap_reverse(filename):
-    g_map = load_grounding_map(filename)
-    g_map_reverse = defaultdict(set)
-    for text, groundings in g_map.items():
-        fplx_id = groundings.get('FPLX')
-        if fplx_id:
-            g_map_reverse[fplx_id].add(text)
-    return g_map_reverse
+    """Return the set of texts grounded to each FamPlex ID."""
+    return get_grounding_map(filename).reverse_map()